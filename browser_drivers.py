@@ -0,0 +1,218 @@
+import os
+import re
+import shutil
+import signal
+import subprocess
+
+# Browser drivers for the measurement runs. A driver opens the browser once per run,
+# loads each site in its own tab (or, headless, its own process) and closes it again,
+# so power_logger_hwmon.py does not depend on one browser or on a desktop session.
+# Every driver can use its own profile directory, which keeps caches and cookies of
+# parallel slots (see campaign.py) apart.
+
+DRIVER = "firefox"
+
+
+class BrowserDriver:
+    """
+    Interface of the browser drivers: start() before the first site, open(url) and
+    close() around every site, stop() at the end of the run.
+
+    Args:
+        profile (str): Profile directory of this driver, None for the browser's default profile.
+    """
+
+    name = "base"
+    process_names = () # Command names of the browser's main processes, for process_attribution.py
+
+    def __init__(self, profile=None):
+        # Absolute, so the browser's command line names this slot's profile and no other
+        self.profile = os.path.abspath(profile) if profile else None
+
+    def start(self):
+        """Starts the browser with an empty page."""
+
+    def open(self, url):
+        """Loads `url`; returns once the request has been handed to the browser."""
+
+    def close(self):
+        """Closes the page opened by the last open()."""
+
+    def stop(self):
+        """Ends the browser."""
+
+    @staticmethod
+    def run(command):
+        """Runs a helper command, discarding its output."""
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    @staticmethod
+    def spawn(command):
+        """
+        Starts a browser process in the background, discarding its output. It leads a
+        new process group, which its content and helper processes join.
+        """
+        return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+
+    @staticmethod
+    def terminate(process):
+        """Ends a process started by spawn() together with its process group."""
+        if process is None or process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.wait()
+
+
+class FirefoxDriver(BrowserDriver):
+    """
+    Firefox in a desktop session: sites open as new tabs of a running window and
+    are closed with Ctrl+W through xdotool (the original behaviour of the logger).
+    """
+
+    name = "firefox"
+    binary = "firefox"
+    process_names = ("firefox", "firefox-bin", "firefox-esr")
+
+    def profile_args(self):
+        return ["--profile", self.profile] if self.profile else []
+
+    def __init__(self, profile=None):
+        super().__init__(profile)
+        self.process = None
+
+    def start(self):
+        self.process = self.spawn([self.binary, *self.profile_args(), "--new-window", "about:blank"])
+
+    def open(self, url):
+        self.run([self.binary, *self.profile_args(), "--new-tab", url])
+
+    def close(self):
+        self.run(["xdotool", "key", "Ctrl+w"])
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            # Only the browser this driver started, never those of parallel slots
+            self.terminate(self.process)
+        elif self.profile:
+            # The start request was handed to a browser already running on this profile
+            self.run(["pkill", "-f", f"{re.escape(self.binary)}.*{re.escape(self.profile)}"])
+        else:
+            # Without a dedicated profile every browser process belongs to the run, as before
+            self.run(["pkill", self.binary])
+        self.process = None
+
+
+class ChromiumDriver(FirefoxDriver):
+    """
+    Chromium in a desktop session, driven like FirefoxDriver.
+    """
+
+    name = "chromium"
+    binary = "chromium" if shutil.which("chromium") else "chromium-browser"
+    process_names = ("chromium", "chromium-browse", "chrome")
+
+    def profile_args(self):
+        return [f"--user-data-dir={self.profile}"] if self.profile else []
+
+    def open(self, url):
+        self.run([self.binary, *self.profile_args(), url])
+
+
+class HeadlessDriver(BrowserDriver):
+    """
+    Base of the headless drivers: every site is loaded by its own browser process,
+    which close() terminates. Needs no display, so it runs on servers and in
+    isolated slots.
+    """
+
+    def __init__(self, profile=None):
+        super().__init__(profile)
+        self.process = None
+
+    def command(self, url):
+        raise NotImplementedError
+
+    def open(self, url):
+        self.close()
+        self.process = self.spawn(self.command(url))
+
+    def close(self):
+        self.terminate(self.process)
+        self.process = None
+
+    def stop(self):
+        self.close()
+
+
+class HeadlessFirefoxDriver(HeadlessDriver):
+    """Firefox without a display (--headless)."""
+
+    name = "firefox-headless"
+    process_names = FirefoxDriver.process_names
+
+    def command(self, url):
+        profile = ["--profile", self.profile] if self.profile else []
+        return ["firefox", "--headless", *profile, url]
+
+
+class HeadlessChromiumDriver(HeadlessDriver):
+    """Chromium without a display (--headless=new)."""
+
+    name = "chromium-headless"
+    process_names = ChromiumDriver.process_names
+
+    def command(self, url):
+        profile = [f"--user-data-dir={self.profile}"] if self.profile else []
+        return [ChromiumDriver.binary, "--headless=new", "--disable-gpu", *profile, url]
+
+
+class StubDriver(BrowserDriver):
+    """
+    Opens nothing and only records the calls, for dry runs of a schedule and tests
+    of the logger and campaign runner on machines without a browser.
+    """
+
+    name = "stub"
+
+    def __init__(self, profile=None):
+        super().__init__(profile)
+        self.calls = []
+
+    def start(self):
+        self.calls.append(("start", None))
+
+    def open(self, url):
+        self.calls.append(("open", url))
+
+    def close(self):
+        self.calls.append(("close", None))
+
+    def stop(self):
+        self.calls.append(("stop", None))
+
+
+DRIVERS = {driver.name: driver for driver in
+           (FirefoxDriver, ChromiumDriver, HeadlessFirefoxDriver, HeadlessChromiumDriver, StubDriver)}
+
+
+def make_driver(name=DRIVER, profile=None):
+    """
+    Returns a driver by name (one of DRIVERS).
+
+    Raises:
+        ValueError: If the name is unknown.
+    """
+    if name not in DRIVERS:
+        raise ValueError(f"Unknown browser driver '{name}'. Expected one of {tuple(DRIVERS)}.")
+    return DRIVERS[name](profile)
@@ -0,0 +1,300 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+from browser_drivers import DRIVER
+from segment_log import load_progress, read_log
+
+# Campaign runner for site lists too long for one serial run. The list is split into
+# shards, and every shard is measured by power_logger_hwmon.py on a slot: a local
+# process, a systemd scope pinned to a set of CPUs, or a remote measurement machine
+# reached over SSH. Each slot measures one shard at a time, with its own browser
+# profile, and the per-shard logs are merged with a 'shard' column afterwards.
+#
+# Slots on the same machine share its hwmon/RAPL sensors, which report package or
+# system power: their readings include the load of all parallel slots. Use one slot
+# per machine for absolute energies; parallel local slots suit relative comparisons.
+
+CAMPAIGN_DIR = "campaign"
+SITES_FILE = "sites.json"
+STATUS_FILE = "status.json"
+RESULTS_FOLDER = "results"
+PROFILE_DIR = "profile" # Browser profile of a shard, relative to its directory
+LOGGER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "power_logger_hwmon.py")
+# Logs written by power_logger_hwmon.py into the shard directory, merged by merge_campaign()
+SHARD_LOGS = ("power_log_hwmon.csv", "power_log_hwmon_stats.csv", "power_log_energy.csv")
+SLOT_TYPES = ("local", "systemd", "ssh")
+
+
+def shard_name(number):
+    return f"shard_{number:02d}"
+
+
+def shard_sites(webs_json, shards, campaign_dir=CAMPAIGN_DIR):
+    """
+    Splits a site list round-robin into `shards` shards, so every shard gets sites
+    from the whole list, and writes each one to '<campaign_dir>/shard_XX/sites.json'.
+
+    Returns:
+        list: The shard directories.
+    """
+    with open(webs_json) as f:
+        sites = list(json.load(f).items())
+    shards = max(1, min(shards, len(sites)))
+    directories = []
+    for number in range(shards):
+        directory = os.path.join(campaign_dir, shard_name(number))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, SITES_FILE), "w") as f:
+            json.dump(dict(sites[number::shards]), f, indent=2)
+        directories.append(directory)
+    return directories
+
+
+def find_shards(campaign_dir=CAMPAIGN_DIR):
+    """Returns the shard directories of a campaign, in order."""
+    return sorted(path for path in glob.glob(os.path.join(campaign_dir, "shard_*"))
+                  if os.path.exists(os.path.join(path, SITES_FILE)))
+
+
+def load_slots(path):
+    """
+    Loads the slot definitions: a JSON list of objects with 'type' (one of SLOT_TYPES),
+    and optionally 'name', 'host' and 'workdir' (ssh: the machine and its checkout of
+    this repository), 'cpus' (systemd: AllowedCPUs, e.g. '2-3'), 'browser' (a driver
+    of browser_drivers.py) and 'profile' (browser profile directory).
+    """
+    with open(path) as f:
+        slots = json.load(f)
+    for i, slot in enumerate(slots):
+        slot.setdefault("name", f"slot{i}")
+        if slot.get("type", "local") not in SLOT_TYPES:
+            raise ValueError(f"Slot '{slot['name']}' has unknown type '{slot['type']}'. Expected one of {SLOT_TYPES}.")
+        if slot.get("type") == "ssh" and not slot.get("host"):
+            raise ValueError(f"SSH slot '{slot['name']}' needs a 'host'.")
+    return slots
+
+
+def logger_command(slot, python="python3", logger=LOGGER, logger_args=()):
+    """Returns the power_logger_hwmon.py command line a slot runs inside a shard directory."""
+    return [python, logger, SITES_FILE, "--browser", slot.get("browser", DRIVER),
+            "--profile", slot.get("profile", PROFILE_DIR), *logger_args]
+
+
+def run_shard(slot, shard_dir, logger_args=()):
+    """
+    Measures one shard on a slot and waits for it.
+
+    Returns:
+        int: The exit code of the logger (or of the first failing copy step for SSH slots).
+    """
+    kind = slot.get("type", "local")
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.STDOUT}
+    if kind != "ssh":
+        if "profile" not in slot:
+            os.makedirs(os.path.join(shard_dir, PROFILE_DIR), exist_ok=True)
+        command = logger_command(slot, sys.executable, logger_args=logger_args)
+        if kind == "systemd":
+            # A transient scope puts the run in its own cgroup, pinned to the slot's CPUs
+            scope = ["systemd-run", "--user", "--scope", "--quiet"]
+            if slot.get("cpus"):
+                scope += ["-p", f"AllowedCPUs={slot['cpus']}"]
+            command = scope + command
+        with open(os.path.join(shard_dir, "logger.out"), "w") as out:
+            return subprocess.run(command, cwd=shard_dir, stdout=out, stderr=subprocess.STDOUT).returncode
+
+    host = slot["host"]
+    workdir = slot.get("workdir", "MEENW")
+    remote_dir = f"{workdir}/{CAMPAIGN_DIR}/{os.path.basename(shard_dir)}"
+    # The shard directory lies two levels below the remote checkout
+    command = logger_command(slot, logger="../../power_logger_hwmon.py", logger_args=logger_args)
+    remote = (f"mkdir -p {shlex.quote(remote_dir)}/{PROFILE_DIR} && cd {shlex.quote(remote_dir)} && "
+              f"{shlex.join(command)} > logger.out 2>&1")
+    steps = [["ssh", host, f"mkdir -p {shlex.quote(remote_dir)}"],
+             ["scp", "-q", os.path.join(shard_dir, SITES_FILE), f"{host}:{remote_dir}/"],
+             ["ssh", host, remote]]
+    for step in steps:
+        code = subprocess.run(step, **quiet).returncode
+        if code != 0:
+            return code
+    # Only the logs come back, not the browser profile
+    return subprocess.run(["scp", "-q", "-r", f"{host}:{remote_dir}/power_log_*", f"{host}:{remote_dir}/logger.out",
+                           shard_dir], **quiet).returncode
+
+
+def resumable(shard_dir):
+    """Tells whether a shard has a logger run that was interrupted and can be resumed."""
+    progress = load_progress(os.path.join(shard_dir, SHARD_LOGS[0]))
+    return progress is not None and not progress["finished"]
+
+
+def read_status(campaign_dir=CAMPAIGN_DIR):
+    """Returns the status of the campaign's shards: shard name -> status entry."""
+    try:
+        with open(os.path.join(campaign_dir, STATUS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_status(status, campaign_dir=CAMPAIGN_DIR):
+    path = os.path.join(campaign_dir, STATUS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def run_campaign(slots, campaign_dir=CAMPAIGN_DIR, logger_args=(), force=False):
+    """
+    Measures all shards of a campaign on the slots in parallel. Every slot takes the
+    next pending shard once it is done with its current one. Shards completed by an
+    earlier run are skipped unless `force` is set, so a failed or interrupted campaign
+    is resumed by running it again; a shard whose logger was interrupted continues its
+    run with --resume instead of measuring its completed visits again.
+
+    Returns:
+        list: The names of the shards that failed.
+    """
+    status = read_status(campaign_dir)
+    pending = queue.Queue()
+    for shard_dir in find_shards(campaign_dir):
+        name = os.path.basename(shard_dir)
+        if force or status.get(name, {}).get("status") != "done":
+            pending.put(shard_dir)
+    total = pending.qsize()
+    print(f"{total} shards to measure on {len(slots)} slots.")
+    lock = threading.Lock()
+
+    def work(slot):
+        while True:
+            try:
+                shard_dir = pending.get_nowait()
+            except queue.Empty:
+                return
+            name = os.path.basename(shard_dir)
+            with lock:
+                status[name] = {"status": "running", "slot": slot["name"]}
+                write_status(status, campaign_dir)
+            print(f"{slot['name']}: measuring {name}")
+            start = time.time()
+            args = list(logger_args) + (["--resume"] if not force and resumable(shard_dir) else [])
+            try:
+                code = run_shard(slot, shard_dir, args)
+            except OSError as e:
+                print(f"{slot['name']}: Could not run {name}: {e}")
+                code = -1
+            with lock:
+                status[name] = {"status": "done" if code == 0 else "failed", "slot": slot["name"],
+                                "returncode": code, "seconds": round(time.time() - start, 1)}
+                write_status(status, campaign_dir)
+            print(f"{slot['name']}: {name} {status[name]['status']} after {status[name]['seconds']} s")
+
+    threads = [threading.Thread(target=work, args=(slot,), daemon=True) for slot in slots]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(name for name, entry in status.items() if entry["status"] != "done")
+
+
+def merge_tables(paths, output):
+    """
+    Concatenates per-shard tables into one CSV with a 'shard' column. Rows stay
+    grouped by shard and the columns are the union of all shards' columns.
+
+    Returns:
+        int: The number of rows written, 0 if none of the shards has the table.
+    """
+    import pandas as pd
+
+    frames = []
+    for shard, path in paths:
+        frame = read_log(path) # All segments of a resumed shard run
+        frame.insert(0, "shard", shard)
+        frames.append(frame)
+    if not frames:
+        return 0
+    merged = pd.concat(frames, ignore_index=True, sort=False)
+    merged.to_csv(output, index=False)
+    return len(merged)
+
+
+def merge_campaign(campaign_dir=CAMPAIGN_DIR):
+    """
+    Merges the logs of all shards into '<campaign_dir>/<log name>' and the CSV results
+    found in the shards' results folders into '<campaign_dir>/results/'.
+
+    Returns:
+        dict: Merged file -> number of rows.
+    """
+    from power_store import columnar_path
+
+    shards = find_shards(campaign_dir)
+    merged = {}
+    for log in SHARD_LOGS:
+        paths = [(os.path.basename(shard), os.path.join(shard, log)) for shard in shards
+                 if os.path.exists(os.path.join(shard, log)) or os.path.exists(columnar_path(os.path.join(shard, log)))]
+        output = os.path.join(campaign_dir, log)
+        rows = merge_tables(paths, output)
+        if rows:
+            merged[output] = rows
+
+    results = sorted({os.path.basename(path) for shard in shards
+                      for path in glob.glob(os.path.join(shard, RESULTS_FOLDER, "*.csv"))})
+    if results:
+        os.makedirs(os.path.join(campaign_dir, RESULTS_FOLDER), exist_ok=True)
+    for name in results:
+        paths = [(os.path.basename(shard), os.path.join(shard, RESULTS_FOLDER, name)) for shard in shards
+                 if os.path.exists(os.path.join(shard, RESULTS_FOLDER, name))]
+        output = os.path.join(campaign_dir, RESULTS_FOLDER, name)
+        merged[output] = merge_tables(paths, output)
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shard a site list, measure the shards in parallel, merge the logs.")
+    parser.add_argument("--dir", default=CAMPAIGN_DIR, help="Campaign directory (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    shard_parser = subparsers.add_parser("shard", help="Split a site list into shards")
+    shard_parser.add_argument("webs_json", help="JSON file mapping session names to URLs")
+    shard_parser.add_argument("--shards", type=int, required=True, help="Number of shards")
+    run_parser = subparsers.add_parser("run", help="Measure the pending shards on the slots")
+    run_parser.add_argument("--slots", required=True, help="JSON file with the slot definitions")
+    run_parser.add_argument("--force", action="store_true", help="Measure completed shards again")
+    run_parser.add_argument("logger_args", nargs=argparse.REMAINDER,
+                            help="Options passed on to power_logger_hwmon.py, after '--'")
+    subparsers.add_parser("merge", help="Merge the per-shard logs and results")
+    args = parser.parse_args()
+
+    if args.command == "shard":
+        try:
+            directories = shard_sites(args.webs_json, args.shards, args.dir)
+        except FileNotFoundError:
+            print(f"Error: The file '{args.webs_json}' was not found.")
+            sys.exit(1)
+        except json.JSONDecodeError:
+            print(f"Error: Could not decode JSON from '{args.webs_json}'. Please check the file format.")
+            sys.exit(1)
+        print(f"Wrote {len(directories)} shards to {args.dir}")
+    elif args.command == "run":
+        try:
+            slots = load_slots(args.slots)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load the slots from '{args.slots}': {e}")
+            sys.exit(1)
+        logger_args = args.logger_args[1:] if args.logger_args[:1] == ["--"] else args.logger_args
+        failed = run_campaign(slots, args.dir, logger_args, args.force)
+        if failed:
+            print(f"Failed shards: {', '.join(failed)}. Run the campaign again to retry them.")
+            sys.exit(1)
+        print("All shards measured.")
+    else:
+        for output, rows in merge_campaign(args.dir).items():
+            print(f"{output}: {rows} rows")
@@ -0,0 +1,198 @@
+import argparse
+import json
+import math
+import random
+import select
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from ws_protocol import OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, accept_key, encode_frame, read_frame_sync
+
+# Local stand-in for a Gen2 Shelly plug, used to try the Shelly logger without hardware:
+#   python3 fake_shelly.py --port 8080 &
+#   python3 power_logger_shelly.py --ip 127.0.0.1:8080 [--push]
+HOST = "127.0.0.1"
+PORT = 8080
+BASE_POWER = 45.0 # Mean active power reported by the emulated plug, in Watts
+PUSH_INTERVAL = 1.0 # Seconds between NotifyStatus events sent over the WebSocket channel
+
+
+class FakeShelly:
+    """
+    State of the emulated device: a slowly varying power draw and its energy total.
+    """
+
+    def __init__(self, base_power=BASE_POWER, latency=0.0, timeout_rate=0.0, error_rate=0.0,
+                 push_interval=PUSH_INTERVAL, ws_drop_after=0.0, truncate_rate=0.0):
+        self.base_power = base_power
+        self.latency = latency
+        self.timeout_rate = timeout_rate
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate # Fraction of answers cut off halfway through the body
+        self.push_interval = push_interval
+        self.ws_drop_after = ws_drop_after # Close every WebSocket after this many seconds (0: never)
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.energy_wh = 0.0
+        self.last_update = self.started
+        self.requests = 0
+
+    def power(self):
+        """Returns the current active power, a sine wave plus noise around the base power."""
+        elapsed = time.monotonic() - self.started
+        return round(self.base_power * (1 + 0.2 * math.sin(elapsed / 10)) + random.uniform(-1, 1), 1)
+
+    def switch_status(self, switch_id):
+        """Returns a Switch.GetStatus response body."""
+        with self.lock:
+            now = time.monotonic()
+            apower = self.power()
+            self.energy_wh += apower * (now - self.last_update) / 3600
+            self.last_update = now
+            self.requests += 1
+        return {
+            "id": switch_id,
+            "source": "init",
+            "output": True,
+            "apower": apower,
+            "voltage": round(230 + random.uniform(-2, 2), 1),
+            "current": round(apower / 230, 3),
+            "aenergy": {"total": round(self.energy_wh, 3), "by_minute": [0.0, 0.0, 0.0],
+                        "minute_ts": int(time.time())},
+            "temperature": {"tC": 40.0, "tF": 104.0}
+        }
+
+
+def make_handler(device):
+    class ShellyHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keeps connections open between requests, like the real device
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/rpc" and self.headers.get("Upgrade", "").lower() == "websocket":
+                self.websocket()
+                return
+            if url.path != "/rpc/Switch.GetStatus":
+                self.reply(404, {"code": 404, "message": f"No handler for {url.path}"})
+                return
+            if device.latency:
+                time.sleep(device.latency)
+            draw = random.random()
+            if draw < device.timeout_rate:
+                time.sleep(5) # Long enough for any sensible client timeout
+            elif draw < device.timeout_rate + device.error_rate:
+                self.reply(500, {"code": -105, "message": "Emulated failure"})
+                return
+            switch_id = int(parse_qs(url.query).get("id", ["0"])[0])
+            truncate = draw < device.timeout_rate + device.error_rate + device.truncate_rate
+            self.reply(200, device.switch_status(switch_id), truncate)
+
+        def websocket(self):
+            """Serves the RPC channel: answers Switch.GetStatus and pushes NotifyStatus events."""
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept_key(self.headers.get("Sec-WebSocket-Key", "")))
+            self.end_headers()
+            self.close_connection = True
+
+            sock = self.connection
+            opened = time.monotonic()
+            next_push = opened + device.push_interval
+            subscriber = None
+            try:
+                while not device.ws_drop_after or time.monotonic() - opened < device.ws_drop_after:
+                    readable, _, _ = select.select([sock], [], [], max(next_push - time.monotonic(), 0))
+                    if readable:
+                        _, opcode, payload = read_frame_sync(self.recv_exactly)
+                        if opcode == OP_CLOSE:
+                            sock.sendall(encode_frame(OP_CLOSE, payload[:2], mask=False))
+                            return
+                        if opcode == OP_PING:
+                            sock.sendall(encode_frame(OP_PONG, payload, mask=False))
+                        elif opcode == OP_TEXT:
+                            request = json.loads(payload)
+                            # Like the real device, any request with a 'src' subscribes the channel
+                            subscriber = request.get("src", subscriber)
+                            switch_id = int(request.get("params", {}).get("id", 0))
+                            self.send_message({"id": request.get("id"), "src": "shellyplug-fake",
+                                               "dst": subscriber, "result": device.switch_status(switch_id)})
+                    else:
+                        if subscriber is not None:
+                            status = device.switch_status(0)
+                            self.send_message({"src": "shellyplug-fake", "dst": subscriber, "method": "NotifyStatus",
+                                               "params": {"ts": time.time(),
+                                                          "switch:0": {"id": 0, "apower": status["apower"]}}})
+                        next_push += device.push_interval
+            except (ConnectionError, OSError, ValueError):
+                pass
+
+        def recv_exactly(self, n):
+            data = b""
+            while len(data) < n:
+                chunk = self.connection.recv(n - len(data))
+                if not chunk:
+                    raise ConnectionError("Client closed the WebSocket")
+                data += chunk
+            return data
+
+        def send_message(self, body):
+            self.connection.sendall(encode_frame(OP_TEXT, json.dumps(body).encode(), mask=False))
+
+        def reply(self, status, body, truncate=False):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if truncate:
+                # Announce the full body but send half of it and hang up, like a device rebooting mid-answer
+                payload = payload[:len(payload) // 2]
+                self.close_connection = True
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass # Keep the console quiet, one request per second would flood it
+
+    return ShellyHandler
+
+
+def serve(host=HOST, port=PORT, device=None):
+    """
+    Creates the emulator HTTP server; call serve_forever() (or run it in a thread) to start it.
+    """
+    device = device or FakeShelly()
+    server = ThreadingHTTPServer((host, port), make_handler(device))
+    server.daemon_threads = True
+    server.device = device
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate the RPC API of a Shelly plug on a local port.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--power", type=float, default=BASE_POWER, help="Mean power in Watts")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="Fraction of requests that never get a timely answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--push-interval", type=float, default=PUSH_INTERVAL,
+                        help="Seconds between NotifyStatus events on the WebSocket channel")
+    parser.add_argument("--ws-drop-after", type=float, default=0.0,
+                        help="Close each WebSocket after this many seconds to exercise the polling fallback")
+    parser.add_argument("--truncate-rate", type=float, default=0.0,
+                        help="Fraction of answers cut off halfway through the body before the connection closes")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, FakeShelly(args.power, args.latency, args.timeout_rate, args.error_rate,
+                                                    args.push_interval, args.ws_drop_after, args.truncate_rate))
+    print(f"Fake Shelly listening on http://{args.host}:{args.port}/rpc/Switch.GetStatus "
+          f"and ws://{args.host}:{args.port}/rpc")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping fake Shelly.")
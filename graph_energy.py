@@ -1,28 +1,47 @@
-import os
-import pandas as pd
-import matplotlib.pyplot as plt
-
-csv_data = os.path.join("results", "energy_consumption_shelly.csv")
-
-try:
-    df = pd.read_csv(csv_data)
-
-    # Sort the DataFrame by 'Total Energy (Wh)' in descending order
-    df_sorted = df.sort_values(by='Total Energy (Wh)', ascending=False)
-
-    plt.figure(figsize=(12, 8))
-    plt.bar(df_sorted['Session'], df_sorted['Total Energy (Wh)'], color='skyblue')
-    plt.xlabel('Session')
-    plt.ylabel('Total Energy (Wh)')
-    plt.title('Total Energy per Session (Wh)')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    filename = os.path.join("results", 'total_energy_wh_bar_chart.png')
-    plt.savefig(filename, format='png')
-
-    print("The graph 'total_energy_wh_bar_chart.png' has been generated.")
-
-except FileNotFoundError:
-    print(f"Error: The file '{csv_data}' was not found. Please ensure the file exists in the specified path.")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+import os
+import pandas as pd
+
+from graph_period import reusable_figure
+
+csv_data = os.path.join("results", "energy_consumption_shelly.csv")
+chart_output = os.path.join("results", 'total_energy_wh_bar_chart.png')
+
+
+def plot_energy_bar_chart(df, filename=chart_output):
+    """
+    Saves a bar chart of the total energy (Wh) per session, highest first.
+
+    The chart is drawn on a reusable Agg figure (see graph_period.reusable_figure),
+    so it can be drawn from a worker thread while other plots are being rendered.
+
+    Args:
+        df (pd.DataFrame): Energy summary with 'Session' and 'Total Energy (Wh)' columns.
+        filename (str): Path of the PNG file to write.
+    """
+    # Sort the DataFrame by 'Total Energy (Wh)' in descending order
+    df_sorted = df.sort_values(by='Total Energy (Wh)', ascending=False)
+
+    fig = reusable_figure((12, 8))
+    ax = fig.subplots()
+    ax.bar(df_sorted['Session'], df_sorted['Total Energy (Wh)'], color='skyblue')
+    ax.set_xlabel('Session')
+    ax.set_ylabel('Total Energy (Wh)')
+    ax.set_title('Total Energy per Session (Wh)')
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    fig.tight_layout()
+    fig.savefig(filename, format='png')
+
+    print(f"The graph '{os.path.basename(filename)}' has been generated.")
+
+
+if __name__ == "__main__":
+    try:
+        df = pd.read_csv(csv_data)
+        plot_energy_bar_chart(df)
+
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_data}' was not found. Please ensure the file exists in the specified path.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -1,144 +1,251 @@
-import os.path
-import pandas as pd
-import matplotlib.pyplot as plt
-
-DATA_FOLDER = "results"
-FUSION_DATA = "power_log_fusion.csv"
-
-def plot_separated_power_comparison(file_path=FUSION_DATA):
-    """
-    Generates separate comparative plots for 'power_shelly' and 'power_hwmon' for all sessions,
-    excluding the 'Background' session, and plotting the total available samples for each.
-
-    One plot is generated for 'power_shelly' and one for 'power_hwmon',
-    where all non-Background sessions are overlaid for each power metric,
-    showing all their data points.
-    The 'session' column is treated as a string name.
-
-    Args:
-        file_path (str): The path to the CSV file (defaults to "power_log_fusion.csv").
-    """
-    try:
-        df = pd.read_csv(file_path)
-        print(f"File '{file_path}' loaded successfully.")
-        print(f"Original columns: {df.columns.tolist()}")
-
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found.")
-        return
-    except Exception as e:
-        print(f"Error reading the CSV file: {e}")
-        return
-
-    required_columns = ['power_shelly', 'power_hwmon', 'session']
-    for col in required_columns:
-        if col not in df.columns:
-            print(f"Error: Required column '{col}' not found in the DataFrame. Ensure the CSV contains it or that renaming is correct.")
-            return
-
-    df['power_shelly'] = pd.to_numeric(df['power_shelly'], errors='coerce')
-    df['power_hwmon'] = pd.to_numeric(df['power_hwmon'], errors='coerce')
-
-    original_rows = len(df)
-    df.dropna(subset=['power_shelly', 'power_hwmon', 'session'], inplace=True)
-    rows_after_dropna = len(df)
-    print(f"Original rows: {original_rows}, Rows after NaN cleaning: {rows_after_dropna}")
-    if rows_after_dropna == 0:
-        print("Error: No valid data remaining after NaN cleaning. Cannot generate plots.")
-        return
-
-    if 'timestamp' in df.columns:
-        try:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df.sort_values(by=['session', 'timestamp'], inplace=True)
-            print("Sorting by session and timestamp.")
-        except Exception:
-            print("Warning: Could not convert 'timestamp' to datetime. Sorting by session and order of appearance.")
-            df.sort_values(by=['session'], inplace=True)
-    else:
-        df.sort_values(by=['session'], inplace=True)
-        print("Warning: 'timestamp' column not found. Sorting only by session and order of appearance.")
-
-    df_filtered = df[df['session'] != 'Background'].copy()
-    if df_filtered.empty:
-        print("No non-Background sessions found after filtering. Cannot generate plots.")
-        return
-
-    unique_sessions = df_filtered['session'].unique() # Use the filtered DataFrame for unique sessions
-    if len(unique_sessions) == 0:
-        print("Error: No unique sessions (excluding 'Background') found in the data. Cannot generate plots.")
-        return
-    unique_sessions_sorted = sorted(unique_sessions.tolist())
-    print(f"Unique sessions found (excluding 'Background', sorted): {unique_sessions_sorted}")
-
-    # --- Plotting for Power Shelly (All Samples) ---
-    print("\n--- Generating plot for Power Shelly (All Samples) ---")
-    plt.figure(figsize=(20, 10))
-
-    plt.title('Power Shelly evolution over time per Session', fontsize=16)
-    plt.xlabel('Sample Number', fontsize=12)
-    plt.ylabel('Shelly Power (W)', fontsize=12)
-    plt.grid(True, linestyle=':', alpha=0.7)
-
-    plotted_any_line_shelly = False
-
-    for session_name in unique_sessions_sorted:
-        session_subset = df_filtered[df_filtered['session'] == session_name].reset_index(drop=True)
-
-        if not session_subset.empty:
-            plotted_any_line_shelly = True
-            print(f"Plotting Shelly for Session '{session_name}', all samples ({len(session_subset)}).")
-            plt.plot(session_subset.index, session_subset['power_shelly'],
-                     label=f'{session_name}', alpha=0.7)
-        else:
-            print(f"Warning: No Shelly data for Session '{session_name}'. Skipping plot.")
-
-    if plotted_any_line_shelly:
-        plt.legend(title='Session', bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=8, ncol=1)
-        plt.tight_layout(rect=[0, 0, 0.85, 1])
-        filename = os.path.join(DATA_FOLDER, "graph_shelly_all_samples.png")
-        plt.savefig(filename, bbox_inches='tight')
-        plt.show()
-    else:
-        print(f"No Shelly lines were plotted. No legend or plot will be shown.")
-        plt.close()
-
-    # --- Plotting for Power Hwmon (All Samples) ---
-    print("\n--- Generating plot for Power Hwmon (All Samples) ---")
-    plt.figure(figsize=(20, 10))
-
-    plt.title('Power Hwmon evolution over time per Session', fontsize=16)
-    plt.xlabel('Sample Number', fontsize=12)
-    plt.ylabel('Hwmon Power (W)', fontsize=12)
-    plt.grid(True, linestyle=':', alpha=0.7)
-
-    plotted_any_line_hwmon = False
-
-    for session_name in unique_sessions_sorted:
-        session_subset = df_filtered[df_filtered['session'] == session_name].reset_index(drop=True)
-
-        if not session_subset.empty:
-            plotted_any_line_hwmon = True
-            print(f"Plotting Hwmon for Session '{session_name}', all samples ({len(session_subset)}).")
-            plt.plot(session_subset.index, session_subset['power_hwmon'],
-                     label=f'{session_name}', alpha=0.7)
-        else:
-            print(f"Warning: No Hwmon data for Session '{session_name}'. Skipping plot.")
-
-    if plotted_any_line_hwmon:
-        plt.legend(title='Session', bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=8, ncol=1)
-        plt.tight_layout(rect=[0, 0, 0.85, 1])
-        filename = os.path.join(DATA_FOLDER, "graph_hwmon_all_samples.png")
-        plt.savefig(filename, bbox_inches='tight')
-        plt.show()
-    else:
-        print(f"No Hwmon lines were plotted. No legend or plot will be shown.")
-        plt.close()
-
-
-if __name__ == "__main__":
-    if not os.path.exists(DATA_FOLDER):
-        os.makedirs(DATA_FOLDER)
-        print(f"Folder '{DATA_FOLDER}' created.")
-
-    plot_separated_power_comparison(FUSION_DATA)
\ No newline at end of file
+import os.path
+import threading
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from power_clock import to_datetime
+from power_correction import BASELINE_SESSIONS
+from power_resample import PLOT_POINTS, lttb, power_envelope
+from power_store import read_table
+from session_index import load_index
+
+DATA_FOLDER = "results"
+FUSION_DATA = "power_log_fusion.csv"
+
+_figures = threading.local()
+
+
+def reusable_figure(figsize):
+    """
+    Returns an empty Figure of `figsize` drawn by the non-interactive Agg canvas.
+
+    Figures are kept per thread and cleared for the next plot instead of being
+    created anew, which saves most of the setup cost when many plots are rendered
+    in a row (e.g. by render_batch.py). Nothing goes through pyplot's global
+    state, so no window is opened and worker threads do not interfere.
+    """
+    cache = getattr(_figures, "cache", None)
+    if cache is None:
+        cache = _figures.cache = {}
+    fig = cache.get(figsize)
+    if fig is None:
+        fig = cache[figsize] = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+    else:
+        fig.clear()
+    return fig
+
+
+def plot_power_over_samples(session_groups, power_column, name, filename):
+    """
+    Overlays `power_column` of every session against its sample number and saves the plot.
+
+    Sessions longer than PLOT_POINTS samples are downsampled with LTTB, which keeps
+    their peaks and shape.
+
+    Args:
+        session_groups (dict): Session name -> its rows in time order, in plotting order.
+        power_column (str): Column to plot.
+        name (str): Name of the power source used in titles and messages.
+        filename (str): Path of the PNG file to write.
+
+    Returns:
+        bool: Whether any line was plotted (and the file written).
+    """
+    print(f"\n--- Generating plot for Power {name} (All Samples) ---")
+    fig = reusable_figure((20, 10))
+    ax = fig.subplots()
+
+    ax.set_title(f'Power {name} evolution over time per Session', fontsize=16)
+    ax.set_xlabel('Sample Number', fontsize=12)
+    ax.set_ylabel(f'{name} Power (W)', fontsize=12)
+    ax.grid(True, linestyle=':', alpha=0.7)
+
+    plotted_any_line = False
+
+    for session_name, session_subset in session_groups.items():
+        if not session_subset.empty:
+            plotted_any_line = True
+            values = session_subset[power_column].to_numpy()
+            kept = lttb(range(len(values)), values, PLOT_POINTS)
+            print(f"Plotting {name} for Session '{session_name}', {len(kept)} of {len(values)} samples.")
+            ax.plot(kept, values[kept], label=f'{session_name}', alpha=0.7)
+        else:
+            print(f"Warning: No {name} data for Session '{session_name}'. Skipping plot.")
+
+    if plotted_any_line:
+        ax.legend(title='Session', bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=8, ncol=1)
+        fig.tight_layout(rect=[0, 0, 0.85, 1])
+        fig.savefig(filename, bbox_inches='tight')
+    else:
+        print(f"No {name} lines were plotted. No plot will be saved.")
+    return plotted_any_line
+
+
+def plot_power_envelope(file_path, power_column, name, filename, points=PLOT_POINTS):
+    """
+    Plots the min/max band and mean of `power_column` over time for every
+    non-baseline session, read from the coarsest aggregate level of `file_path`
+    (see power_resample.py) that still gives `points` buckets over the whole log.
+
+    Returns:
+        bool: Whether the plot was written; False if no up-to-date level fits.
+    """
+    result = power_envelope(file_path, power_column, points)
+    if result is None:
+        print(f"No aggregate levels of '{file_path}' fit {points} points; skipping the {name} overview.")
+        return False
+    width, envelope = result
+    envelope = envelope[~envelope['session'].isin(BASELINE_SESSIONS)]
+    if envelope.empty:
+        print(f"No non-baseline {name} buckets found. No overview will be saved.")
+        return False
+
+    print(f"\n--- Generating overview for Power {name} ({width} s buckets) ---")
+    fig = reusable_figure((20, 10))
+    ax = fig.subplots()
+    ax.set_title(f'Power {name} over time ({width} s min/max/mean)', fontsize=16)
+    ax.set_xlabel('Time', fontsize=12)
+    ax.set_ylabel(f'{name} Power (W)', fontsize=12)
+    ax.grid(True, linestyle=':', alpha=0.7)
+    for session_name, buckets in envelope.groupby('session', sort=True, observed=True):
+        times = pd.to_datetime(buckets['bucket_ns'])
+        line, = ax.plot(times, buckets['mean'], label=f'{session_name}', alpha=0.9)
+        ax.fill_between(times, buckets['min'], buckets['max'], color=line.get_color(), alpha=0.2)
+    ax.legend(title='Session', bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=8, ncol=1)
+    fig.tight_layout(rect=[0, 0, 0.85, 1])
+    fig.savefig(filename, bbox_inches='tight')
+    return True
+
+
+def plot_power_overviews(file_path=FUSION_DATA, output_folder=DATA_FOLDER):
+    """
+    Draws the time-axis overviews of 'power_shelly' and 'power_hwmon' from the aggregate levels of `file_path`.
+    """
+    plot_power_envelope(file_path, 'power_shelly', 'Shelly', os.path.join(output_folder, "graph_shelly_overview.png"))
+    plot_power_envelope(file_path, 'power_hwmon', 'Hwmon', os.path.join(output_folder, "graph_hwmon_overview.png"))
+
+
+def group_sessions(df):
+    """
+    Splits fused data into its non-baseline sessions with one groupby pass.
+
+    Returns:
+        dict: Session name -> its valid rows in time order, sorted by name; None if nothing is left.
+    """
+    df['power_shelly'] = pd.to_numeric(df['power_shelly'], errors='coerce')
+    df['power_hwmon'] = pd.to_numeric(df['power_hwmon'], errors='coerce')
+
+    original_rows = len(df)
+    df.dropna(subset=['power_shelly', 'power_hwmon', 'session'], inplace=True)
+    rows_after_dropna = len(df)
+    print(f"Original rows: {original_rows}, Rows after NaN cleaning: {rows_after_dropna}")
+    if rows_after_dropna == 0:
+        print("Error: No valid data remaining after NaN cleaning. Cannot generate plots.")
+        return None
+
+    if 'timestamp' in df.columns:
+        try:
+            df['timestamp'] = to_datetime(df['timestamp'])
+            df.sort_values(by=['session', 'timestamp'], inplace=True)
+            print("Sorting by session and timestamp.")
+        except Exception:
+            print("Warning: Could not convert 'timestamp' to datetime. Sorting by session and order of appearance.")
+            df.sort_values(by=['session'], inplace=True)
+    else:
+        df.sort_values(by=['session'], inplace=True)
+        print("Warning: 'timestamp' column not found. Sorting only by session and order of appearance.")
+
+    df_filtered = df[~df['session'].isin(BASELINE_SESSIONS)]
+    if df_filtered.empty:
+        print("No non-baseline sessions found after filtering. Cannot generate plots.")
+        return None
+
+    # One grouping pass serves both plots
+    return dict(sorted(((str(session_name), group) for session_name, group
+                        in df_filtered.groupby('session', sort=False, observed=True)),
+                       key=lambda item: item[0]))
+
+
+def index_sessions(df, index):
+    """
+    Takes the non-baseline sessions of fused data as row slices given by its
+    session index; fused logs are in time order, so no sorting or scanning is needed.
+
+    Returns:
+        dict: Session name -> its valid rows in time order, sorted by name; None if nothing is left.
+    """
+    session_groups = {}
+    for session_name, group in sorted(index.groups(df, exclude=BASELINE_SESSIONS).items()):
+        powers = group[['power_shelly', 'power_hwmon']].apply(pd.to_numeric, errors='coerce').dropna()
+        if not powers.empty:
+            session_groups[str(session_name)] = powers
+    if not session_groups:
+        print("No non-baseline sessions found in the session index. Cannot generate plots.")
+        return None
+    return session_groups
+
+
+def plot_separated_power_comparison(file_path=FUSION_DATA, df=None, output_folder=DATA_FOLDER, index=None):
+    """
+    Generates separate comparative plots for 'power_shelly' and 'power_hwmon' for all sessions,
+    excluding the baseline sessions ('Background' and the 'Idle' pauses), and plotting
+    the total available samples for each.
+
+    One plot is generated for 'power_shelly' and one for 'power_hwmon',
+    where all non-baseline sessions are overlaid for each power metric,
+    showing all their data points. The data is split into sessions once and
+    both plots draw from the same groups.
+    The 'session' column is treated as a string name.
+
+    Args:
+        file_path (str): The path to the CSV file (defaults to "power_log_fusion.csv"), or its columnar store.
+        df (pd.DataFrame): Already loaded fused data to plot instead of reading `file_path`.
+        output_folder (str): Folder the PNG files are written to.
+        index (SessionIndex): Session index of the data; loaded from `file_path` if not given.
+                              Sessions are then taken as slices instead of grouping every row.
+    """
+    try:
+        if df is None:
+            df = read_table(file_path)
+            print(f"File '{file_path}' loaded successfully.")
+        else:
+            df = df.copy()
+        print(f"Original columns: {df.columns.tolist()}")
+
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found.")
+        return
+    except Exception as e:
+        print(f"Error reading the CSV file: {e}")
+        return
+
+    required_columns = ['power_shelly', 'power_hwmon', 'session']
+    for col in required_columns:
+        if col not in df.columns:
+            print(f"Error: Required column '{col}' not found in the DataFrame. Ensure the CSV contains it or that renaming is correct.")
+            return
+
+    index = index or load_index(file_path)
+    if index is not None and index.matches(df):
+        session_groups = index_sessions(df, index)
+    else:
+        session_groups = group_sessions(df)
+    if not session_groups:
+        return
+    print(f"Unique sessions found (excluding baseline sessions, sorted): {list(session_groups)}")
+
+    plot_power_over_samples(session_groups, 'power_shelly', 'Shelly',
+                            os.path.join(output_folder, "graph_shelly_all_samples.png"))
+    plot_power_over_samples(session_groups, 'power_hwmon', 'Hwmon',
+                            os.path.join(output_folder, "graph_hwmon_all_samples.png"))
+
+
+if __name__ == "__main__":
+    if not os.path.exists(DATA_FOLDER):
+        os.makedirs(DATA_FOLDER)
+        print(f"Folder '{DATA_FOLDER}' created.")
+
+    plot_separated_power_comparison(FUSION_DATA)
+    plot_power_overviews(FUSION_DATA)
\ No newline at end of file
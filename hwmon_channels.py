@@ -0,0 +1,120 @@
+import glob
+import os
+import re
+from collections import namedtuple
+
+HWMON_ROOT = "/sys/class/hwmon"
+POWERCAP_ROOT = "/sys/class/powercap"
+
+# sysfs attributes logged by the hwmon logger: instantaneous/averaged power (microWatts)
+# and cumulative energy counters (microJoules)
+CHANNEL_FILE_PATTERN = re.compile(r"^(power\d+_(?:input|average)|energy\d+_input)$")
+# Column names written for those attributes, e.g. 'fam15h_power.power1_input'
+COLUMN_PATTERN = re.compile(r"\.(power|energy)\d+_(?:input|average)$")
+
+Channel = namedtuple("Channel", ["label", "path", "kind", "scale", "max_range"], defaults=(None,))
+Channel.__doc__ = """
+A readable hwmon attribute.
+
+Fields:
+    label (str): Column name, '<sensor name>.<attribute>'.
+    path (str): sysfs path of the attribute.
+    kind (str): 'power' for Watts readings, 'energy' for cumulative Joules counters.
+    scale (float): Factor converting the raw integer into Watts or Joules.
+    max_range (int): Raw value at which an energy counter wraps back to zero, None if unknown.
+"""
+
+
+def discover_channels(root=HWMON_ROOT):
+    """
+    Enumerates every power and energy attribute under the hwmon class directory.
+
+    Sensors sharing a name (e.g. one 'fam15h_power' per socket) get the hwmon
+    directory appended to keep their labels unique.
+
+    Returns:
+        list: Channel tuples sorted by hwmon device and attribute name.
+    """
+    devices = []
+    for name_path in sorted(glob.glob(os.path.join(root, "hwmon*", "name"))):
+        try:
+            with open(name_path, "r") as f:
+                devices.append((os.path.dirname(name_path), f.read().strip()))
+        except OSError:
+            continue # The device disappeared or is not readable
+
+    names = [name for _, name in devices]
+    channels = []
+    for device_dir, name in devices:
+        sensor = name if names.count(name) == 1 else f"{name}@{os.path.basename(device_dir)}"
+        for attribute in sorted(os.listdir(device_dir)):
+            if not CHANNEL_FILE_PATTERN.match(attribute):
+                continue
+            path = os.path.join(device_dir, attribute)
+            if not os.access(path, os.R_OK):
+                continue
+            kind = "energy" if attribute.startswith("energy") else "power"
+            channels.append(Channel(f"{sensor}.{attribute}", path, kind, 1e-6))
+    return channels
+
+
+def discover_counters(hwmon_root=HWMON_ROOT, powercap_root=POWERCAP_ROOT):
+    """
+    Enumerates the cumulative energy counters: hwmon energy*_input attributes and
+    the RAPL zones under the powercap class (package, core, uncore, dram...).
+
+    RAPL counters wrap at max_energy_range_uj, which is recorded so increments
+    across a wrap can be reconstructed. Reading energy_uj usually requires root.
+
+    Returns:
+        list: Channel tuples of kind 'energy'.
+    """
+    counters = [channel for channel in discover_channels(hwmon_root) if channel.kind == "energy"]
+
+    zones = []
+    for energy_path in sorted(glob.glob(os.path.join(powercap_root, "*", "energy_uj"))):
+        zone_dir = os.path.dirname(energy_path)
+        if not os.access(energy_path, os.R_OK):
+            continue
+        try:
+            with open(os.path.join(zone_dir, "name"), "r") as f:
+                name = f.read().strip()
+            with open(os.path.join(zone_dir, "max_energy_range_uj"), "r") as f:
+                max_range = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        zones.append((zone_dir, name, energy_path, max_range))
+
+    names = [name for _, name, _, _ in zones]
+    for zone_dir, name, energy_path, max_range in zones:
+        zone = name if names.count(name) == 1 else f"{name}@{os.path.basename(zone_dir)}"
+        counters.append(Channel(f"{zone}.energy_uj", energy_path, "energy", 1e-6, max_range))
+    return counters
+
+
+def find_primary_channel(channels, sensor_name):
+    """
+    Returns the channel logged in the legacy 'power' column: power1_input of the
+    first sensor whose name contains `sensor_name`, or None if there is none.
+    """
+    for channel in channels:
+        sensor, attribute = channel.label.rsplit(".", 1)
+        if sensor_name in sensor and attribute == "power1_input":
+            return channel
+    return None
+
+
+def channel_kind(column):
+    """
+    Returns 'power' or 'energy' for a logged channel column name, None for any other column.
+    """
+    match = COLUMN_PATTERN.search(column)
+    return match.group(1) if match else None
+
+
+def channel_columns(columns, kind=None):
+    """
+    Filters the channel columns out of a list of column names, optionally by kind.
+    """
+    return [column for column in columns
+            if channel_kind(column) is not None and (kind is None or channel_kind(column) == kind)]
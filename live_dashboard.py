@@ -0,0 +1,323 @@
+import argparse
+import json
+import socket
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Live view of a running measurement. The loggers started with --live send every
+# sample as a small UDP datagram to this process, which keeps per stream (one per
+# logger or Shelly device) a ring buffer of the latest samples, rolling mean/min/max
+# over the last WINDOW samples and the running energy of every session, and serves
+# them over HTTP:
+#   python3 live_dashboard.py &
+#   python3 power_logger_hwmon.py webs.json --live 127.0.0.1:8765
+#   curl http://127.0.0.1:8766/stats      (or /events for a Server-Sent Events stream)
+# Every update is O(1) and all buffers are bounded, so it can run for days. UDP keeps
+# the loggers independent of the dashboard: a missing or slow dashboard costs them
+# one non-blocking send per sample and never delays a reading.
+
+HOST = "127.0.0.1"
+LIVE_PORT = 8765 # UDP port the loggers publish to
+HTTP_PORT = 8766 # Next to LIVE_PORT; 8080 is taken by fake_shelly.py
+CAPACITY = 3600 # Samples kept per stream for /history
+WINDOW = 60 # Samples in the rolling statistics
+MAX_SESSIONS = 1000 # Sessions whose running energy is kept per stream, oldest dropped first
+SSE_INTERVAL = 1.0 # Seconds between Server-Sent Events
+
+
+def parse_address(address, default_port=LIVE_PORT):
+    """Splits 'host:port' (or 'host', or ':port') into a (host, port) tuple."""
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or HOST, int(port) if port else default_port
+
+
+class LivePublisher:
+    """
+    Sends samples of one stream to the dashboard. Sending never blocks; samples the
+    socket cannot take right away are dropped.
+
+    Args:
+        address (tuple): (host, port) of the dashboard's UDP socket.
+        stream (str): Name of the stream, e.g. 'hwmon' or 'shelly:plug1'.
+    """
+
+    def __init__(self, address, stream):
+        self.address = address
+        self.stream = stream
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.dropped = 0
+
+    def publish(self, timestamp, power, session=None):
+        """
+        Sends one sample: epoch ns timestamp, power in Watts and session name. Samples
+        without a session (the Shelly logger's) are booked to the session of the latest
+        sample that had one.
+        """
+        message = json.dumps({"s": self.stream, "t": timestamp, "p": power, "n": session}).encode()
+        try:
+            self.socket.sendto(message, self.address)
+        except OSError:
+            self.dropped += 1
+
+    def close(self):
+        self.socket.close()
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of (timestamp, value) pairs; appending overwrites the oldest."""
+
+    def __init__(self, capacity=CAPACITY):
+        self.timestamps = array('q', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.capacity = capacity
+        self.head = 0 # Next slot to write
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def items(self, last=None):
+        """Returns the newest `last` (default: all) pairs, oldest first."""
+        n = self.count if last is None else min(last, self.count)
+        start = (self.head - n) % self.capacity
+        return [(self.timestamps[(start + i) % self.capacity], self.values[(start + i) % self.capacity])
+                for i in range(n)]
+
+
+class RollingStats:
+    """
+    Mean, minimum and maximum of the last `window` values in O(1) per value:
+    a running sum over a ring of the values, and monotonic deques whose fronts hold
+    the current minimum and maximum (each value enters and leaves each deque once).
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.values = array('d', bytes(8 * window))
+        self.index = 0 # Number of values added so far
+        self.total = 0.0
+        self.minima = deque() # (index, value), values increasing
+        self.maxima = deque() # (index, value), values decreasing
+
+    def add(self, value):
+        slot = self.index % self.window
+        if self.index >= self.window:
+            self.total -= self.values[slot]
+        self.values[slot] = value
+        self.total += value
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((self.index, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((self.index, value))
+        oldest = self.index - self.window + 1
+        if self.minima[0][0] < oldest:
+            self.minima.popleft()
+        if self.maxima[0][0] < oldest:
+            self.maxima.popleft()
+        self.index += 1
+
+    def summary(self):
+        n = min(self.index, self.window)
+        if not n:
+            return {"mean": None, "min": None, "max": None}
+        return {"mean": self.total / n, "min": self.minima[0][1], "max": self.maxima[0][1]}
+
+
+class Stream:
+    """Live state of one stream: recent samples, rolling statistics and per-session energy."""
+
+    def __init__(self, capacity=CAPACITY, window=WINDOW, max_sessions=MAX_SESSIONS):
+        self.buffer = RingBuffer(capacity)
+        self.stats = RollingStats(window)
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict() # session -> [energy in J, samples, first ns, last ns]
+        self.session = None
+        self.last = None # (timestamp, power) of the previous sample
+        self.samples = 0
+
+    def add(self, timestamp, power, session):
+        self.buffer.append(timestamp, power)
+        self.stats.add(power)
+        self.samples += 1
+        entry = self.sessions.get(session)
+        if entry is None:
+            entry = self.sessions[session] = [0.0, 0, timestamp, timestamp]
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        elif session != self.session:
+            # A session name seen before (e.g. Idle) continues its total; move it to the newest end
+            self.sessions.move_to_end(session)
+        # Rectangle rule like the loggers: the power is held since the previous sample of the same session
+        if self.last is not None and session == self.session:
+            entry[0] += power * (timestamp - self.last[0]) / 1e9
+        entry[1] += 1
+        entry[3] = timestamp
+        self.session = session
+        self.last = (timestamp, power)
+
+    def summary(self):
+        timestamp, power = self.last if self.last else (None, None)
+        entry = self.sessions.get(self.session)
+        return {"timestamp": timestamp, "power": power, "session": self.session, "samples": self.samples,
+                "window": self.stats.summary(),
+                "session_energy_j": entry[0] if entry else None}
+
+
+class Dashboard:
+    """
+    Receives the published samples on a UDP socket and keeps one Stream per stream name.
+    """
+
+    def __init__(self, host=HOST, port=LIVE_PORT, capacity=CAPACITY, window=WINDOW):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.capacity = capacity
+        self.window = window
+        self.streams = {}
+        self.lock = threading.Lock()
+        self.received = 0
+        self.invalid = 0
+        self.session = None # Session of the latest sample that had one
+
+    def receive_forever(self):
+        while True:
+            data, _ = self.socket.recvfrom(65535)
+            try:
+                sample = json.loads(data)
+                name, timestamp, power, session = sample["s"], int(sample["t"]), float(sample["p"]), sample["n"]
+            except (ValueError, KeyError, TypeError):
+                self.invalid += 1
+                continue
+            with self.lock:
+                if session is None:
+                    session = self.session
+                else:
+                    self.session = session
+                stream = self.streams.get(name)
+                if stream is None:
+                    stream = self.streams[name] = Stream(self.capacity, self.window)
+                stream.add(timestamp, power, session)
+                self.received += 1
+
+    def start(self):
+        """Receives in a background thread."""
+        threading.Thread(target=self.receive_forever, daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {"received": self.received, "invalid": self.invalid,
+                    "streams": {name: stream.summary() for name, stream in self.streams.items()}}
+
+    def sessions(self):
+        with self.lock:
+            return {name: [{"session": session, "energy_j": energy, "energy_wh": energy / 3600, "samples": samples,
+                            "first_ns": first_ns, "last_ns": last_ns}
+                           for session, (energy, samples, first_ns, last_ns) in stream.sessions.items()]
+                    for name, stream in self.streams.items()}
+
+    def history(self, name, last=None):
+        with self.lock:
+            stream = self.streams.get(name)
+            return [{"timestamp": timestamp, "power": power} for timestamp, power in stream.buffer.items(last)] \
+                if stream else None
+
+
+def make_handler(dashboard):
+    class DashboardHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/stats":
+                self.reply(200, dashboard.stats())
+            elif url.path == "/sessions":
+                self.reply(200, dashboard.sessions())
+            elif url.path == "/history":
+                try:
+                    last = int(query["last"][0]) if "last" in query else None
+                except ValueError:
+                    self.reply(400, {"error": f"'last' must be an integer, not '{query['last'][0]}'"})
+                    return
+                if last is not None and last < 0:
+                    self.reply(400, {"error": "'last' must not be negative"})
+                    return
+                history = dashboard.history(query.get("stream", [""])[0], last)
+                if history is None:
+                    self.reply(404, {"error": "Unknown stream"})
+                else:
+                    self.reply(200, history)
+            elif url.path == "/events":
+                self.events()
+            else:
+                self.reply(404, {"error": f"No handler for {url.path}",
+                                 "endpoints": ["/stats", "/sessions", "/history?stream=NAME&last=N", "/events"]})
+
+        def events(self):
+            """Streams the /stats document as a Server-Sent Event every SSE_INTERVAL seconds."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                while True:
+                    self.wfile.write(f"data: {json.dumps(dashboard.stats())}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(SSE_INTERVAL)
+            except (ConnectionError, OSError):
+                pass
+
+        def reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass # One request per second from a dashboard page would flood the console
+
+    return DashboardHandler
+
+
+def serve(host=HOST, http_port=HTTP_PORT, live_port=LIVE_PORT, dashboard=None):
+    """
+    Creates the dashboard (receiving in the background) and its HTTP server; call
+    serve_forever() (or run it in a thread) to start serving.
+    """
+    dashboard = dashboard or Dashboard(host, live_port)
+    dashboard.start()
+    server = ThreadingHTTPServer((host, http_port), make_handler(dashboard))
+    server.daemon_threads = True
+    server.dashboard = dashboard
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve live power statistics published by the loggers.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=HTTP_PORT, help="HTTP port (default: %(default)s)")
+    parser.add_argument("--live-port", type=int, default=LIVE_PORT,
+                        help="UDP port the loggers publish to (default: %(default)s)")
+    parser.add_argument("--capacity", type=int, default=CAPACITY, help="Samples kept per stream (default: %(default)s)")
+    parser.add_argument("--window", type=int, default=WINDOW,
+                        help="Samples in the rolling statistics (default: %(default)s)")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.live_port,
+                   Dashboard(args.host, args.live_port, args.capacity, args.window))
+    print(f"Live dashboard on http://{args.host}:{args.port}/stats (and /sessions, /history, /events), "
+          f"receiving samples on udp://{args.host}:{args.live_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping live dashboard.")
@@ -0,0 +1,105 @@
+import os
+import time
+
+from process_attribution import PROC, parse_busy
+
+# Self-instrumentation of the loggers. The loggers run on the machine they measure,
+# so their own CPU time is part of the hwmon and Shelly readings. An OverheadMeter
+# collects, per summary window (a session of the hwmon logger, a fixed interval of
+# the Shelly logger): the number and duration of loop iterations, the time spent
+# writing the log, the logger's CPU time and the machine's busy CPU time. The
+# logger's CPU time, priced at the machine's marginal energy per busy CPU second
+# (see marginal_energy), lets obtain_energy.py estimate and subtract the energy the
+# loggers themselves consumed. Every measurement is a clock read, so the meter adds
+# well under a microsecond per loop iteration.
+
+OVERHEAD_FIELDS = ["first_ns", "last_ns", "duration_s", "loops", "loop_mean_us", "loop_max_us", "io_ms",
+                   "cpu_s", "busy_cpu_s", "cpu_share"]
+CLOCK_TICK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100 # /proc/stat ticks per second
+
+
+def marginal_energy(energy_j, busy_cpu_s, duration_s, idle_power_w, idle_busy_rate):
+    """
+    Returns the energy in Joules one busy CPU second costs above the idle level: the
+    energy used beyond `idle_power_w` over `duration_s`, divided by the busy CPU time
+    beyond the idle windows' `idle_busy_rate` (busy CPU seconds per second). The idle
+    power is drawn whether the loggers run or not, so it is never charged to them.
+    Returns 0 when the energy or the busy time does not exceed the idle level.
+    """
+    excess_j = energy_j - idle_power_w * duration_s
+    excess_busy_s = busy_cpu_s - idle_busy_rate * duration_s
+    return excess_j / excess_busy_s if excess_j > 0 and excess_busy_s > 0 else 0.0
+
+
+class OverheadMeter:
+    """
+    Accumulates the loop timing, I/O time and CPU time of a logger over one summary window.
+
+    Args:
+        clock (MonotonicClock): Clock of the logger, for the epoch timestamps of the window.
+        proc (str): Mount point of procfs; without /proc/stat the machine's busy time is not recorded.
+    """
+
+    def __init__(self, clock, proc=PROC):
+        self.clock = clock
+        try:
+            self.stat_fd = os.open(os.path.join(proc, "stat"), os.O_RDONLY)
+        except OSError:
+            self.stat_fd = None
+        self.start()
+
+    def busy_ticks(self):
+        return parse_busy(os.pread(self.stat_fd, 4096, 0)) if self.stat_fd is not None else None
+
+    def start(self):
+        """Starts a new window."""
+        self.first_ns = self.clock.now_ns()
+        self.start_mono_ns = time.monotonic_ns()
+        self.start_cpu_ns = time.process_time_ns()
+        self.start_busy = self.busy_ticks()
+        self.loops = 0
+        self.loop_sum_ns = 0
+        self.loop_max_ns = 0
+        self.io_ns = 0
+
+    def loop(self, elapsed_ns):
+        """Records one loop iteration that kept the logger busy for `elapsed_ns`."""
+        self.loops += 1
+        self.loop_sum_ns += elapsed_ns
+        if elapsed_ns > self.loop_max_ns:
+            self.loop_max_ns = elapsed_ns
+
+    def io(self, elapsed_ns):
+        """Records `elapsed_ns` spent writing the log."""
+        self.io_ns += elapsed_ns
+
+    def summary(self):
+        """
+        Ends the window and starts the next one.
+
+        Returns:
+            dict: The window's OVERHEAD_FIELDS; 'busy_cpu_s' and 'cpu_share' are empty without /proc/stat.
+        """
+        cpu_s = (time.process_time_ns() - self.start_cpu_ns) / 1e9
+        busy = self.busy_ticks()
+        busy_s = (busy - self.start_busy) / CLOCK_TICK if busy is not None else None
+        summary = {
+            "first_ns": self.first_ns,
+            "last_ns": self.clock.now_ns(),
+            "duration_s": round((time.monotonic_ns() - self.start_mono_ns) / 1e9, 3),
+            "loops": self.loops,
+            "loop_mean_us": round(self.loop_sum_ns / self.loops / 1000, 1) if self.loops else 0,
+            "loop_max_us": round(self.loop_max_ns / 1000, 1),
+            "io_ms": round(self.io_ns / 1e6, 3),
+            "cpu_s": round(cpu_s, 4),
+            "busy_cpu_s": round(busy_s, 2) if busy_s is not None else "",
+            # Tick-granular busy time can trail the precise process time in short windows
+            "cpu_share": round(min(cpu_s / busy_s, 1.0), 5) if busy_s else "",
+        }
+        self.start()
+        return summary
+
+    def close(self):
+        if self.stat_fd is not None:
+            os.close(self.stat_fd)
+            self.stat_fd = None
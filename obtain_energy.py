@@ -1,105 +1,619 @@
-import os
-import pandas as pd
-
-RESULTS_FOLDER = "results"
-FUSION_DATA = os.path.join(RESULTS_FOLDER, "power_log_corrected.csv")
-
-def calculate_energy_consumption(file_path=FUSION_DATA, power_column='power_shelly'):
-    """
-    Calculates the total energy consumed per session from power data
-    and the time difference between samples.
-
-    Args:
-        file_path (str): The path to the CSV file containing the data.
-        power_column (str): The name of the column containing the power data
-                            ('power_shelly' or 'power_hwmon').
-
-    Returns:
-        pd.DataFrame: A DataFrame with the total energy consumed (in Joules and Wh)
-                      per session, or None if there's an error.
-    """
-    try:
-        df = pd.read_csv(file_path)
-        print(f"File '{file_path}' loaded successfully.")
-        print(f"Original columns: {df.columns.tolist()}")
-
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found.")
-        return None
-    except Exception as e:
-        print(f"Error reading the CSV file: {e}")
-        return None
-
-    required_columns = [power_column, 'session', 'timestamp']
-    for col in required_columns:
-        if col not in df.columns:
-            print(f"Error: Required column '{col}' not found in the DataFrame. Cannot calculate energy.")
-            return None
-
-    df[power_column] = pd.to_numeric(df[power_column], errors='coerce')
-
-    try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-    except Exception as e:
-        print(f"Error: Could not convert 'timestamp' column to datetime format: {e}")
-        print("Ensure the 'timestamp' column is in a recognized format (e.g., ISO 8601, '%Y-%m-%d %H:%M:%S').")
-        return None
-
-    df.sort_values(by=['session', 'timestamp'], inplace=True)
-
-    original_rows = len(df)
-    df.dropna(subset=[power_column, 'session', 'timestamp'], inplace=True)
-    rows_after_dropna = len(df)
-    if original_rows != rows_after_dropna:
-        print(f"Warning: {original_rows - rows_after_dropna} rows with critical NaN values were removed.")
-    if rows_after_dropna == 0:
-        print("Error: No valid data remaining after NaN cleaning. Cannot calculate energy.")
-        return None
-
-    df_filtered = df[df['session'] != 'Background'].copy()
-    if df_filtered.empty:
-        print("No valid sessions remaining for calculation after filtering 'Background'.")
-        return None
-
-    energy_results = []
-    unique_sessions = df_filtered['session'].unique()
-    print(f"\nCalculating energy for {len(unique_sessions)} sessions...")
-
-    for session_name in unique_sessions:
-        session_df = df_filtered[df_filtered['session'] == session_name].copy()
-        session_df['time_delta'] = session_df['timestamp'].diff().dt.total_seconds()
-        session_df['time_delta'] = session_df['time_delta'].bfill()
-        session_df['time_delta'] = session_df['time_delta'].fillna(0)
-
-        session_df['energy_joules'] = session_df[power_column] * session_df['time_delta']
-
-        total_energy_joules = session_df['energy_joules'].sum()
-
-        total_energy_wh = total_energy_joules / 3600
-        total_energy_kwh = total_energy_wh / 1000
-
-        energy_results.append({
-            'Session': session_name,
-            'Total Energy (Joules)': total_energy_joules,
-            'Total Energy (Wh)': total_energy_wh,
-            'Total Energy (kWh)': total_energy_kwh
-        })
-
-    if not energy_results:
-        print("Could not calculate energy for any session.")
-        return None
-
-    energy_df = pd.DataFrame(energy_results)
-    return energy_df
-
-
-if __name__ == "__main__":
-    energy_df_shelly = calculate_energy_consumption(FUSION_DATA, 'power_shelly')
-
-    if energy_df_shelly is not None:
-        print("\n--- Energy Consumption Summary per Session (using power_shelly) ---")
-        print(energy_df_shelly.to_string(index=False))
-
-        energy_output_csv = os.path.join(RESULTS_FOLDER, 'energy_consumption_shelly.csv')
-        energy_df_shelly.to_csv(energy_output_csv, index=False)
-        print(f"\nEnergy results saved to: {energy_output_csv}")
\ No newline at end of file
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+from hwmon_channels import channel_columns, channel_kind
+from logger_overhead import marginal_energy
+from power_clock import to_datetime
+from power_correction import BASELINE_SESSIONS
+from power_store import read_table, resolve
+from trial_scheduler import mean_ci
+
+RESULTS_FOLDER = "results"
+FUSION_DATA = os.path.join(RESULTS_FOLDER, "power_log_corrected.csv")
+RAW_FUSION_DATA = "power_log_fusion.csv"
+COUNTER_DATA = "power_log_energy.csv"
+HWMON_STATS = "power_log_hwmon_stats.csv"
+SHELLY_OVERHEAD = "power_log_shelly_overhead.csv"
+
+# How power samples are turned into energy, see integrate_power()
+ENERGY_RULE = "rectangle"
+ENERGY_RULES = ("rectangle", "trapezoid")
+MAX_GAP = None # Longest interval in seconds between samples that is still integrated (None: no limit)
+
+
+def load_power_data(file_path, power_columns, df=None, index=None):
+    """
+    Loads fused power data for energy integration: power columns made numeric,
+    timestamps converted to datetimes, rows with missing values and the
+    baseline sessions ('Background' and the 'Idle' pauses) removed.
+
+    Args:
+        file_path (str): The path to the CSV file (or columnar store) containing the data.
+        power_columns (list): Power columns that must be present.
+        df (pd.DataFrame): Already loaded data to use instead of reading `file_path`.
+        index (SessionIndex): Session index of the data (see session_index.py); the
+                              baseline sessions are then dropped as row slices before any conversion.
+
+    Returns:
+        pd.DataFrame: The cleaned data, or None if there's an error.
+    """
+    try:
+        if df is None:
+            df = read_table(file_path)
+            print(f"File '{file_path}' loaded successfully.")
+        else:
+            df = df.copy()
+        print(f"Original columns: {df.columns.tolist()}")
+
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found.")
+        return None
+    except Exception as e:
+        print(f"Error reading the CSV file: {e}")
+        return None
+
+    required_columns = list(power_columns) + ['session', 'timestamp']
+    for col in required_columns:
+        if col not in df.columns:
+            print(f"Error: Required column '{col}' not found in the DataFrame. Cannot calculate energy.")
+            return None
+
+    if index is not None and index.matches(df):
+        df = index.exclude(df, BASELINE_SESSIONS).copy()
+
+    for power_column in power_columns:
+        df[power_column] = pd.to_numeric(df[power_column], errors='coerce')
+
+    try:
+        df['timestamp'] = to_datetime(df['timestamp'])
+    except Exception as e:
+        print(f"Error: Could not convert 'timestamp' column to datetime format: {e}")
+        print("Ensure the 'timestamp' column holds epoch nanoseconds or the legacy '%Y%m%dT%H:%M:%S' format.")
+        return None
+
+    original_rows = len(df)
+    df = df.dropna(subset=required_columns)
+    rows_after_dropna = len(df)
+    if original_rows != rows_after_dropna:
+        print(f"Warning: {original_rows - rows_after_dropna} rows with critical NaN values were removed.")
+    if rows_after_dropna == 0:
+        print("Error: No valid data remaining after NaN cleaning. Cannot calculate energy.")
+        return None
+
+    df = df[~df['session'].isin(BASELINE_SESSIONS)]
+    if df.empty:
+        print(f"No valid sessions remaining for calculation after filtering {BASELINE_SESSIONS}.")
+        return None
+    return df
+
+
+def sample_energy(df, power_columns, rule=ENERGY_RULE, max_gap=MAX_GAP):
+    """
+    Splits the energy integral of every session into per-sample contributions,
+    which add up to the totals of integrate_power() in any grouping (e.g. the
+    time buckets of power_resample.py).
+
+    Rules:
+        'rectangle' - each sample's power is held over the interval since the previous
+                      sample; the first sample of a session uses the interval after it.
+        'trapezoid' - each interval contributes the mean power of its two end samples.
+
+    Intervals longer than `max_gap` seconds are treated as missing data: they are
+    not integrated, and their total length is reported in 'Gap (s)'. With a 'trial'
+    column (repeated visits, see trial_scheduler.py), every visit is integrated on
+    its own, so the time between two visits of a site is never counted. Likewise with
+    a 'shard' column (logs merged by campaign.py), every shard is integrated on its own.
+
+    Args:
+        df (pd.DataFrame): Data with 'session', datetime 'timestamp' and numeric power columns.
+        power_columns (list): Columns to integrate, in Watts.
+        rule (str): One of ENERGY_RULES.
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+
+    Returns:
+        pd.DataFrame: One row per sample, sorted by session, shard, trial and timestamp, with
+                      'session', 'shard' and 'trial' (if present), 'timestamp', the Joules of each power
+                      column, 'Duration (s)' (integrated time) and 'Gap (s)' attributed to the sample.
+    """
+    if rule not in ENERGY_RULES:
+        raise ValueError(f"Unknown integration rule '{rule}'. Expected one of {ENERGY_RULES}.")
+
+    segments = ['session'] + [column for column in ('shard', 'trial') if column in df.columns]
+    df = df.sort_values(by=segments + ['timestamp'], kind='stable')
+    # Intervals are computed over the whole frame at once; those spanning two sessions (or shards, trials) are discarded
+    first = np.zeros(len(df), dtype=bool)
+    for column in segments:
+        first |= (df[column] != df[column].shift()).to_numpy()
+    delta = df['timestamp'].diff().dt.total_seconds().to_numpy(copy=True)
+    delta[first] = np.nan
+    gap = delta > max_gap if max_gap is not None else np.zeros(len(delta), dtype=bool)
+    gap_seconds = np.where(gap, delta, 0.0)
+    delta[gap] = 0.0
+    interval = np.nan_to_num(delta)
+
+    if rule == 'rectangle':
+        # The first sample of a session has no interval before it and reuses the next one
+        following = np.append(interval[1:], 0.0)
+        following[np.append(first[1:], True)] = 0.0
+        weights = np.where(first, following, interval)
+    energies = {column: df[column] for column in segments}
+    energies['timestamp'] = df['timestamp']
+    for column in power_columns:
+        power = df[column].to_numpy(dtype=float)
+        if rule == 'rectangle':
+            energies[column] = power * weights
+        else:
+            previous = np.roll(power, 1)
+            energies[column] = np.where(first, 0.0, (power + previous) / 2 * interval)
+    energies['Duration (s)'] = weights if rule == 'rectangle' else interval
+    energies['Gap (s)'] = gap_seconds
+    return pd.DataFrame(energies, index=df.index)
+
+
+def integrate_power(df, power_columns, rule=ENERGY_RULE, max_gap=MAX_GAP):
+    """
+    Integrates power columns over time for every session in one grouped pass.
+    See sample_energy() for the integration rules and gap handling.
+
+    Args:
+        df (pd.DataFrame): Data with 'session', datetime 'timestamp' and numeric power columns.
+        power_columns (list): Columns to integrate, in Watts.
+        rule (str): One of ENERGY_RULES.
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+
+    Returns:
+        pd.DataFrame: Indexed by session (in sorted order) with the energy in Joules
+                      of each power column, 'Duration (s)' (integrated time) and 'Gap (s)'.
+    """
+    energies = sample_energy(df, power_columns, rule, max_gap)
+    energies = energies.drop(columns=['timestamp', 'shard', 'trial'], errors='ignore')
+    return energies.groupby('session', sort=False, observed=True).sum()
+
+
+def energy_table(joules):
+    """
+    Converts a Series of Joules per session into the Session / Total Energy table.
+    """
+    return pd.DataFrame({
+        'Session': joules.index,
+        'Total Energy (Joules)': joules.to_numpy(),
+        'Total Energy (Wh)': joules.to_numpy() / 3600,
+        'Total Energy (kWh)': joules.to_numpy() / 3600 / 1000
+    })
+
+
+def calculate_energy_consumption(file_path=FUSION_DATA, power_column='power_shelly', df=None,
+                                 rule=ENERGY_RULE, max_gap=MAX_GAP, index=None):
+    """
+    Calculates the total energy consumed per session from power data
+    and the time difference between samples.
+
+    Args:
+        file_path (str): The path to the CSV file (or columnar store) containing the data.
+        power_column (str): The name of the column containing the power data
+                            ('power_shelly' or 'power_hwmon').
+        df (pd.DataFrame): Already loaded data to use instead of reading `file_path`.
+        rule (str): Integration rule, see integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+        index (SessionIndex): Session index of the data, see load_power_data().
+
+    Returns:
+        pd.DataFrame: A DataFrame with the total energy consumed (in Joules and Wh)
+                      per session, or None if there's an error.
+    """
+    df = load_power_data(file_path, [power_column], df, index)
+    if df is None:
+        return None
+
+    energies = integrate_power(df, [power_column], rule, max_gap)
+    print(f"\nCalculated energy for {len(energies)} sessions ({rule} rule).")
+    return energy_table(energies[power_column])
+
+
+def calculate_session_energy(file_path=FUSION_DATA, df=None, rule=ENERGY_RULE, max_gap=MAX_GAP, index=None):
+    """
+    Calculates the Shelly and hwmon energy of every session together in a single pass.
+
+    Args:
+        file_path (str): The path to the CSV file (or columnar store) containing the data.
+        df (pd.DataFrame): Already loaded data to use instead of reading `file_path`.
+        rule (str): Integration rule, see integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+        index (SessionIndex): Session index of the data, see load_power_data().
+
+    Returns:
+        pd.DataFrame: Per session, the Shelly and hwmon energy in Joules and Wh, the
+                      integrated duration and the excluded gap time, or None if there's an error.
+    """
+    df = load_power_data(file_path, ['power_shelly', 'power_hwmon'], df, index)
+    if df is None:
+        return None
+
+    energies = integrate_power(df, ['power_shelly', 'power_hwmon'], rule, max_gap)
+    return pd.DataFrame({
+        'Session': energies.index,
+        'Shelly Energy (Joules)': energies['power_shelly'].to_numpy(),
+        'Shelly Energy (Wh)': energies['power_shelly'].to_numpy() / 3600,
+        'Hwmon Energy (Joules)': energies['power_hwmon'].to_numpy(),
+        'Hwmon Energy (Wh)': energies['power_hwmon'].to_numpy() / 3600,
+        'Duration (s)': energies['Duration (s)'].to_numpy(),
+        'Gap (s)': energies['Gap (s)'].to_numpy()
+    })
+
+
+def calculate_trial_energy(file_path=FUSION_DATA, df=None, rule=ENERGY_RULE, max_gap=MAX_GAP, index=None):
+    """
+    Summarises the Shelly and hwmon energy per visit over the repeated trials of
+    every site (see power_logger_hwmon.py --trials): number of trials, mean,
+    standard deviation and 95 % confidence interval of the mean, in Wh.
+
+    Args:
+        file_path (str): The path to the CSV file (or columnar store) containing the data.
+        df (pd.DataFrame): Already loaded data to use instead of reading `file_path`.
+        rule (str): Integration rule, see integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+        index (SessionIndex): Session index of the data, see load_power_data().
+
+    Returns:
+        pd.DataFrame: One row per session, or None if there's an error or the data has no 'trial' column.
+    """
+    df = load_power_data(file_path, ['power_shelly', 'power_hwmon'], df, index)
+    if df is None:
+        return None
+    if 'trial' not in df.columns:
+        print("No 'trial' column found; the log was not recorded with repeated trials.")
+        return None
+
+    df['trial'] = pd.to_numeric(df['trial'], errors='coerce')
+    energies = sample_energy(df.dropna(subset=['trial']), ['power_shelly', 'power_hwmon'], rule, max_gap)
+    visits = energies.groupby(['session', 'trial'], sort=True, observed=True)[['power_shelly', 'power_hwmon']].sum()
+
+    trial_results = []
+    for session_name, per_trial in visits.groupby(level='session', sort=True, observed=True):
+        row = {'Session': session_name, 'Trials': len(per_trial)}
+        for column, label in (('power_shelly', 'Shelly'), ('power_hwmon', 'Hwmon')):
+            mean, std, half_width = mean_ci((per_trial[column] / 3600).tolist())
+            row[f'{label} Mean (Wh)'] = mean
+            row[f'{label} Std (Wh)'] = std
+            row[f'{label} CI Low (Wh)'] = mean - half_width
+            row[f'{label} CI High (Wh)'] = mean + half_width
+            row[f'{label} CI Relative'] = half_width / mean if mean else np.nan
+        trial_results.append(row)
+    print(f"\nCalculated trial statistics for {len(trial_results)} sessions.")
+    return pd.DataFrame(trial_results)
+
+
+def calculate_channel_energy(file_path=RAW_FUSION_DATA, df=None, rule=ENERGY_RULE, max_gap=MAX_GAP):
+    """
+    Calculates the energy consumed per session for every hwmon channel logged
+    next to the primary sensor (one '<sensor>.<attribute>' column per channel).
+
+    Power channels are integrated with integrate_power() like
+    calculate_energy_consumption; cumulative energy counters are summed over
+    their increments, ignoring negative steps (counter resets). Channel columns
+    are not background-corrected, so the raw fused log is used by default.
+
+    Args:
+        file_path (str): The path to the fused CSV file.
+        df (pd.DataFrame): Already loaded fused data to use instead of reading `file_path`.
+        rule (str): Integration rule for power channels, see integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+
+    Returns:
+        pd.DataFrame: One row per session and channel with the energy in Joules,
+                      Wh and kWh, or None if there's an error or no channel columns.
+    """
+    try:
+        df = read_table(file_path) if df is None else df.copy()
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found.")
+        return None
+    except Exception as e:
+        print(f"Error reading the CSV file: {e}")
+        return None
+
+    channels = channel_columns(df.columns)
+    if not channels:
+        print(f"No hwmon channel columns found in '{file_path}'.")
+        return None
+
+    df['timestamp'] = to_datetime(df['timestamp'])
+    df = df[~df['session'].isin(BASELINE_SESSIONS)].sort_values(by=['session', 'timestamp'], kind='stable')
+    if df.empty:
+        print(f"No valid sessions remaining for calculation after filtering {BASELINE_SESSIONS}.")
+        return None
+
+    for column in channels:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    power_channels = [column for column in channels if channel_kind(column) == 'power']
+    energies = integrate_power(df, power_channels, rule, max_gap)
+
+    energy_results = []
+    for column in channels:
+        if channel_kind(column) == 'power':
+            joules = energies[column]
+        else:
+            # Visits of the same session in different trials are differenced separately
+            visits = [df['session'], df['trial']] if 'trial' in df.columns else df['session']
+            steps = df[column].groupby(visits, sort=False, observed=True).diff()
+            joules = steps.where(steps >= 0).groupby(df['session'], sort=False, observed=True).sum()
+        for session_name, total_energy_joules in joules.items():
+            energy_results.append({
+                'Session': session_name,
+                'Channel': column,
+                'Total Energy (Joules)': total_energy_joules,
+                'Total Energy (Wh)': total_energy_joules / 3600,
+                'Total Energy (kWh)': total_energy_joules / 3600 / 1000
+            })
+
+    return pd.DataFrame(energy_results)
+
+
+def calculate_browser_energy(file_path=RAW_FUSION_DATA, df=None, rule=ENERGY_RULE, max_gap=MAX_GAP, index=None):
+    """
+    Calculates the energy attributed to the browser's processes per session, from
+    the 'cpu_browser' and 'power_browser' columns logged by power_logger_hwmon.py
+    --attribute. 'power_browser' is the hwmon power apportioned by the browser's
+    share of the busy CPU time; the Shelly power is apportioned by the same share.
+    The raw fused log is used by default, since the shares refer to the uncorrected power.
+
+    Args:
+        file_path (str): The path to the fused CSV file (or columnar store).
+        df (pd.DataFrame): Already loaded fused data to use instead of reading `file_path`.
+        rule (str): Integration rule, see integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+        index (SessionIndex): Session index of the data, see load_power_data().
+
+    Returns:
+        pd.DataFrame: Per session, the hwmon and Shelly energy, the browser's part of
+                      each and its mean CPU share, or None if there's an error or the
+                      log has no attribution columns.
+    """
+    try:
+        df = read_table(file_path) if df is None else df
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found.")
+        return None
+    if 'power_browser' not in df.columns:
+        print(f"No 'power_browser' column found in '{file_path}'; the hwmon log was not recorded with --attribute.")
+        return None
+    df = load_power_data(file_path, ['power_shelly', 'power_hwmon', 'cpu_browser', 'power_browser'], df, index)
+    if df is None:
+        return None
+
+    df['power_shelly_browser'] = df['power_shelly'] * df['cpu_browser']
+    energies = integrate_power(df, ['power_hwmon', 'power_browser', 'power_shelly', 'power_shelly_browser'],
+                               rule, max_gap)
+    cpu_share = df.groupby('session', sort=False, observed=True)['cpu_browser'].mean()
+    return pd.DataFrame({
+        'Session': energies.index,
+        'Hwmon Energy (Wh)': energies['power_hwmon'].to_numpy() / 3600,
+        'Browser Hwmon Energy (Wh)': energies['power_browser'].to_numpy() / 3600,
+        'Shelly Energy (Wh)': energies['power_shelly'].to_numpy() / 3600,
+        'Browser Shelly Energy (Wh)': energies['power_shelly_browser'].to_numpy() / 3600,
+        'Browser Share (%)': (energies['power_browser'] / energies['power_hwmon'] * 100).to_numpy(),
+        'Mean CPU Share (%)': cpu_share.reindex(energies.index).to_numpy() * 100
+    })
+
+
+def logger_cpu_between(windows, first_ns, last_ns):
+    """
+    Returns the CPU seconds the Shelly logger spent between each pair of timestamps,
+    from its overhead windows (see power_logger_shelly.OverheadLog). The windows follow
+    each other, so their cumulative CPU time is interpolated linearly within a window.
+    """
+    windows = windows.sort_values('first_ns')
+    times = np.concatenate(([windows['first_ns'].iloc[0]], windows['last_ns'].to_numpy())).astype(float)
+    cumulative = np.concatenate(([0.0], windows['cpu_s'].cumsum().to_numpy()))
+    return (np.interp(np.asarray(last_ns, dtype=float), times, cumulative)
+            - np.interp(np.asarray(first_ns, dtype=float), times, cumulative))
+
+
+def calculate_overhead_energy(file_path=FUSION_DATA, df=None, rule=ENERGY_RULE, max_gap=MAX_GAP, index=None,
+                              stats_file=HWMON_STATS, shelly_overhead_file=SHELLY_OVERHEAD, baseline=True):
+    """
+    Estimates the energy the loggers consumed themselves and subtracts it from the
+    Shelly and hwmon energy of every session.
+
+    The loggers' CPU time in a session (the hwmon logger's from its stats file, the
+    Shelly logger's from its overhead windows, when it ran on the measured machine)
+    is priced at the session's marginal energy per busy CPU second above the
+    Background/Idle windows (see logger_overhead.marginal_energy), so the idle power
+    is never charged to the loggers. The background-corrected energies already had
+    the loggers' CPU time in the baseline windows removed with the baseline, so with
+    `baseline` set only their CPU time beyond the baseline windows' rate is
+    subtracted, and never less than nothing.
+
+    Args:
+        file_path (str): The path to the CSV file (or columnar store) containing the data.
+        df (pd.DataFrame): Already loaded data to use instead of reading `file_path`.
+        rule (str): Integration rule, see integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+        index (SessionIndex): Session index of the data, see load_power_data().
+        stats_file (str): Per-session statistics of the hwmon logger.
+        shelly_overhead_file (str): Overhead windows of the Shelly logger; ignored if missing.
+        baseline (bool): Whether the energies are background-corrected (see above).
+
+    Returns:
+        pd.DataFrame: Per session, the loggers' CPU time and share, the marginal energy per
+                      busy CPU second, the estimated and the subtracted overhead, and the
+                      Shelly and hwmon energy before and after, or None if there's an error,
+                      the stats predate the instrumentation or hold no baseline session.
+    """
+    try:
+        stats = pd.read_csv(stats_file)
+    except FileNotFoundError:
+        print(f"Error: The file '{stats_file}' was not found.")
+        return None
+    if not {'cpu_s', 'busy_cpu_s', 'first_ns', 'last_ns'} <= set(stats.columns):
+        print(f"No logger overhead columns found in '{stats_file}'; it was recorded before the loggers were instrumented.")
+        return None
+    stats = stats.dropna(subset=['cpu_s', 'busy_cpu_s', 'energy_j'])
+    if stats.empty:
+        print(f"No overhead measurements in '{stats_file}' (is /proc/stat readable?).")
+        return None
+
+    energies = calculate_session_energy(file_path, df, rule, max_gap, index)
+    if energies is None:
+        return None
+
+    stats = stats.assign(logger_cpu_s=stats['cpu_s'])
+    if os.path.exists(shelly_overhead_file):
+        windows = pd.read_csv(shelly_overhead_file).dropna(subset=['cpu_s'])
+        if not windows.empty:
+            stats['logger_cpu_s'] += logger_cpu_between(windows, stats['first_ns'], stats['last_ns'])
+    # Ratios of sums: the busy time is counted in clock ticks and too coarse for short sessions on their own
+    totals = stats.groupby('session', sort=False)[['logger_cpu_s', 'busy_cpu_s', 'energy_j', 'duration_s']].sum()
+    baseline_rows = totals.index.isin(BASELINE_SESSIONS)
+    if not baseline_rows.any():
+        print(f"No baseline sessions ({', '.join(BASELINE_SESSIONS)}) in '{stats_file}' to estimate the idle level.")
+        return None
+    idle = totals[baseline_rows].sum()
+    idle_w = idle['energy_j'] / idle['duration_s']
+    idle_busy_rate = idle['busy_cpu_s'] / idle['duration_s']
+    share = (totals['logger_cpu_s'] / totals['busy_cpu_s']).clip(upper=1.0).fillna(0.0)
+    marginal = pd.Series([marginal_energy(row.energy_j, row.busy_cpu_s, row.duration_s, idle_w, idle_busy_rate)
+                          for row in totals.itertuples()], index=totals.index)
+    overhead_j = totals['logger_cpu_s'] * marginal
+
+    subtracted_j = overhead_j
+    if baseline:
+        idle_logger_rate = idle['logger_cpu_s'] / idle['duration_s']
+        subtracted_j = (marginal * (totals['logger_cpu_s'] - idle_logger_rate * totals['duration_s'])).clip(lower=0.0)
+
+    sessions = energies['Session']
+    subtracted = subtracted_j.reindex(sessions).fillna(0.0).to_numpy()
+    result = pd.DataFrame({
+        'Session': sessions,
+        'Logger CPU (s)': totals['logger_cpu_s'].reindex(sessions).to_numpy(),
+        'Logger CPU Share (%)': share.reindex(sessions).to_numpy() * 100,
+        'Marginal (Joules per CPU s)': marginal.reindex(sessions).to_numpy(),
+        'Overhead (Joules)': overhead_j.reindex(sessions).to_numpy(),
+        'Subtracted (Joules)': subtracted,
+        'Shelly Energy (Wh)': energies['Shelly Energy (Joules)'].to_numpy() / 3600,
+        'Adjusted Shelly Energy (Wh)': (energies['Shelly Energy (Joules)'].to_numpy() - subtracted) / 3600,
+        'Hwmon Energy (Wh)': energies['Hwmon Energy (Joules)'].to_numpy() / 3600,
+        'Adjusted Hwmon Energy (Wh)': (energies['Hwmon Energy (Joules)'].to_numpy() - subtracted) / 3600
+    })
+    print(f"\nEstimated logger overhead for {len(result)} sessions.")
+    return result
+
+
+def calculate_counter_energy(file_path=COUNTER_DATA):
+    """
+    Calculates the exact energy per session from the cumulative energy counters
+    logged by `power_logger_hwmon.py --energy-counters`.
+
+    Readings of a counter between a session's 'start' and 'end' events are
+    differenced; a negative step means the counter wrapped, in which case its
+    max_range_uj is added back. Steps of counters without a known range that go
+    backwards cannot be reconstructed and are left out with a warning.
+    The baseline sessions (Background, Idle) are kept so they can serve as the idle reference.
+
+    Args:
+        file_path (str): The path to the energy counter CSV file.
+
+    Returns:
+        pd.DataFrame: One row per session and counter with the energy in Joules,
+                      Wh and kWh and the mean power in Watts, or None if there's an error.
+    """
+    try:
+        df = read_table(file_path)
+        print(f"File '{file_path}' loaded successfully.")
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found.")
+        return None
+    except Exception as e:
+        print(f"Error reading the CSV file: {e}")
+        return None
+
+    required_columns = ['timestamp', 'session', 'event', 'channel', 'value_uj', 'max_range_uj']
+    for col in required_columns:
+        if col not in df.columns:
+            print(f"Error: Required column '{col}' not found in the DataFrame. Cannot calculate energy.")
+            return None
+    if df.empty:
+        print("Error: No counter readings found. Cannot calculate energy.")
+        return None
+
+    df.sort_values(by=['channel', 'timestamp'], inplace=True, kind='stable')
+    # Each 'start' event opens a new measurement segment of that counter
+    df['segment'] = (df['event'] == 'start').groupby(df['channel'], observed=True).cumsum()
+    segments = df.groupby(['channel', 'segment'], sort=False, observed=True)
+
+    steps = segments['value_uj'].diff()
+    wrapped = steps < 0
+    steps = steps.where(~wrapped, steps + df['max_range_uj'])
+    unresolved = int((wrapped & df['max_range_uj'].isna()).sum())
+    if unresolved:
+        print(f"Warning: {unresolved} counter steps went backwards without a known wrap range and were ignored.")
+    df['energy_joules'] = steps * 1e-6 # microJoules to Joules
+    df['duration_s'] = segments['timestamp'].diff() / 1e9 # nanoseconds to seconds
+
+    totals = df.groupby(['session', 'channel'], sort=False, observed=True)[['energy_joules', 'duration_s']].sum()
+    energy_results = []
+    for (session_name, channel), row in totals.iterrows():
+        total_energy_joules = row['energy_joules']
+        energy_results.append({
+            'Session': session_name,
+            'Channel': channel,
+            'Total Energy (Joules)': total_energy_joules,
+            'Total Energy (Wh)': total_energy_joules / 3600,
+            'Total Energy (kWh)': total_energy_joules / 3600 / 1000,
+            'Mean Power (W)': total_energy_joules / row['duration_s'] if row['duration_s'] else float('nan')
+        })
+
+    return pd.DataFrame(energy_results)
+
+
+def save_energy_results(energy_df, output_csv, title):
+    """
+    Prints an energy summary and saves it to `output_csv`. Nothing is done if `energy_df` is None.
+    """
+    if energy_df is None:
+        return
+    print(f"\n--- {title} ---")
+    print(energy_df.to_string(index=False))
+    energy_df.to_csv(output_csv, index=False)
+    print(f"\nResults saved to: {output_csv}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate the energy consumed per session.")
+    parser.add_argument("--rule", choices=ENERGY_RULES, default=ENERGY_RULE,
+                        help="Integration rule for power samples (default: %(default)s)")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP,
+                        help="Longest interval in seconds between samples that is still integrated (default: no limit)")
+    args = parser.parse_args()
+
+    energy_df_shelly = calculate_energy_consumption(FUSION_DATA, 'power_shelly', rule=args.rule, max_gap=args.max_gap)
+    save_energy_results(energy_df_shelly, os.path.join(RESULTS_FOLDER, 'energy_consumption_shelly.csv'),
+                        "Energy Consumption Summary per Session (using power_shelly)")
+
+    energy_df_sessions = calculate_session_energy(FUSION_DATA, rule=args.rule, max_gap=args.max_gap)
+    save_energy_results(energy_df_sessions, os.path.join(RESULTS_FOLDER, 'energy_consumption_sessions.csv'),
+                        "Shelly and hwmon Energy per Session")
+
+    energy_df_trials = calculate_trial_energy(FUSION_DATA, rule=args.rule, max_gap=args.max_gap)
+    save_energy_results(energy_df_trials, os.path.join(RESULTS_FOLDER, 'energy_trials.csv'),
+                        "Energy per Visit over Repeated Trials (mean, std, 95% CI)")
+
+    energy_df_channels = calculate_channel_energy(RAW_FUSION_DATA, rule=args.rule, max_gap=args.max_gap)
+    save_energy_results(energy_df_channels, os.path.join(RESULTS_FOLDER, 'energy_consumption_channels.csv'),
+                        "Energy Consumption Summary per Session and hwmon Channel")
+
+    energy_df_browser = calculate_browser_energy(RAW_FUSION_DATA, rule=args.rule, max_gap=args.max_gap)
+    save_energy_results(energy_df_browser, os.path.join(RESULTS_FOLDER, 'energy_consumption_browser.csv'),
+                        "Energy Attributed to the Browser Processes per Session")
+
+    if os.path.exists(HWMON_STATS):
+        energy_df_overhead = calculate_overhead_energy(FUSION_DATA, rule=args.rule, max_gap=args.max_gap)
+        save_energy_results(energy_df_overhead, os.path.join(RESULTS_FOLDER, 'energy_overhead.csv'),
+                            "Session Energy without the Loggers' Own Consumption")
+
+    if os.path.exists(resolve(COUNTER_DATA)):
+        energy_df_counters = calculate_counter_energy(COUNTER_DATA)
+        save_energy_results(energy_df_counters, os.path.join(RESULTS_FOLDER, 'energy_consumption_counters.csv'),
+                            "Energy Consumption Summary per Session and Energy Counter")
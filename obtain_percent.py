@@ -1,24 +1,73 @@
-import os
-import pandas as pd
-
-csv_data = "power_log_fusion.csv"
-percentage_output = os.path.join("results", 'percentage.csv')
-
-# Load the CSV data into a pandas DataFrame
-df = pd.read_csv(csv_data)
-
-def calculate_percentage(row):
-    # Calculate the percentage of 'power_hwmon' relative to 'power_shelly'
-    # Returns 0 if 'power_shelly' is zero to avoid division by zero errors
-    if row['power_shelly'] != 0:
-        return (row['power_hwmon'] / row['power_shelly']) * 100
-    else:
-        return 0
-
-# Apply the calculate_percentage function to each row to create a new column
-df['percentage_hwmon_of_shelly'] = df.apply(calculate_percentage, axis=1)
-
-# Group the DataFrame by 'session' and calculate the mean percentage for each session
-session_percentage = df.groupby('session')['percentage_hwmon_of_shelly'].mean().reset_index()
-# Save the results to a new CSV file
-session_percentage.to_csv(percentage_output, index=False)
\ No newline at end of file
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+from obtain_energy import integrate_power
+from power_clock import to_datetime
+from power_store import read_table
+
+csv_data = "power_log_fusion.csv"
+percentage_output = os.path.join("results", 'percentage.csv')
+PERCENTILES = (5, 25, 75, 95) # Percentiles of the per-sample percentage reported for each session
+
+
+def session_percentages(df, percentiles=PERCENTILES):
+    """
+    Summarises the share of 'power_hwmon' in 'power_shelly' per session, computed
+    for all rows at once.
+
+    Samples where the Shelly power is zero or missing have no defined share; they
+    are left out of the statistics (and counted) instead of being counted as 0 %.
+
+    Args:
+        df (pd.DataFrame): Fused power data with 'session', 'power_shelly' and 'power_hwmon'.
+        percentiles (tuple): Percentiles of the per-sample percentage to report.
+
+    Returns:
+        pd.DataFrame: Per session, the mean per-sample percentage
+                      ('percentage_hwmon_of_shelly'), its median and percentiles, the
+                      energy-weighted percentage (hwmon energy over Shelly energy), the
+                      number of samples and the number of samples without a defined share.
+    """
+    shelly = pd.to_numeric(df['power_shelly'], errors='coerce').to_numpy(dtype=float)
+    hwmon = pd.to_numeric(df['power_hwmon'], errors='coerce').to_numpy(dtype=float)
+    defined = (shelly != 0) & ~np.isnan(shelly)
+    percentage = np.divide(hwmon, shelly, out=np.full(len(shelly), np.nan), where=defined) * 100
+
+    shares = pd.DataFrame({'session': df['session'].to_numpy(), 'percentage': percentage}, index=df.index)
+    by_session = shares.groupby('session', sort=True, observed=True)['percentage']
+    result = pd.DataFrame({
+        'percentage_hwmon_of_shelly': by_session.mean(),
+        'median_percentage': by_session.median(),
+    })
+    quantiles = by_session.quantile([p / 100 for p in percentiles]).unstack()
+    for p, column in zip(percentiles, quantiles.columns):
+        result[f'p{p}_percentage'] = quantiles[column]
+
+    # Energy-weighted share: ratio of the integrated powers, so long or high-power stretches count more
+    if 'timestamp' in df.columns:
+        powers = pd.DataFrame({'session': df['session'].to_numpy(), 'timestamp': to_datetime(df['timestamp']),
+                               'power_shelly': shelly, 'power_hwmon': hwmon}).dropna()
+        energies = integrate_power(powers, ['power_shelly', 'power_hwmon'])
+        shelly_energy = energies['power_shelly'].reindex(result.index)
+        hwmon_energy = energies['power_hwmon'].reindex(result.index)
+        result['energy_weighted_percentage'] = (hwmon_energy / shelly_energy.where(shelly_energy != 0)) * 100
+
+    result['samples'] = by_session.size()
+    result['undefined_samples'] = by_session.size() - by_session.count()
+    return result.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate the share of hwmon power in Shelly power per session.")
+    parser.add_argument("--input", default=csv_data,
+                        help="Fused or corrected power log (CSV or columnar store) (default: %(default)s)")
+    parser.add_argument("--output", default=percentage_output, help="Output CSV file (default: %(default)s)")
+    args = parser.parse_args()
+
+    # Load the CSV data into a pandas DataFrame
+    df = read_table(args.input)
+    session_percentage = session_percentages(df)
+    # Save the results to a new CSV file
+    session_percentage.to_csv(args.output, index=False)
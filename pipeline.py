@@ -0,0 +1,267 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import graph_energy
+import graph_period
+import hwmon_channels
+import logger_overhead
+import obtain_energy
+import obtain_percent
+import power_alignment
+import power_clock
+import power_correction
+import power_fusion
+import power_store
+import segment_log
+import session_index
+import session_names
+import trial_scheduler
+from graph_energy import plot_energy_bar_chart
+from graph_period import plot_power_overviews, plot_separated_power_comparison
+from obtain_percent import session_percentages
+from power_resample import build_levels
+from power_store import columnar_path, read_table, resolve
+from session_index import index_path, load_index
+from stage_cache import CACHE_DIR, MAX_CACHE_BYTES, StageCache
+
+# In-process post-processing: the stages of the former per-script runs are called
+# as functions, the fused log is read once and shared in memory, and the stages
+# that only depend on it run concurrently. With a StageCache, fusion, correction,
+# energy and percentage are skipped when their inputs, parameters and code are unchanged.
+
+RESULTS_FOLDER = "results"
+WORKERS = 4 # Threads for the independent stages (energy, percentage, plots)
+
+
+class StageTimer:
+    """
+    Records the wall time of each pipeline stage; safe to use from worker threads.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def run(self, name, func, *args, **kwargs):
+        """
+        Calls `func`, recording its duration under `name`.
+
+        Returns:
+            The result of `func`, or None if it raised (the error is printed).
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            print(f"Error: stage '{name}' failed: {e}")
+            return None
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def report(self):
+        """Prints the duration of every stage and of the whole pipeline."""
+        print("\n--- Post-processing timing ---")
+        for name, seconds in self.timings.items():
+            print(f"{name:<20} {seconds * 1000:9.1f} ms")
+        print(f"{'total':<20} {(time.perf_counter() - self.started) * 1000:9.1f} ms")
+
+
+def energy_stage(corrected, index=None):
+    """
+    Background-corrected Shelly and hwmon energy per session and the Shelly bar chart.
+    The corrected log keeps the fused log's rows, so the fused session `index` applies to it.
+    """
+    energy_df = obtain_energy.calculate_energy_consumption(power_column='power_shelly', df=corrected, index=index)
+    obtain_energy.save_energy_results(energy_df, os.path.join(RESULTS_FOLDER, 'energy_consumption_shelly.csv'),
+                                      "Energy Consumption Summary per Session (using power_shelly)")
+    obtain_energy.save_energy_results(obtain_energy.calculate_session_energy(df=corrected, index=index),
+                                      os.path.join(RESULTS_FOLDER, 'energy_consumption_sessions.csv'),
+                                      "Shelly and hwmon Energy per Session")
+    # Only logs recorded with repeated trials have a 'trial' column
+    trials_path = os.path.join(RESULTS_FOLDER, 'energy_trials.csv')
+    if 'trial' in corrected.columns:
+        obtain_energy.save_energy_results(obtain_energy.calculate_trial_energy(df=corrected, index=index),
+                                          trials_path, "Energy per Visit over Repeated Trials (mean, std, 95% CI)")
+    elif os.path.exists(trials_path):
+        # Left by an earlier run with trials; it must neither describe this run nor be cached with it
+        os.remove(trials_path)
+    if energy_df is not None:
+        plot_energy_bar_chart(energy_df, os.path.join(RESULTS_FOLDER, 'total_energy_wh_bar_chart.png'))
+    return energy_df
+
+
+def channel_energy_stage(fused):
+    """Energy per session of every hwmon channel of the uncorrected fused log."""
+    energy_df = obtain_energy.calculate_channel_energy(df=fused)
+    obtain_energy.save_energy_results(energy_df, os.path.join(RESULTS_FOLDER, 'energy_consumption_channels.csv'),
+                                      "Energy Consumption Summary per Session and hwmon Channel")
+    return energy_df
+
+
+def browser_energy_stage(fused, index=None):
+    """Energy attributed to the browser's processes, when the hwmon log was recorded with --attribute."""
+    if 'power_browser' not in fused.columns:
+        return None
+    energy_df = obtain_energy.calculate_browser_energy(df=fused, index=index)
+    obtain_energy.save_energy_results(energy_df, os.path.join(RESULTS_FOLDER, 'energy_consumption_browser.csv'),
+                                      "Energy Attributed to the Browser Processes per Session")
+    return energy_df
+
+
+def overhead_energy_stage(corrected, index=None):
+    """Session energy without the loggers' own consumption, when the hwmon stats were recorded."""
+    if not os.path.exists(obtain_energy.HWMON_STATS):
+        return None
+    energy_df = obtain_energy.calculate_overhead_energy(df=corrected, index=index)
+    obtain_energy.save_energy_results(energy_df, os.path.join(RESULTS_FOLDER, 'energy_overhead.csv'),
+                                      "Session Energy without the Loggers' Own Consumption")
+    return energy_df
+
+
+def counter_energy_stage():
+    """Exact per-session energy from the counter log, when it was recorded."""
+    if not os.path.exists(resolve(obtain_energy.COUNTER_DATA)):
+        return None
+    energy_df = obtain_energy.calculate_counter_energy(obtain_energy.COUNTER_DATA)
+    obtain_energy.save_energy_results(energy_df, os.path.join(RESULTS_FOLDER, 'energy_consumption_counters.csv'),
+                                      "Energy Consumption Summary per Session and Energy Counter")
+    return energy_df
+
+
+def correction_stage(fused, columnar):
+    """Background correction of the fused log, saved next to the other results."""
+    corrected, means = power_correction.correct_power(fused)
+    power_correction.save_correction(corrected, means, columnar)
+    return corrected, means
+
+
+def percentage_stage(fused):
+    """Mean hwmon/Shelly power percentage per session."""
+    percentages = session_percentages(fused)
+    percentages.to_csv(os.path.join(RESULTS_FOLDER, 'percentage.csv'), index=False)
+    return percentages
+
+
+def overview_stage(fused):
+    """Multi-resolution levels of the fused log and the time-axis overview plots drawn from them."""
+    counts = build_levels(power_fusion.FUSION_DATA, df=fused)
+    plot_power_overviews(power_fusion.FUSION_DATA)
+    return counts
+
+
+def run_pipeline(fusion_options=None, cache=None):
+    """
+    Runs fusion, background correction, energy, percentage and plotting in this process.
+
+    Fusion and correction run first; the remaining stages only read the fused or
+    corrected DataFrame and run concurrently on a thread pool. The plots are always
+    redrawn, the other stages go through `cache` when one is given.
+
+    Args:
+        fusion_options (dict): Keyword arguments passed to power_fusion.main().
+        cache (StageCache): Cache of stage results, None to recompute everything.
+
+    Returns:
+        dict: Stage name -> duration in seconds.
+    """
+    if not os.path.exists(RESULTS_FOLDER):
+        print(f"Creating directory: {RESULTS_FOLDER}")
+        os.makedirs(RESULTS_FOLDER)
+
+    fusion_options = fusion_options or {}
+    columnar = fusion_options.get("columnar", False)
+    fused_path = columnar_path(power_fusion.FUSION_DATA) if columnar else power_fusion.FUSION_DATA
+    corrected_path = (columnar_path(power_correction.power_output) if columnar
+                      else power_correction.power_output)
+    timer = StageTimer()
+    keys = {}
+
+    def stage(name, compute, outputs=(), files=(), upstream=(), params=None, code=()):
+        # Stage keys chain through `upstream`, so a stage is only reused if everything it depends on is
+        def run():
+            if cache is None:
+                return compute()
+            keys[name] = cache.key(name, files, [keys[u] for u in upstream], params, code)
+            return cache.run(name, keys[name], compute, outputs)
+        return timer.run(name, run)
+
+    fused_rows = stage("fusion", lambda: power_fusion.main(**fusion_options),
+                       [fused_path, index_path(power_fusion.FUSION_DATA)],
+                       files=segment_log.log_files(power_fusion.HWMON_DATA) + [resolve(power_fusion.SHELLY_DATA)],
+                       params=fusion_options,
+                       code=[power_fusion, power_alignment, power_store, power_clock, hwmon_channels, session_index,
+                             segment_log])
+    if fused_rows is None:
+        print("Error: Fusion failed, skipping the analysis stages.")
+        timer.report()
+        return timer.timings
+
+    fused = timer.run("load fused log", read_table, fused_path)
+    if fused is None:
+        timer.report()
+        return timer.timings
+    index = load_index(power_fusion.FUSION_DATA)
+
+    correction = stage("correction", lambda: correction_stage(fused, columnar),
+                       [corrected_path, power_correction.mean_output],
+                       upstream=["fusion"], code=[power_correction, power_store, power_clock, session_names])
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        if correction is not None:
+            pool.submit(stage, "energy + bar chart", lambda: energy_stage(correction[0], index),
+                        [os.path.join(RESULTS_FOLDER, 'energy_consumption_shelly.csv'),
+                         os.path.join(RESULTS_FOLDER, 'energy_consumption_sessions.csv'),
+                         os.path.join(RESULTS_FOLDER, 'energy_trials.csv'),
+                         os.path.join(RESULTS_FOLDER, 'total_energy_wh_bar_chart.png')],
+                        upstream=["correction"],
+                        code=[obtain_energy, graph_energy, graph_period, power_clock, session_index, session_names,
+                              trial_scheduler])
+            pool.submit(stage, "logger overhead", lambda: overhead_energy_stage(correction[0], index),
+                        [os.path.join(RESULTS_FOLDER, 'energy_overhead.csv')],
+                        files=[obtain_energy.HWMON_STATS, obtain_energy.SHELLY_OVERHEAD],
+                        upstream=["correction"],
+                        code=[obtain_energy, logger_overhead, power_clock, session_index, session_names])
+        pool.submit(stage, "channel energy", lambda: channel_energy_stage(fused),
+                    [os.path.join(RESULTS_FOLDER, 'energy_consumption_channels.csv')],
+                    upstream=["fusion"], code=[obtain_energy, hwmon_channels, power_clock, session_names])
+        pool.submit(stage, "browser energy", lambda: browser_energy_stage(fused, index),
+                    [os.path.join(RESULTS_FOLDER, 'energy_consumption_browser.csv')],
+                    upstream=["fusion"], code=[obtain_energy, power_clock, session_index, session_names])
+        pool.submit(stage, "counter energy", counter_energy_stage,
+                    [os.path.join(RESULTS_FOLDER, 'energy_consumption_counters.csv')],
+                    files=[resolve(obtain_energy.COUNTER_DATA)], code=[obtain_energy, power_store, session_names])
+        pool.submit(stage, "percentage", lambda: percentage_stage(fused),
+                    [os.path.join(RESULTS_FOLDER, 'percentage.csv')],
+                    upstream=["fusion"], code=[obtain_percent, obtain_energy, power_clock, session_names])
+        pool.submit(timer.run, "period plots", plot_separated_power_comparison,
+                    df=fused, index=index)
+        # Rebuilt on every run: the levels record the fused log's modification time, which a cache restore changes
+        pool.submit(timer.run, "levels + overview", overview_stage, fused)
+
+    timer.report()
+    if cache is not None:
+        print(f"Cache: {cache.hits} stages reused, {cache.misses} computed")
+    return timer.timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run fusion, correction, energy, percentage and plots in-process.")
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv",
+                        help="Format of the fused and corrected logs (default: %(default)s)")
+    parser.add_argument("--align", action="store_true",
+                        help="Correct the Shelly/hwmon lag before fusion (see power_fusion.py --align)")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every stage")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the stage cache before running")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Stage cache directory (default: %(default)s)")
+    parser.add_argument("--cache-size", type=float, default=MAX_CACHE_BYTES / (1 << 20),
+                        help="Size bound of the stage cache in MiB (default: %(default)s)")
+    args = parser.parse_args()
+
+    cache = None
+    if not args.no_cache:
+        cache = StageCache(args.cache_dir, int(args.cache_size * (1 << 20)))
+        if args.clear_cache:
+            cache.clear()
+    run_pipeline({"columnar": args.format == "columnar", "align": args.align}, cache)
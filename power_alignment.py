@@ -0,0 +1,148 @@
+import numpy as np
+
+# Time alignment of the Shelly and hwmon power series before fusion. The Shelly
+# reading reflects the plug's own averaging window and arrives after an HTTP round
+# trip, so it trails the hwmon reading of the same load change. The lag is found as
+# the peak of the cross-correlation of both series on a common time grid (computed
+# with FFTs, O(n log n)), and Shelly timestamps are shifted by it before the join.
+
+ALIGN_STEP = 100_000_000 # Grid step in nanoseconds used to estimate the lag (0.1 s)
+MAX_LAG = 5_000_000_000 # Largest lag in nanoseconds searched in either direction
+
+
+def to_grid(timestamps, values, start, step, n):
+    """
+    Resamples an irregular series onto the grid start + k * step, k < n.
+
+    Samples falling into the same grid cell are averaged, so dense series (hwmon
+    at 100 Hz) are low-pass filtered instead of aliased; cells without samples
+    are filled by linear interpolation between their neighbours, so sparse series
+    (Shelly at 1 Hz) are interpolated. Cells outside the series' time range
+    repeat its first or last value.
+
+    Args:
+        timestamps (np.ndarray): Epoch nanoseconds, in any order.
+        values (np.ndarray): Samples matching `timestamps`; NaNs are ignored.
+        start (int): First grid point in epoch nanoseconds.
+        step (int): Grid step in nanoseconds.
+        n (int): Number of grid points.
+
+    Returns:
+        np.ndarray: n float values.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    cells = np.round((timestamps[valid] - start) / step).astype(np.int64)
+    inside = (cells >= 0) & (cells < n)
+    sums = np.bincount(cells[inside], weights=values[valid][inside], minlength=n)
+    counts = np.bincount(cells[inside], minlength=n)
+    grid = np.full(n, np.nan)
+    filled = counts > 0
+    grid[filled] = sums[filled] / counts[filled]
+    if not filled.any():
+        return grid
+    positions = np.arange(n)
+    return np.interp(positions, positions[filled], grid[filled])
+
+
+def cross_correlation(a, b):
+    """
+    Returns the normalised cross-correlation c[k] = sum(a[i + k] * b[i]) of two
+    equally long series for every lag k, using zero-padded FFTs. Index k >= 0 is
+    at position k, negative lags wrap around to the end.
+    """
+    a = a - a.mean()
+    b = b - b.mean()
+    size = 1 << int(2 * len(a) - 1).bit_length()
+    spectrum = np.fft.rfft(a, size) * np.conj(np.fft.rfft(b, size))
+    correlation = np.fft.irfft(spectrum, size)
+    norm = np.sqrt(np.dot(a, a) * np.dot(b, b))
+    return correlation / norm if norm else correlation
+
+
+def estimate_lag(shelly_ts, shelly_power, hwmon_ts, hwmon_power, step=ALIGN_STEP, max_lag=MAX_LAG):
+    """
+    Estimates how far the Shelly series trails the hwmon series.
+
+    Both series are resampled onto a common grid over their overlapping time range
+    and cross-correlated; the correlation peak within +/- `max_lag` is refined to
+    sub-step precision by fitting a parabola through it and its neighbours.
+
+    Args:
+        shelly_ts, hwmon_ts (array-like): Epoch nanosecond timestamps.
+        shelly_power, hwmon_power (array-like): Power samples in Watts.
+        step (int): Grid step in nanoseconds.
+        max_lag (int): Largest lag in nanoseconds searched in either direction.
+
+    Returns:
+        tuple: (lag in nanoseconds, positive when Shelly readings arrive late;
+               correlation coefficient at that lag), or None if the series do not
+               overlap for long enough or show no variation to correlate.
+    """
+    shelly_ts = np.asarray(shelly_ts, dtype=np.int64)
+    hwmon_ts = np.asarray(hwmon_ts, dtype=np.int64)
+    if len(shelly_ts) < 2 or len(hwmon_ts) < 2:
+        return None
+    start = max(shelly_ts.min(), hwmon_ts.min())
+    end = min(shelly_ts.max(), hwmon_ts.max())
+    n = int((end - start) // step) + 1
+    max_shift = int(max_lag // step)
+    if n < 2 * max_shift + 2:
+        return None
+
+    shelly_grid = to_grid(shelly_ts, shelly_power, start, step, n)
+    hwmon_grid = to_grid(hwmon_ts, hwmon_power, start, step, n)
+    if np.isnan(shelly_grid).any() or np.isnan(hwmon_grid).any():
+        return None
+    correlation = cross_correlation(shelly_grid, hwmon_grid)
+    if not np.any(correlation):
+        return None
+
+    shifts = np.arange(-max_shift, max_shift + 1)
+    candidates = correlation[shifts % len(correlation)]
+    best = int(np.argmax(candidates))
+    offset = 0.0
+    if 0 < best < len(candidates) - 1:
+        left, peak, right = candidates[best - 1:best + 2]
+        curvature = left - 2 * peak + right
+        if curvature < 0:
+            offset = 0.5 * (left - right) / curvature
+    return int(round((shifts[best] + offset) * step)), float(candidates[best])
+
+
+def grid_rows(shelly_data, system_data, step):
+    """
+    Resamples fused data onto a regular grid instead of joining sample pairs.
+
+    Both power series are brought onto the grid with to_grid(); each grid point
+    takes the session and extra columns of the latest hwmon sample at or before it.
+    Grid points outside the span covered by both series are not produced.
+
+    Args:
+        shelly_data (list): (timestamp, power) tuples sorted by timestamp.
+        system_data (list): (timestamp, power, session, extras) tuples sorted by timestamp.
+        step (int): Grid step in nanoseconds.
+
+    Yields:
+        tuple: Fused rows in power_fusion.FUSION_FIELDS order followed by the extra hwmon values.
+    """
+    if not shelly_data or not system_data:
+        return
+    shelly_ts = np.fromiter((row[0] for row in shelly_data), dtype=np.int64, count=len(shelly_data))
+    shelly_power = np.fromiter((row[1] for row in shelly_data), dtype=float, count=len(shelly_data))
+    hwmon_ts = np.fromiter((row[0] for row in system_data), dtype=np.int64, count=len(system_data))
+    hwmon_power = np.fromiter((row[1] for row in system_data), dtype=float, count=len(system_data))
+
+    start = max(shelly_ts[0], hwmon_ts[0])
+    end = min(shelly_ts[-1], hwmon_ts[-1])
+    if end < start:
+        return
+    n = int((end - start) // step) + 1
+    grid = start + np.arange(n, dtype=np.int64) * step
+    shelly_grid = to_grid(shelly_ts, shelly_power, start, step, n)
+    hwmon_grid = to_grid(hwmon_ts, hwmon_power, start, step, n)
+    latest = np.searchsorted(hwmon_ts, grid, side="right") - 1
+    for ts, shelly, hwmon, index in zip(grid.tolist(), shelly_grid.tolist(), hwmon_grid.tolist(), latest.tolist()):
+        sample = system_data[index]
+        yield (ts, shelly, hwmon, sample[2]) + sample[3]
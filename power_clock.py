@@ -0,0 +1,88 @@
+import time
+from datetime import datetime
+
+# Prefix of the metadata line written at the top of every power log
+HEADER_PREFIX = "# clock="
+CLOCK_NAME = "monotonic-anchored"
+LEGACY_FORMAT = "%Y%m%dT%H:%M:%S"
+
+
+class MonotonicClock:
+    """
+    Produces epoch timestamps in nanoseconds that never jump.
+
+    The wall clock is read once, when the clock is created, and every later
+    timestamp is that anchor plus the time elapsed on the monotonic clock. NTP
+    steps or manual clock changes during a capture therefore cannot reorder or
+    shift samples, while the values stay comparable across both loggers.
+    """
+
+    def __init__(self):
+        self.wall_anchor_ns = time.time_ns()
+        self.monotonic_anchor_ns = time.monotonic_ns()
+
+    def now_ns(self):
+        """Returns the current time as epoch nanoseconds."""
+        return self.wall_anchor_ns + (time.monotonic_ns() - self.monotonic_anchor_ns)
+
+    def header(self):
+        """Returns the metadata line recording the clock anchors (without newline)."""
+        anchor = datetime.fromtimestamp(self.wall_anchor_ns / 1e9).isoformat()
+        return (f"{HEADER_PREFIX}{CLOCK_NAME} wall_anchor_ns={self.wall_anchor_ns} "
+                f"monotonic_anchor_ns={self.monotonic_anchor_ns} wall_anchor={anchor}")
+
+
+def write_header(file, clock):
+    """
+    Writes the clock metadata line to an open text file. It must be the first line.
+    """
+    file.write(clock.header() + "\n")
+
+
+def read_header(file_path):
+    """
+    Reads the clock metadata of a power log.
+
+    Returns:
+        dict: The key=value pairs of the header line, or an empty dict for logs
+              written before the header existed.
+    """
+    with open(file_path, 'r') as f:
+        first_line = f.readline().strip()
+    if not first_line.startswith(HEADER_PREFIX):
+        return {}
+    fields = first_line[len("# "):].split()
+    return dict(field.split("=", 1) for field in fields if "=" in field)
+
+
+def skip_comments(lines):
+    """
+    Filters out '#' metadata lines so the rest can be fed to csv.reader/DictReader.
+    """
+    return (line for line in lines if not line.startswith("#"))
+
+
+def parse_timestamp(value):
+    """
+    Converts a logged timestamp into epoch nanoseconds.
+
+    Integer values are already epoch nanoseconds. Logs written before the
+    monotonic clock use the 'YYYYMMDDTHH:MM:SS' local-time format, which is
+    still accepted so archived captures can be processed.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.strptime(value, LEGACY_FORMAT).timestamp()) * 1_000_000_000
+
+
+def to_datetime(series):
+    """
+    Converts a pandas Series of logged timestamps (epoch nanoseconds or the
+    legacy string format) into datetime64 values.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, unit="ns")
+    return pd.to_datetime(series, format=LEGACY_FORMAT)
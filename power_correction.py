@@ -1,46 +1,189 @@
-import os
-import sys
-import pandas as pd
-
-data_folder = "results"
-power_input = 'power_log_fusion.csv'
-power_output = os.path.join(data_folder, 'power_log_corrected.csv')
-mean_output = os.path.join(data_folder, 'mean.csv') # Changed 'media_output' to 'mean_output' for consistency
-
-try:
-    df = pd.read_csv(power_input)
-except FileNotFoundError:
-    print("ERROR: File not found. Please check the path.")
-    sys.exit(1)
-except Exception as e:
-    print(e)
-    sys.exit(1)
-
-# Convert power columns to numeric, coercing errors
-df["power_shelly"] = pd.to_numeric(df["power_shelly"], errors='coerce')
-df["power_hwmon"] = pd.to_numeric(df["power_hwmon"], errors='coerce')
-
-# Calculate the mean of 'power_shelly' and 'power_hwmon' for "Background" sessions
-background = df[df["session"] == "Background"]
-shelly_bg_mean = background["power_shelly"].mean()
-system_bg_mean = background["power_hwmon"].mean() # Changed 'sistema_bg_mean' to 'system_bg_mean'
-
-# Create a new DataFrame with background-corrected power values
-corrected_data = pd.DataFrame({
-    "timestamp": df["timestamp"],
-    "power_shelly": df["power_shelly"] - shelly_bg_mean,
-    "power_hwmon": df["power_hwmon"] - system_bg_mean,
-    "session": df["session"]
-})
-
-# Save the corrected power data to a CSV file
-corrected_data.to_csv(power_output, index=False)
-
-# Create a DataFrame to store the calculated background means
-mean_data = pd.DataFrame({
-    "shelly_mean": [shelly_bg_mean],
-    "hwmon_mean": [system_bg_mean]
-})
-
-# Save the background mean values to a CSV file
-mean_data.to_csv(mean_output, index=False)
\ No newline at end of file
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from power_clock import to_datetime
+from power_store import is_store, resolve, read_table, write_table
+from session_names import BASELINE_SESSIONS
+
+data_folder = "results"
+power_input = 'power_log_fusion.csv'
+power_output = os.path.join(data_folder, 'power_log_corrected.csv')
+mean_output = os.path.join(data_folder, 'mean.csv') # Changed 'media_output' to 'mean_output' for consistency
+
+# How the baseline subtracted from each sample is obtained:
+#   'global'  - one estimate over all baseline samples (the original method with ESTIMATOR='mean')
+#   'window'  - one estimate per baseline window, linearly interpolated in time between windows
+#   'rolling' - rolling estimate over the baseline samples within ROLLING_WINDOW seconds, interpolated in time
+BASELINE_METHOD = "window"
+BASELINE_METHODS = ("global", "window", "rolling")
+# Estimator of the baseline level: 'median' and 'trimmed' (mean without the TRIM lowest and highest
+# fraction of the samples) ignore outliers such as a background task waking up
+ESTIMATOR = "median"
+ESTIMATORS = ("mean", "median", "trimmed")
+TRIM = 0.1
+ROLLING_WINDOW = 300
+# Fused log columns copied unchanged into the corrected log (the trial number of repeated visits)
+PASS_THROUGH = ("trial",)
+
+
+def grouped_estimate(values, groups, estimator=ESTIMATOR):
+    """
+    Estimates the level of `values` within each group in one grouped pass.
+
+    Args:
+        values (pd.Series): Power samples.
+        groups (pd.Series): Group label of each sample.
+        estimator (str): One of ESTIMATORS.
+
+    Returns:
+        pd.Series: The estimate per group.
+    """
+    grouped = values.groupby(groups, sort=True)
+    if estimator == "mean":
+        return grouped.mean()
+    if estimator == "median":
+        return grouped.median()
+    bounds = grouped.quantile([TRIM, 1 - TRIM]).unstack()
+    low = groups.map(bounds.iloc[:, 0])
+    high = groups.map(bounds.iloc[:, 1])
+    return values.where((values >= low) & (values <= high)).groupby(groups, sort=True).mean()
+
+
+def baseline_windows(timestamps, sessions):
+    """
+    Numbers the baseline windows: runs of consecutive (in time) baseline samples.
+
+    Returns:
+        np.ndarray: Window number (1, 2, ...) of every sample, 0 for samples outside baseline sessions.
+    """
+    baseline = np.isin(np.asarray(sessions, dtype=str), BASELINE_SESSIONS)
+    order = np.argsort(timestamps, kind='stable')
+    in_time_order = baseline[order]
+    starts = in_time_order & ~np.concatenate(([False], in_time_order[:-1]))
+    windows = np.empty(len(order), dtype=np.int64)
+    windows[order] = np.where(in_time_order, np.cumsum(starts), 0)
+    return windows
+
+
+def correct_power(df, method=BASELINE_METHOD, estimator=ESTIMATOR, rolling_window=ROLLING_WINDOW):
+    """
+    Subtracts the idle baseline from the Shelly and hwmon power columns.
+
+    The baseline comes from the samples of the BASELINE_SESSIONS. With several
+    baseline windows (Idle pauses between sessions), the 'window' and 'rolling'
+    methods follow the drift of the idle power over the run instead of using one
+    level for everything. All steps are vectorized or windowed, so the cost is
+    linear in the number of samples (times log of the window size for 'rolling').
+
+    Args:
+        df (pd.DataFrame): Fused power data.
+        method (str): One of BASELINE_METHODS.
+        estimator (str): One of ESTIMATORS ('rolling' supports 'mean' and 'median').
+        rolling_window (float): Width in seconds of the 'rolling' window.
+
+    Returns:
+        tuple: (corrected DataFrame, per-window baseline table).
+    """
+    if method not in BASELINE_METHODS:
+        raise ValueError(f"Unknown baseline method '{method}'. Expected one of {BASELINE_METHODS}.")
+    if estimator not in ESTIMATORS or (method == "rolling" and estimator == "trimmed"):
+        raise ValueError(f"Estimator '{estimator}' is not available for the '{method}' method.")
+
+    timestamps = to_datetime(df["timestamp"]).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    sessions = df["session"].astype(str).to_numpy()
+    windows = baseline_windows(timestamps, sessions)
+    if not windows.any():
+        raise ValueError(f"No baseline samples found (sessions {', '.join(BASELINE_SESSIONS)}).")
+
+    # Convert power columns to numeric, coercing errors
+    power = {
+        "shelly": pd.to_numeric(df["power_shelly"], errors='coerce').reset_index(drop=True),
+        "hwmon": pd.to_numeric(df["power_hwmon"], errors='coerce').reset_index(drop=True),
+    }
+
+    # Per-window baseline table, also used as the interpolation points of the 'window' method
+    in_window = windows > 0
+    window_ids = pd.Series(windows[in_window])
+    window_times = pd.Series(timestamps[in_window]).groupby(window_ids, sort=True)
+    table = pd.DataFrame({
+        "session": pd.Series(sessions[in_window]).groupby(window_ids, sort=True).first(),
+        "start_ns": window_times.min(),
+        "end_ns": window_times.max(),
+        "samples": window_times.size(),
+    })
+    table["duration_s"] = (table["end_ns"] - table["start_ns"]) / 1e9
+    for name, values in power.items():
+        table[f"{name}_baseline"] = grouped_estimate(values[in_window].reset_index(drop=True), window_ids, estimator)
+    table.index.name = "window"
+    centers = ((table["start_ns"] + table["end_ns"]) // 2).to_numpy()
+
+    levels = {}
+    for name, values in power.items():
+        if method == "global":
+            everything = pd.Series(np.zeros(in_window.sum(), dtype=np.int64))
+            level = grouped_estimate(values[in_window].reset_index(drop=True), everything, estimator).iloc[0]
+            levels[name] = np.full(len(values), level)
+        elif method == "window":
+            estimates = table[f"{name}_baseline"].to_numpy()
+            known = ~np.isnan(estimates)
+            # Constant before the first and after the last window, linear in between
+            levels[name] = np.interp(timestamps, centers[known], estimates[known])
+        else:
+            order = np.argsort(timestamps[in_window], kind='stable')
+            base_times = timestamps[in_window][order]
+            base = pd.Series(values[in_window].to_numpy()[order], index=pd.to_datetime(base_times))
+            rolled = base.rolling(f"{rolling_window}s", center=True, min_periods=1)
+            rolled = (rolled.median() if estimator == "median" else rolled.mean()).to_numpy()
+            known = ~np.isnan(rolled)
+            levels[name] = np.interp(timestamps, base_times[known], rolled[known])
+
+    # Create a new DataFrame with background-corrected power values
+    corrected_data = pd.DataFrame({
+        "timestamp": df["timestamp"].to_numpy(),
+        "power_shelly": power["shelly"].to_numpy() - levels["shelly"],
+        "power_hwmon": power["hwmon"].to_numpy() - levels["hwmon"],
+        "session": df["session"].to_numpy()
+    })
+    for column in PASS_THROUGH:
+        if column in df.columns:
+            corrected_data[column] = df[column].to_numpy()
+    return corrected_data, table.reset_index()
+
+
+def save_correction(corrected_data, baseline_table, columnar=False):
+    """
+    Saves the corrected power data (as a columnar store if `columnar` is set) and the per-window baselines.
+    """
+    write_table(corrected_data, power_output, columnar)
+    baseline_table.to_csv(mean_output, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Subtract the idle baseline from the fused power log.")
+    parser.add_argument("--method", choices=BASELINE_METHODS, default=BASELINE_METHOD,
+                        help="How the baseline follows the run (default: %(default)s)")
+    parser.add_argument("--estimator", choices=ESTIMATORS, default=ESTIMATOR,
+                        help="Baseline level estimator (default: %(default)s)")
+    parser.add_argument("--rolling-window", type=float, default=ROLLING_WINDOW,
+                        help="Seconds of baseline samples per rolling estimate (default: %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        df = read_table(power_input)
+    except FileNotFoundError:
+        print("ERROR: File not found. Please check the path.")
+        sys.exit(1)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+
+    try:
+        corrected_data, baseline_table = correct_power(df, args.method, args.estimator, args.rolling_window)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    # Save the corrected power data to a CSV file, or to a columnar store if the fused log is one
+    save_correction(corrected_data, baseline_table, columnar=is_store(resolve(power_input)))
@@ -1,109 +1,503 @@
-import csv
-from datetime import datetime, timedelta
-
-# Define input and output file names
-HWMON_DATA = "power_log_hwmon.csv"
-SHELLY_DATA = "power_log_shelly.csv"
-FUSION_DATA = "power_log_fusion.csv"
-
-
-def parse_ts(ts):
-    """
-    Parses a timestamp string in 'YYYYMMDDTHH:MM:SS' format into a datetime object.
-    """
-    return datetime.strptime(ts, "%Y%m%dT%H:%M:%S")
-
-
-# --- Process Hwmon Data ---
-# Initialize a list to store processed system (hwmon) data
-system_data = []
-
-try:
-    with open(HWMON_DATA, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                # Parse timestamp, convert power to float, and extract session
-                timestamp = parse_ts(row["timestamp"])
-                power = float(row["power"])
-                session = row["session"]
-                # Append processed data to the list
-                system_data.append({"timestamp": timestamp, "power": power, "session": session})
-            except (ValueError, KeyError) as e:
-                # Skip rows with parsing errors and print a warning
-                print(f"Skipping row in {HWMON_DATA} due to parsing error: {e} - Row: {row}")
-                continue
-except FileNotFoundError:
-    print(f"Error: {HWMON_DATA} not found. Please ensure the file exists.")
-    exit()  # Exit the script if a critical input file is missing
-except Exception as e:
-    print(f"An unexpected error occurred while reading {HWMON_DATA}: {e}")
-    exit()
-
-# --- Process Shelly Data ---
-# Initialize a list to store processed Shelly data
-shelly_data = []
-try:
-    with open(SHELLY_DATA, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                # Parse timestamp and convert power to float
-                timestamp = parse_ts(row["timestamp"])
-                power = float(row["power"])
-                # Append processed data to the list
-                shelly_data.append({"timestamp": timestamp, "power": power})
-            except (ValueError, KeyError) as e:
-                # Skip rows with parsing errors and print a warning
-                print(f"Skipping row in {SHELLY_DATA} due to parsing error: {e} - Row: {row}")
-                continue
-except FileNotFoundError:
-    print(f"Error: {SHELLY_DATA} not found. Please ensure the file exists.")
-    exit()  # Exit the script if a critical input file is missing
-except Exception as e:
-    print(f"An unexpected error occurred while reading {SHELLY_DATA}: {e}")
-    exit()
-
-# --- Fuse Data ---
-# Initialize a list to store the fused data
-fused_data = []
-
-# Iterate through each Shelly data point
-for shelly in shelly_data:
-    matched = None
-    # Look for a matching system data point based on timestamp proximity
-    for sys in system_data:
-        delta = abs(shelly["timestamp"] - sys["timestamp"])
-        if delta <= timedelta(seconds=1):  # If timestamps are within 1 second, consider them a match
-            matched = sys
-            break  # Found a match, move to the next Shelly data point
-    
-    # If a match is found, add the combined data to the fused_data list
-    if matched:
-        fused_data.append({
-            "timestamp": shelly["timestamp"].strftime("%Y%m%dT%H:%M:%S"),  # Format timestamp back to string
-            "power_shelly": shelly["power"],
-            "power_hwmon": matched["power"],
-            "session": matched["session"]
-        })
-    # If no match is found, do nothing (skip this Shelly data point)
-    else:
-        pass
-
-# --- Write Fused Data to CSV ---
-try:
-    with open(FUSION_DATA, 'w', newline='') as f:
-        # Define the column headers for the output CSV
-        writer = csv.DictWriter(f, fieldnames=[
-            "timestamp", "power_shelly", "power_hwmon", "session"
-        ])
-        writer.writeheader()  # Write the header row
-        writer.writerows(fused_data)  # Write all the fused data rows
-    
-    print(f"Data successfully fused and saved to {FUSION_DATA}")
-    print(f"Total fused entries: {len(fused_data)}")
-
-except IOError as e:
-    print(f"Error writing to file {FUSION_DATA}: {e}")
-except Exception as e:
-    print(f"An unexpected error occurred while writing the fused data: {e}")
\ No newline at end of file
+import argparse
+import csv
+import heapq
+import os
+import resource
+from array import array
+from itertools import islice
+
+from power_clock import parse_timestamp, skip_comments
+from power_store import StoreWriter, columnar_path, is_store, iter_store_rows, read_meta, resolve, store_columns
+from segment_log import log_segments
+from session_index import SessionIndexBuilder, index_path
+from shelly_devices import DEVICES_FILE, load_devices
+
+# Define input and output file names
+HWMON_DATA = "power_log_hwmon.csv"
+SHELLY_DATA = "power_log_shelly.csv"
+FUSION_DATA = "power_log_fusion.csv"
+
+# Maximum distance in nanoseconds between a Shelly sample and its matching hwmon sample
+TOLERANCE = 1_000_000_000
+# How a Shelly sample picks its hwmon partner:
+#   'nearest'  - closest hwmon sample on either side
+#   'backward' - latest hwmon sample at or before the Shelly timestamp
+#   'forward'  - earliest hwmon sample at or after the Shelly timestamp
+MATCH_POLICY = "nearest"
+MATCH_POLICIES = ("nearest", "backward", "forward")
+# Rows held in the streaming reorder window and written per output batch
+CHUNK_SIZE = 10_000
+# Largest Shelly/hwmon lag in nanoseconds searched by --align (see power_alignment.py)
+MAX_LAG = 5_000_000_000
+
+FUSION_FIELDS = ["timestamp", "power_shelly", "power_hwmon", "session"]
+# Shelly log statuses that carry a power reading (polled or pushed); the others mark gaps
+VALID_STATUSES = ("ok", "push")
+
+
+def iter_rows(file_path):
+    """
+    Yields the header of a log, then its rows. A log with a progress file (a resumed
+    hwmon run, see segment_log.py) yields the committed rows of each of its segments,
+    in the columns of the first one.
+    """
+    segments = log_segments(file_path)
+    if segments is None:
+        yield from iter_file_rows(file_path)
+        return
+    header = None
+    for path, committed in segments:
+        if not os.path.exists(resolve(path)):
+            print(f"Warning: Segment {path} of {file_path} is missing; its rows are skipped.")
+            continue
+        rows = iter_file_rows(path)
+        columns = next(rows, [])
+        if header is None:
+            header = columns
+            yield header
+        if columns == header:
+            yield from islice(rows, committed)
+        else:
+            # A segment logged with other channels: map its values to the first segment's columns
+            positions = [columns.index(column) if column in columns else None for column in header]
+            for row in islice(rows, committed):
+                yield [row[i] if i is not None and i < len(row) else "" for i in positions]
+        rows.close()
+    if header is None:
+        yield []
+
+
+def iter_file_rows(file_path):
+    """
+    Yields the header of a single log file, then its rows. `file_path` is a CSV file or a
+    columnar store; a CSV path whose '.pcol' twin is newer reads the store (see power_store.resolve).
+    """
+    source = resolve(file_path)
+    if is_store(source):
+        yield store_columns(source)
+        yield from iter_store_rows(source)
+        return
+    with open(source, 'r', newline='') as f:
+        reader = csv.reader(skip_comments(f))
+        yield next(reader, [])
+        yield from reader
+
+
+def hwmon_extra_columns(file_path=HWMON_DATA):
+    """
+    Returns the hwmon log columns beyond timestamp/power/session (per-channel readings,
+    tags), in file order. They are carried through to the fused log unchanged.
+    """
+    rows = iter_rows(file_path)
+    header = next(rows, [])
+    rows.close()
+    return [column for column in header if column not in ("timestamp", "power", "session")]
+
+
+def iter_hwmon(file_path=HWMON_DATA):
+    """
+    Lazily reads the hwmon log, yielding (timestamp, power, session, extras) tuples in
+    file order, where extras holds the values of hwmon_extra_columns().
+    """
+    reader = iter_rows(file_path)
+    header = next(reader, [])
+    try:
+        ts_col, power_col, session_col = (header.index(name) for name in ("timestamp", "power", "session"))
+    except ValueError as e:
+        raise ValueError(f"{file_path} is missing a required column: {e}")
+    extra_cols = [i for i, column in enumerate(header) if i not in (ts_col, power_col, session_col)]
+    for row in reader:
+        try:
+            # Parse timestamp, convert power to float, and extract session and extra columns
+            yield (parse_timestamp(row[ts_col]), float(row[power_col]), row[session_col],
+                   tuple(row[i] for i in extra_cols))
+        except (ValueError, IndexError) as e:
+            # Skip rows with parsing errors and print a warning
+            print(f"Skipping row in {file_path} due to parsing error: {e} - Row: {row}")
+
+
+def iter_shelly(file_path=SHELLY_DATA, device=None):
+    """
+    Lazily reads the Shelly log, yielding (timestamp, power) tuples in file order.
+    Gap rows recorded by the logger (status not in VALID_STATUSES) are skipped and counted.
+    With `device`, only the rows of that device label are returned.
+    """
+    gaps = 0
+    reader = iter_rows(file_path)
+    header = next(reader, [])
+    try:
+        ts_col, power_col = (header.index(name) for name in ("timestamp", "power"))
+    except ValueError as e:
+        raise ValueError(f"{file_path} is missing a required column: {e}")
+    status_col = header.index("status") if "status" in header else None
+    if device is not None and "device" not in header:
+        raise ValueError(f"{file_path} has no 'device' column to select device '{device}'")
+    device_col = header.index("device") if "device" in header else None
+    devices_seen = set()
+    for row in reader:
+        if device_col is not None:
+            if device is None:
+                devices_seen.add(row[device_col])
+            elif row[device_col] != device:
+                continue
+        if status_col is not None and row[status_col] not in VALID_STATUSES:
+            gaps += 1
+            continue
+        try:
+            # Parse timestamp and convert power to float
+            yield parse_timestamp(row[ts_col]), float(row[power_col])
+        except (ValueError, IndexError) as e:
+            # Skip rows with parsing errors and print a warning
+            print(f"Skipping row in {file_path} due to parsing error: {e} - Row: {row}")
+    if gaps:
+        print(f"{file_path}: skipped {gaps} gap rows (timeouts, errors or missed deadlines).")
+    if len(devices_seen) > 1:
+        print(f"Warning: {file_path} mixes {len(devices_seen)} devices ({', '.join(sorted(devices_seen))}); "
+              f"use --devices to fuse them separately.")
+
+
+def load_hwmon(file_path=HWMON_DATA):
+    """
+    Reads the whole hwmon log into a list of (timestamp, power, session, extras) tuples sorted by timestamp.
+    """
+    # Stable sort: rows sharing a timestamp keep their logging order
+    return sorted(iter_hwmon(file_path), key=lambda item: item[0])
+
+
+def load_shelly(file_path=SHELLY_DATA, device=None):
+    """
+    Reads the whole Shelly log (or one device's rows of it) into a list of
+    (timestamp, power) tuples sorted by timestamp.
+    """
+    return sorted(iter_shelly(file_path, device), key=lambda item: item[0])
+
+
+def reorder(rows, window=CHUNK_SIZE, label="stream"):
+    """
+    Restores timestamp order of an almost-sorted stream using a bounded sliding window.
+
+    Loggers append in time order, so at most a few rows are ever out of place. The
+    window holds at most `window` rows in a heap and releases the oldest one each
+    time it is full. A row arriving older than one already released cannot be
+    placed anymore; it is dropped with a warning.
+
+    Args:
+        rows (iterable): Tuples whose first element is the timestamp.
+        window (int): Maximum number of rows held in memory.
+        label (str): Name of the stream used in warnings.
+
+    Yields:
+        tuple: The input rows in timestamp order.
+    """
+    heap = []
+    last_released = None
+    dropped = 0
+    for seq, row in enumerate(rows):
+        if last_released is not None and row[0] < last_released:
+            dropped += 1
+            continue
+        heapq.heappush(heap, (row[0], seq, row))
+        if len(heap) > window:
+            last_released, _, oldest = heapq.heappop(heap)
+            yield oldest
+    while heap:
+        yield heapq.heappop(heap)[2]
+    if dropped:
+        print(f"Warning: {dropped} rows of {label} were further out of order than the "
+              f"{window}-row window and have been dropped.")
+
+
+def fuse(shelly_data, system_data, tolerance=TOLERANCE, policy=MATCH_POLICY):
+    """
+    As-of join of two time-ordered streams using a single forward pass over each.
+
+    For every Shelly sample, the hwmon cursor is advanced to the last sample at or
+    before the Shelly timestamp; the candidates are then that sample and the one
+    right after it. Both inputs must be sorted by timestamp, which makes the join
+    O(N + M) instead of scanning every hwmon row for every Shelly row.
+
+    Args:
+        shelly_data (iterable): (timestamp, power) tuples sorted by timestamp.
+        system_data (iterable): (timestamp, power, session, extras) tuples sorted by timestamp.
+        tolerance (int): Maximum allowed distance between matched samples in nanoseconds.
+        policy (str): One of MATCH_POLICIES.
+
+    Yields:
+        tuple: Fused rows in FUSION_FIELDS order, followed by the extra hwmon
+              values of the match. Shelly samples without a hwmon partner inside
+              the tolerance are skipped.
+    """
+    if policy not in MATCH_POLICIES:
+        raise ValueError(f"Unknown match policy '{policy}'. Expected one of {MATCH_POLICIES}.")
+
+    system_iter = iter(system_data)
+    previous = None                      # last hwmon sample with timestamp <= current Shelly timestamp
+    upcoming = next(system_iter, None)   # first hwmon sample with timestamp > current Shelly timestamp
+
+    for shelly_ts, shelly_power in shelly_data:
+        while upcoming is not None and upcoming[0] <= shelly_ts:
+            previous = upcoming
+            upcoming = next(system_iter, None)
+
+        backward = previous if previous is not None and shelly_ts - previous[0] <= tolerance else None
+        if previous is not None and previous[0] == shelly_ts:
+            forward = previous
+        elif upcoming is not None and upcoming[0] - shelly_ts <= tolerance:
+            forward = upcoming
+        else:
+            forward = None
+
+        if policy == "backward":
+            matched = backward
+        elif policy == "forward":
+            matched = forward
+        elif backward is None or forward is None:
+            matched = backward or forward
+        else:
+            # Ties go to the earlier sample, as the hwmon reading was already taken
+            matched = backward if shelly_ts - backward[0] <= forward[0] - shelly_ts else forward
+
+        # If no match is found, skip this Shelly data point
+        if matched is not None:
+            yield (shelly_ts, shelly_power, matched[1], matched[2]) + matched[3]
+
+
+def write_fusion(fused_rows, file_path=FUSION_DATA, chunk_size=CHUNK_SIZE, extra_columns=(), columnar=False,
+                 dtypes=None, header=None):
+    """
+    Writes fused rows to a CSV file in batches of `chunk_size` rows and returns
+    the number of rows written. Only one batch is held in memory at a time.
+    `extra_columns` names the values following the FUSION_FIELDS in each row.
+    With `columnar`, the batches go to the '.pcol' store paired with `file_path`,
+    using `dtypes` (column -> store dtype) where the defaults do not fit.
+    `header` is an optional '#' metadata line written before the column names.
+    """
+    count = 0
+    batch = []
+    if columnar:
+        f = writer = StoreWriter(columnar_path(file_path), FUSION_FIELDS + list(extra_columns), dtypes, header)
+    else:
+        f = open(file_path, 'w', newline='')
+        if header:
+            f.write(header + "\n")
+        # Define the column headers for the output CSV
+        writer = csv.writer(f)
+        writer.writerow(FUSION_FIELDS + list(extra_columns))  # Write the header row
+    try:
+        for row in fused_rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                writer.writerows(batch)
+                count += len(batch)
+                batch.clear()
+        writer.writerows(batch)
+        count += len(batch)
+    finally:
+        f.close()
+    return count
+
+
+def peak_rss_mib():
+    """
+    Returns the peak resident set size of this process in MiB.
+    """
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def device_fusion_file(label, output_file=FUSION_DATA):
+    """
+    Returns the fused log path of one Shelly device, e.g. 'power_log_fusion_desktop.csv'.
+    """
+    root, ext = os.path.splitext(output_file)
+    safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label)
+    return f"{root}_{safe_label}{ext}"
+
+
+def shift(rows, offset):
+    """
+    Yields (timestamp, power) rows with `offset` nanoseconds subtracted from each timestamp.
+    """
+    for ts, power in rows:
+        yield ts - offset, power
+
+
+def estimate_alignment(shelly_data, system_data, max_lag=MAX_LAG):
+    """
+    Estimates the lag of the Shelly readings behind the hwmon readings and prints it.
+
+    Args:
+        shelly_data (iterable): (timestamp, power) tuples.
+        system_data (iterable): (timestamp, power, session, extras) tuples.
+        max_lag (int): Largest lag in nanoseconds searched in either direction.
+
+    Returns:
+        tuple: (lag in nanoseconds, correlation), or None if it could not be estimated.
+    """
+    from power_alignment import estimate_lag
+
+    shelly_ts, shelly_power = array('q'), array('d')
+    for ts, power in shelly_data:
+        shelly_ts.append(ts)
+        shelly_power.append(power)
+    hwmon_ts, hwmon_power = array('q'), array('d')
+    for row in system_data:
+        hwmon_ts.append(row[0])
+        hwmon_power.append(row[1])
+
+    alignment = estimate_lag(shelly_ts, shelly_power, hwmon_ts, hwmon_power, max_lag=max_lag)
+    if alignment is None:
+        print("Warning: Could not estimate the Shelly/hwmon lag (too little overlap or no power "
+              "variation); fusing without alignment.")
+    else:
+        lag, correlation = alignment
+        print(f"Estimated Shelly lag behind hwmon: {lag / 1e6:.1f} ms (correlation {correlation:.3f})")
+        if abs(lag) >= max_lag * 0.95:
+            print(f"Warning: The lag is at the edge of the searched range (+/- {max_lag / 1e9:g} s); "
+                  f"consider a larger --max-lag.")
+    return alignment
+
+
+def main(hwmon_file=HWMON_DATA, shelly_file=SHELLY_DATA, output_file=FUSION_DATA,
+         tolerance=TOLERANCE, policy=MATCH_POLICY, stream=False, chunk_size=CHUNK_SIZE, device=None,
+         columnar=False, align=False, max_lag=MAX_LAG, grid=None):
+    """
+    Fuses the hwmon and Shelly logs into `output_file`. With `device`, only that
+    device's rows of a multi-device Shelly log are used. Either input may be a CSV
+    log or a columnar store; with `columnar` the output is written as a store too.
+
+    With `stream=True` both logs are read as iterators and restored to time order
+    in a window of `chunk_size` rows, so peak memory does not depend on the log
+    length. Otherwise both logs are loaded and sorted in full.
+
+    With `align`, the lag of the Shelly readings behind the hwmon readings is
+    estimated by cross-correlation (see power_alignment.py), reported, recorded in
+    the output's metadata line and subtracted from the Shelly timestamps before the
+    join. With `grid` (a step in nanoseconds), both power series are resampled onto
+    a common regular grid instead of being joined sample by sample; this needs the
+    logs in memory, so it ignores `stream`.
+
+    The session index of the output (see session_index.py) is written next to it.
+
+    Returns:
+        int: The number of fused rows, or None if there's an error.
+    """
+    # --- Process Hwmon and Shelly Data ---
+    # Streaming readers open their files lazily, so check for them up front
+    for path in (hwmon_file, shelly_file):
+        if not os.path.exists(resolve(path)):
+            print(f"Error: {path} not found. Please ensure the file exists.")
+            return None
+
+    try:
+        extra_columns = hwmon_extra_columns(hwmon_file)
+        # A columnar hwmon log carries the types of its extra columns over to the fused store
+        source = resolve(hwmon_file)
+        dtypes = ({column["name"]: column["dtype"] for column in read_meta(source)["columns"]}
+                  if is_store(source) else None)
+        stream = stream and grid is None
+        alignment = None
+        if stream:
+            if align:
+                # Estimating the lag takes an extra pass that keeps only timestamps and powers
+                alignment = estimate_alignment(iter_shelly(shelly_file, device), iter_hwmon(hwmon_file), max_lag)
+            system_data = reorder(iter_hwmon(hwmon_file), chunk_size, hwmon_file)
+            shelly_data = reorder(iter_shelly(shelly_file, device), chunk_size, shelly_file)
+        else:
+            system_data = load_hwmon(hwmon_file)
+            shelly_data = load_shelly(shelly_file, device)
+            if align:
+                alignment = estimate_alignment(shelly_data, system_data, max_lag)
+    except Exception as e:
+        print(f"An unexpected error occurred while reading the power logs: {e}")
+        return None
+
+    header = None
+    if alignment is not None:
+        lag, correlation = alignment
+        shelly_data = shift(shelly_data, lag)
+        header = f"# alignment=xcorr lag_ns={lag} correlation={correlation:.4f}"
+
+    # --- Fuse Data and Write to CSV ---
+    try:
+        if grid is not None:
+            from power_alignment import grid_rows
+            fused_rows = grid_rows(list(shelly_data), system_data, grid)
+        else:
+            fused_rows = fuse(shelly_data, system_data, tolerance, policy)
+        # The session index is collected while the rows stream past, at no extra pass
+        index = SessionIndexBuilder()
+        total = write_fusion(index.track(fused_rows), output_file, chunk_size, extra_columns, columnar, dtypes,
+                             header)
+        index.save(output_file)
+        print(f"Data successfully fused and saved to {columnar_path(output_file) if columnar else output_file}")
+        print(f"Session index ({len(index.ranges)} ranges) saved to {index_path(output_file)}")
+        print(f"Total fused entries: {total}")
+        print(f"Peak RSS: {peak_rss_mib():.1f} MiB")
+        return total
+    except IOError as e:
+        print(f"Error writing to file {output_file}: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred while fusing the power logs: {e}")
+    return None
+
+
+def fuse_devices(devices, shelly_file=SHELLY_DATA, output_file=FUSION_DATA, **options):
+    """
+    Fuses each device of a multi-device Shelly log with the hwmon log of the host it
+    meters (the device's 'hwmon_log' entry, HWMON_DATA by default) into its own
+    fused log named by device_fusion_file().
+
+    Args:
+        devices (list): Device dicts as returned by shelly_devices.load_devices().
+        **options: Passed on to main() (tolerance, policy, stream, chunk_size, columnar, align, max_lag, grid).
+
+    Returns:
+        dict: Device label -> number of fused rows (None where fusion failed).
+    """
+    totals = {}
+    for device in devices:
+        label = device["label"]
+        print(f"\n--- Fusing device '{label}' ---")
+        totals[label] = main(device.get("hwmon_log", HWMON_DATA), shelly_file,
+                             device_fusion_file(label, output_file), device=label, **options)
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuse the Shelly and hwmon power logs by timestamp.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE / 1e9,
+                        help="Maximum distance in seconds between matched samples (default: %(default)s)")
+    parser.add_argument("--policy", choices=MATCH_POLICIES, default=MATCH_POLICY,
+                        help="Which hwmon sample a Shelly sample is matched to (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read both logs as time-ordered streams instead of loading them in full")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Rows held in the streaming reorder window and per write batch (default: %(default)s)")
+    parser.add_argument("--devices",
+                        help=f"Shelly device list, e.g. {DEVICES_FILE}: fuse each device with its host's hwmon log")
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv",
+                        help="Write the fused log as a CSV file or a '.pcol' columnar store (default: %(default)s)")
+    parser.add_argument("--align", action="store_true",
+                        help="Estimate the Shelly/hwmon lag by cross-correlation and correct it before the join")
+    parser.add_argument("--max-lag", type=float, default=MAX_LAG / 1e9,
+                        help="Largest lag in seconds searched by --align (default: %(default)s)")
+    parser.add_argument("--grid", type=float,
+                        help="Resample both power series onto a common grid with this step in seconds "
+                             "instead of joining samples")
+    args = parser.parse_args()
+
+    options = dict(tolerance=int(args.tolerance * 1e9), policy=args.policy,
+                   stream=args.stream, chunk_size=args.chunk_size, columnar=args.format == "columnar",
+                   align=args.align, max_lag=int(args.max_lag * 1e9),
+                   grid=int(args.grid * 1e9) if args.grid else None)
+    if args.devices:
+        try:
+            devices = load_devices(args.devices)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load the device list '{args.devices}': {e}")
+            exit(1)
+        if None in fuse_devices(devices, **options).values():
+            exit(1)
+    elif main(**options) is None:
+        exit(1)
@@ -1,138 +1,631 @@
-# Copyright (C) 2025 Sandra Nicole Solórzano Carcelén sandranicole2001@hotmail.com
-#
-# This program is free software: you can redistribute it and/or modify
-# it under the terms of the GNU General Public License as published by
-# the Free Software Foundation, either version 3 of the License, or
-# (at your option) any later version.
-#
-# This program is distributed in the hope that it will be useful,
-# but WITHOUT ANY WARRANTY; without even the implied warranty of
-# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
-# GNU General Public License for more details.
-#
-# You should have received a copy of the GNU General Public License
-# along with this program. If not, see <https://www.gnu.org/licenses/>.
-
-# power_logger_hwmon.py
-
-import sys
-import time
-import json
-import csv
-import subprocess
-import glob
-
-# Define the name of your power sensor as found in /sys/class/hwmon/hwmon*/name
-POWER_SENSOR_NAME = "fam15h_power" 
-
-# Define output file and timing parameters
-OUTPUT_FILE = "power_log_hwmon.csv"
-INTERVAL = 1  # Time interval between power readings in seconds
-DURATION = 60 # Duration for each session's power capture in seconds
-PAUSE = 10    # Pause between sessions in seconds
-
-# Command-line argument check
-if len(sys.argv) > 2:
-    print("Usage: python3 power_logger_hwmon.py <webs.json>")
-    sys.exit(1) # Exit with an error code
-
-# Get the path to the webs.json file from command-line arguments
-webs_json = sys.argv[1]
-
-def get_power_field():
-    """
-    Finds the sysfs path for the power input of the specified HWMON sensor.
-    """
-    # Search for hwmon devices and their names
-    hwmon_paths = glob.glob("/sys/class/hwmon/hwmon*/name")
-    for path in hwmon_paths:
-        with open(path, "r") as f:
-            if POWER_SENSOR_NAME in f.read().strip():
-                return path.replace("name", "power1_input")
-    return None # Return None if the sensor is not found
-
-# Get the specific power field path for the sensor
-POWER_FIELD = get_power_field()
-
-# Exit if the power sensor file is not found
-if POWER_FIELD is None:
-    print(f'Error: The power consumption file does not exist on the system.')
-    exit(1) # Exit with an error code
-
-print("Starting power meter: hwmon")
-
-# Load URLs from the provided JSON file
-try:
-    with open(webs_json) as file:
-        URLS = json.load(file)
-except FileNotFoundError:
-    print(f"Error: The file '{webs_json}' was not found.")
-    sys.exit(1)
-except json.JSONDecodeError:
-    print(f"Error: Could not decode JSON from '{webs_json}'. Please check the file format.")
-    sys.exit(1)
-
-# Initialize the CSV output file with headers
-with open(OUTPUT_FILE, 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(["timestamp", "power", "session"])
-
-def save_power(session):
-    """
-    Captures power readings for a specified duration and saves them to the output CSV.
-    """
-    start_time = time.time()
-    try:
-        while time.time() - start_time < DURATION:
-            with open(POWER_FIELD, 'r') as file:
-                # Read power, convert to integer, and then to Watts (from microWatts)
-                power = int(file.read().strip()) / 1_000_000 
-
-            # Get current timestamp in the specified format
-            timestamp = time.strftime("%Y%m%dT%H:%M:%S")
-
-            # Append the data to the CSV file
-            with open(OUTPUT_FILE, 'a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([timestamp, power, session])
-
-            print(f'Hwmon: {power:.2f} W') # Print current power reading
-            time.sleep(INTERVAL) # Wait for the next reading
-    except KeyboardInterrupt:
-        print('\nStopping capture...') # Handle manual interruption
-    except FileNotFoundError:
-        print(f"Error: Power sensor file '{POWER_FIELD}' not found during capture. Exiting.")
-        sys.exit(1)
-    except Exception as e:
-        print(f"An unexpected error occurred during power capture: {e}")
-        sys.exit(1)
-
-# --- Start Power Logging Sessions ---
-
-# Background session
-print("\nBackground session starting...")
-save_power("Background")
-time.sleep(PAUSE) # Pause after session
-
-# BlankTab session (open a blank Firefox tab)
-print("\nBlankTab session starting...")
-# Open Firefox with a new window and blank tab, redirecting stdout/stderr to DEVNULL
-subprocess.Popen(["firefox", "--new-window", "about:blank"],
-                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-time.sleep(DURATION) # Let Firefox load and stabilize
-
-# Iterate through defined URLs and capture power
-for name, url in URLS.items():
-    print(f'\nSession: {name} ({url})\n')
-    # Open URL in a new Firefox tab
-    subprocess.run(["firefox", "--new-tab", url],
-                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    save_power(name) # Capture power for this session
-    # Close the current tab using xdotool
-    subprocess.run(["xdotool", "key", "Ctrl+w"],
-                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    time.sleep(PAUSE) # Pause after session
-
-# Kill all Firefox processes after all sessions are complete
-subprocess.run(["pkill", "-f", "firefox"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-print(f"\nCapture completed. Data saved to {OUTPUT_FILE}")
\ No newline at end of file
+# Copyright (C) 2025 Sandra Nicole Solórzano Carcelén sandranicole2001@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# power_logger_hwmon.py
+
+import argparse
+import os
+import sys
+import time
+import json
+import csv
+import random
+from array import array
+
+from browser_drivers import DRIVER, DRIVERS, FirefoxDriver, make_driver
+from live_dashboard import LivePublisher, parse_address
+from hwmon_channels import discover_channels, discover_counters, find_primary_channel
+from logger_overhead import OVERHEAD_FIELDS, OverheadMeter, marginal_energy
+from power_clock import MonotonicClock, write_header
+from power_store import StoreWriter, columnar_path
+from process_attribution import ProcessTracker
+from segment_log import RunProgress, load_progress
+from session_names import BASELINE_SESSIONS, IDLE_SESSION
+from trial_scheduler import CONFIDENCE, MIN_TRIALS, ORDER, ORDERS, TRIALS, EarlyStopping, schedule_trials
+
+# Define the name of your power sensor as found in /sys/class/hwmon/hwmon*/name
+POWER_SENSOR_NAME = "fam15h_power" 
+
+# Define output file and timing parameters
+OUTPUT_FILE = "power_log_hwmon.csv"
+STATS_FILE = "power_log_hwmon_stats.csv" # Per-session sampling rate and jitter summary
+INTERVAL = 1  # Time interval between power readings in seconds
+DURATION = 60 # Duration for each session's power capture in seconds
+PAUSE = 10    # Pause between sessions in seconds
+BATCH_SIZE = 1000 # Samples buffered in memory before they are written to disk
+COUNTER_FILE = "power_log_energy.csv" # Energy counter readings written in --energy-counters mode
+CHECKPOINT_INTERVAL = 10 # Seconds between counter checkpoints, well below the counters' wrap time
+SYNC_INTERVAL = 10 # Seconds between forced writes (fsync) of the power log during a session
+
+# Per-session sampling statistics, the logger's own overhead (see logger_overhead.py) and
+# its estimated energy: the session's energy times the logger's share of the busy CPU time
+STATS_FIELDS = (["session", "trial", "samples", "missed_deadlines", "target_rate_hz", "achieved_rate_hz",
+                 "jitter_mean_us", "jitter_std_us", "jitter_max_us", "energy_j"] + OVERHEAD_FIELDS + ["overhead_j"])
+
+
+class PowerSampler:
+    """
+    Samples hwmon power/energy channels on a fixed schedule with minimal per-sample overhead.
+
+    All channels are read in the same tick and share one timestamp, giving one wide
+    row per tick: the primary channel in the legacy 'power' column, the session and
+    trial number, and one column per channel. The sysfs files stay open for the whole capture and are
+    re-read with pread(), samples go into preallocated arrays that are written to
+    the CSV in batches, and each tick is scheduled against an absolute deadline
+    (start + k * interval) so sleep overshoot never accumulates into drift.
+    With `columnar` set, the batches are appended to the '.pcol' store paired with
+    the output file instead (see power_store).
+
+    With a `tracker` (see process_attribution.py), every tick also logs the browser's
+    share of the busy CPU time ('cpu_browser') and the primary channel's power
+    apportioned to the browser by that share ('power_browser'). With a `publisher`
+    (see live_dashboard.py), every primary reading is also sent to the live dashboard.
+
+    With `sync_interval`, buffered samples are written and fsync'ed at least that often,
+    so a crash loses at most that many seconds; `rows` counts the rows written, which
+    segment_log.RunProgress records after each session. With `append_stats`, an
+    existing stats file is continued instead of replaced (resumed runs).
+
+    `baseline` holds the mean power and busy CPU rate of the latest Background/Idle
+    session; the logger's own energy ('overhead_j') of the following sessions is its
+    CPU time priced at their marginal energy per busy CPU second above that baseline.
+    """
+
+    def __init__(self, channels, primary, output_file=OUTPUT_FILE, clock=None,
+                 interval=INTERVAL, batch_size=BATCH_SIZE, stats_file=STATS_FILE, columnar=False, tracker=None,
+                 publisher=None, sync_interval=None, append_stats=False):
+        self.clock = clock or MonotonicClock()
+        self.interval_ns = int(interval * 1_000_000_000)
+        self.sync_ns = int(sync_interval * 1_000_000_000) if sync_interval else None
+        self.batch_size = batch_size
+        self.stats_file = stats_file
+        self.channels = list(channels)
+        self.primary = self.channels.index(primary)
+        self.fds = [os.open(channel.path, os.O_RDONLY) for channel in self.channels]
+        self.tracker = tracker
+        self.publisher = publisher
+        self.meter = OverheadMeter(self.clock)
+        self.stats_fields = STATS_FIELDS + (["energy_browser_j"] if tracker else [])
+
+        # Preallocated sample buffers: epoch ns timestamps and raw readings, one slot per channel and tick
+        self.timestamps = array('q', bytes(8 * batch_size))
+        self.readings = array('q', bytes(8 * batch_size * len(self.fds)))
+        self.shares = array('d', bytes(8 * batch_size)) # Browser CPU share per tick, with a tracker
+        self.count = 0
+        self.rows = 0 # Rows written to the output so far
+        self.session = None
+        self.trial = 0
+        self.energy_j = 0.0 # Primary channel energy of the current session, rectangle rule
+        self.energy_browser_j = 0.0
+        self.last_timestamp = None
+        self.baseline = None # {'power_w', 'busy_rate'} of the latest baseline session
+
+        # Initialize the output with the clock metadata and headers
+        columns = ["timestamp", "power", "session", "trial"] + [channel.label for channel in self.channels]
+        if tracker:
+            columns += ["cpu_browser", "power_browser"]
+        if columnar:
+            self.file = self.writer = StoreWriter(columnar_path(output_file), columns, header=self.clock.header())
+        else:
+            self.file = open(output_file, 'w', newline='')
+            write_header(self.file, self.clock)
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(columns)
+            self.file.flush()
+
+        if stats_file and not (append_stats and os.path.exists(stats_file)):
+            with open(stats_file, 'w', newline='') as f:
+                csv.writer(f).writerow(self.stats_fields)
+
+    def read_channels(self, offset):
+        """Stores the raw reading of every channel in the buffer, starting at `offset`."""
+        readings = self.readings
+        for i, fd in enumerate(self.fds):
+            readings[offset + i] = int(os.pread(fd, 32, 0))
+
+    def flush(self, session):
+        """Writes the buffered samples to the output file."""
+        if self.count:
+            n = len(self.fds)
+            scales = [channel.scale for channel in self.channels] # microWatts/microJoules to Watts/Joules
+            primary = self.primary
+            trial = self.trial
+            tracked = self.tracker is not None
+            energy = energy_browser = 0.0
+            last_timestamp = self.last_timestamp
+            rows = []
+            for i in range(self.count):
+                values = [self.readings[i * n + j] * scales[j] for j in range(n)]
+                timestamp = self.timestamps[i]
+                row = [timestamp, values[primary], session, trial] + values
+                if tracked:
+                    share = self.shares[i]
+                    row += [round(share, 4), values[primary] * share]
+                if last_timestamp is not None:
+                    energy += values[primary] * (timestamp - last_timestamp) / 1e9
+                    if tracked:
+                        energy_browser += values[primary] * share * (timestamp - last_timestamp) / 1e9
+                last_timestamp = timestamp
+                rows.append(row)
+            self.energy_j += energy
+            self.energy_browser_j += energy_browser
+            self.last_timestamp = last_timestamp
+            io_start = time.monotonic_ns()
+            self.writer.writerows(rows)
+            self.file.flush()
+            self.meter.io(time.monotonic_ns() - io_start)
+            self.rows += len(rows)
+            self.count = 0
+
+    def sync(self):
+        """Writes the buffered samples and forces the output to disk."""
+        self.flush(self.session)
+        io_start = time.monotonic_ns()
+        if isinstance(self.file, StoreWriter):
+            self.file.sync()
+        else:
+            os.fsync(self.file.fileno())
+        self.meter.io(time.monotonic_ns() - io_start)
+
+    def save_power(self, session, duration=DURATION, trial=0):
+        """
+        Captures power readings for `duration` seconds under the given session name
+        and trial number (0 outside repeated trials).
+
+        Returns:
+            dict: Sampling statistics and primary channel energy of the session (see STATS_FIELDS).
+        """
+        self.session = session
+        self.trial = trial
+        self.energy_j = self.energy_browser_j = 0.0
+        self.last_timestamp = None
+        tracker = self.tracker
+        publisher = self.publisher
+        primary, primary_scale = self.primary, self.channels[self.primary].scale
+        meter = self.meter
+        meter.start()
+        interval_ns = self.interval_ns
+        sync_ns = self.sync_ns
+        start_ns = time.monotonic_ns()
+        next_sync = start_ns + sync_ns if sync_ns else None
+        end_ns = start_ns + int(duration * 1_000_000_000)
+        deadline = start_ns
+        samples = missed = 0
+        lateness_sum = lateness_sq_sum = lateness_max = 0
+        first_ns = None
+
+        while deadline < end_ns:
+            remaining = deadline - time.monotonic_ns()
+            if remaining > 0:
+                time.sleep(remaining / 1_000_000_000)
+
+            wake = time.monotonic_ns()
+            self.read_channels(self.count * len(self.fds))
+            now = time.monotonic_ns()
+            if tracker is not None:
+                self.shares[self.count] = tracker.sample(now)
+            if first_ns is None:
+                first_ns = now
+            self.timestamps[self.count] = self.clock.now_ns()
+            if publisher is not None:
+                publisher.publish(self.timestamps[self.count],
+                                  self.readings[self.count * len(self.fds) + primary] * primary_scale, session)
+            self.count += 1
+            if self.count == self.batch_size:
+                self.flush(session)
+            if next_sync is not None and now >= next_sync:
+                self.sync()
+                next_sync = now + sync_ns
+
+            lateness = now - deadline
+            samples += 1
+            lateness_sum += lateness
+            lateness_sq_sum += lateness * lateness
+            lateness_max = max(lateness_max, lateness)
+
+            # Next deadline on the absolute grid; deadlines already passed are skipped, not bunched
+            deadline += interval_ns
+            if now >= deadline:
+                skipped = (now - deadline) // interval_ns + 1
+                missed += skipped
+                deadline += skipped * interval_ns
+            meter.loop(time.monotonic_ns() - wake)
+
+        self.flush(session)
+        overhead = meter.summary()
+
+        # Rate over the span between the first and the last sample of the session
+        elapsed_s = (now - first_ns) / 1e9 if samples > 1 else 0
+        mean = lateness_sum / samples if samples else 0
+        variance = max(lateness_sq_sum / samples - mean * mean, 0) if samples else 0
+        stats = {
+            "session": session,
+            "trial": trial,
+            "samples": samples,
+            "missed_deadlines": missed,
+            "target_rate_hz": round(1e9 / interval_ns, 3),
+            "achieved_rate_hz": round((samples - 1) / elapsed_s, 3) if elapsed_s else 0,
+            "jitter_mean_us": round(mean / 1000, 1),
+            "jitter_std_us": round(variance ** 0.5 / 1000, 1),
+            "jitter_max_us": round(lateness_max / 1000, 1),
+            "energy_j": round(self.energy_j, 6),
+            **overhead,
+            "overhead_j": self.overhead_energy(session, overhead),
+        }
+        if tracker is not None:
+            stats["energy_browser_j"] = round(self.energy_browser_j, 6)
+        if self.stats_file:
+            with open(self.stats_file, 'a', newline='') as f:
+                csv.DictWriter(f, fieldnames=self.stats_fields).writerow(stats)
+        print(f"Hwmon: {samples} samples at {stats['achieved_rate_hz']} Hz "
+              f"(target {stats['target_rate_hz']} Hz), jitter mean {stats['jitter_mean_us']} us, "
+              f"max {stats['jitter_max_us']} us, {missed} missed deadlines")
+        print(f"Logger: {overhead['cpu_s']} s CPU ({overhead['cpu_share'] or '?'} of busy time), "
+              f"loop mean {overhead['loop_mean_us']} us, max {overhead['loop_max_us']} us, "
+              f"{overhead['io_ms']} ms writing")
+        if tracker is not None:
+            print(f"Browser: {stats['energy_browser_j']:.2f} of {stats['energy_j']:.2f} J "
+                  f"({tracker.processes()} processes)")
+        return stats
+
+    def overhead_energy(self, session, overhead):
+        """
+        Returns the energy the logger consumed in the session just captured, or "" for
+        baseline sessions, before the first baseline and without /proc/stat. A baseline
+        session instead becomes the reference of the sessions that follow it.
+        """
+        busy_s, duration_s = overhead["busy_cpu_s"], overhead["duration_s"]
+        if not duration_s:
+            return ""
+        if session in BASELINE_SESSIONS:
+            self.baseline = {"power_w": self.energy_j / duration_s,
+                             "busy_rate": busy_s / duration_s if busy_s != "" else None}
+            return ""
+        if self.baseline is None or self.baseline["busy_rate"] is None or busy_s == "":
+            return ""
+        marginal = marginal_energy(self.energy_j, busy_s, duration_s,
+                                   self.baseline["power_w"], self.baseline["busy_rate"])
+        return round(overhead["cpu_s"] * marginal, 6)
+
+    def excess_energy(self, stats):
+        """
+        Returns the energy of the session in `stats` above the idle level: the energy
+        attributed to the browser with a tracker, otherwise the primary channel's energy
+        minus the latest baseline's mean power over the session (all of it before the
+        first baseline). Early stopping compares visits by this energy, which the idle
+        power and the other processes do not inflate.
+        """
+        if self.tracker is not None:
+            return stats["energy_browser_j"]
+        if self.baseline is None:
+            return stats["energy_j"]
+        return round(stats["energy_j"] - self.baseline["power_w"] * stats["duration_s"], 6)
+
+    def close(self):
+        """Flushes pending samples and releases the sensor and output files."""
+        self.flush(self.session)
+        for fd in self.fds:
+            os.close(fd)
+        if self.tracker is not None:
+            self.tracker.close()
+        if self.publisher is not None:
+            self.publisher.close()
+        self.meter.close()
+        self.file.close()
+
+
+class CounterSampler:
+    """
+    Reads cumulative energy counters (hwmon energy*_input, RAPL energy_uj) instead of sampling power.
+
+    Counters are read at the start and end of each session plus every
+    `checkpoint_interval` seconds in between, so a counter cannot wrap more than
+    once between two readings. Each reading is one long-format row
+    (timestamp, session, trial, event, channel, value_uj, max_range_uj); the energy is
+    computed exactly from the increments by obtain_energy.calculate_counter_energy.
+    It offers the same save_power()/close() interface as PowerSampler.
+    """
+
+    def __init__(self, counters, output_file=COUNTER_FILE, clock=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, columnar=False):
+        self.clock = clock or MonotonicClock()
+        self.counters = list(counters)
+        self.checkpoint_ns = int(checkpoint_interval * 1_000_000_000)
+        self.fds = [os.open(counter.path, os.O_RDONLY) for counter in self.counters]
+
+        self.trial = 0
+
+        columns = ["timestamp", "session", "trial", "event", "channel", "value_uj", "max_range_uj"]
+        if columnar:
+            self.file = self.writer = StoreWriter(columnar_path(output_file), columns, header=self.clock.header())
+        else:
+            self.file = open(output_file, 'w', newline='')
+            write_header(self.file, self.clock)
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(columns)
+            self.file.flush()
+
+    def checkpoint(self, session, event):
+        """Reads every counter back to back and writes one row per counter."""
+        values = [int(os.pread(fd, 32, 0)) for fd in self.fds]
+        timestamp = self.clock.now_ns()
+        self.writer.writerows(
+            [timestamp, session, self.trial, event, counter.label, value,
+             "" if counter.max_range is None else counter.max_range]
+            for counter, value in zip(self.counters, values))
+        self.file.flush()
+
+    def save_power(self, session, duration=DURATION, trial=0):
+        """
+        Reads the counters at the start, at every checkpoint and at the end of a session.
+        Returns None: the energy is only known after the analysis, so early stopping is not available.
+        """
+        self.trial = trial
+        start_ns = time.monotonic_ns()
+        end_ns = start_ns + int(duration * 1_000_000_000)
+        self.checkpoint(session, "start")
+        deadline = start_ns + self.checkpoint_ns
+        while deadline < end_ns:
+            time.sleep(max(deadline - time.monotonic_ns(), 0) / 1_000_000_000)
+            self.checkpoint(session, "checkpoint")
+            deadline += self.checkpoint_ns
+        time.sleep(max(end_ns - time.monotonic_ns(), 0) / 1_000_000_000)
+        self.checkpoint(session, "end")
+        print(f"Energy counters: session '{session}' read at start/end and "
+              f"{max((end_ns - start_ns - 1) // self.checkpoint_ns, 0)} checkpoints")
+
+    def close(self):
+        """Releases the counter and output files."""
+        for fd in self.fds:
+            os.close(fd)
+        self.file.close()
+
+
+def run_sessions(sampler, urls, duration=DURATION, pause=PAUSE, idle=True,
+                 trials=TRIALS, order=ORDER, seed=None, ci_target=None, min_trials=MIN_TRIALS, driver=None,
+                 progress=None):
+    """
+    Runs the Background and BlankTab sessions followed by the visits of the URLs,
+    loaded by `driver` (see browser_drivers.py; Firefox in the desktop session by default).
+    With `idle`, the pause after each session is captured as an IDLE_SESSION
+    window, giving power_correction.py a baseline measurement between sessions.
+
+    Each URL is visited `trials` times in the given `order` (see trial_scheduler.py);
+    the rows of a visit carry its trial number. With `ci_target`, a site's remaining
+    visits are skipped once the 95 % confidence interval of its energy per visit
+    above the idle level (see PowerSampler.excess_energy) is within `ci_target`
+    times the mean (after at least `min_trials` visits).
+
+    With `progress` (see segment_log.py), every completed session is committed to the
+    run's progress file, and the Background session and visits completed by an
+    earlier, interrupted run of the same schedule are skipped.
+
+    Returns:
+        EarlyStopping: The per-visit energies of every site.
+    """
+    def rest():
+        if idle and pause > 0:
+            sampler.save_power(IDLE_SESSION, pause)
+            if progress is not None:
+                progress.commit(sampler)
+        else:
+            time.sleep(pause)
+
+    schedule = schedule_trials(list(urls), trials, order, seed)
+    tracker = EarlyStopping(ci_target, min_trials)
+    if trials > 1:
+        print(f"Trial schedule: {len(urls)} sites x {trials} trials, {order} order (seed {seed})")
+    if progress is not None:
+        # Visits of the interrupted run count towards early stopping as if they had just happened
+        for name, energy in progress.energies():
+            if energy is not None:
+                tracker.add(name, energy)
+        if progress.baseline is not None:
+            sampler.baseline = progress.baseline
+
+    # Background session
+    if progress is not None and progress.done("Background"):
+        print("\nBackground session already measured.")
+    else:
+        print("\nBackground session starting...")
+        stats = sampler.save_power("Background", duration)
+        if progress is not None:
+            progress.commit(sampler, "Background", 0)
+        rest() # Pause after session
+
+    # BlankTab session (start the browser on a blank page)
+    print("\nBlankTab session starting...")
+    driver = driver or FirefoxDriver()
+    driver.start()
+    time.sleep(duration) # Let the browser load and stabilize
+
+    # Visit the URLs in schedule order and capture power
+    skipped = resumed = 0
+    for position, (name, trial) in enumerate(schedule, 1):
+        if progress is not None and progress.done(name, trial):
+            resumed += 1
+            continue
+        if tracker.done(name):
+            skipped += 1
+            continue
+        url = urls[name]
+        print(f'\nSession: {name} ({url}), trial {trial}/{trials} [{position}/{len(schedule)}]\n')
+        driver.open(url)
+        stats = sampler.save_power(name, duration, trial) # Capture power for this session
+        driver.close()
+        energy = sampler.excess_energy(stats) if stats is not None else None
+        if progress is not None:
+            progress.commit(sampler, name, trial, energy)
+        if energy is not None and tracker.add(name, energy):
+            visits, mean, relative = tracker.summary(name)
+            print(f"Early stop: '{name}' reached {relative:.1%} CI half-width after {visits} trials "
+                  f"(mean {mean:.1f} J); skipping its remaining trials.")
+        rest() # Pause after session
+
+    # End the browser after all sessions are complete
+    driver.stop()
+    if progress is not None:
+        progress.finish()
+    if resumed:
+        print(f"\nResumed after {resumed} visits completed by the interrupted run.")
+    if skipped:
+        print(f"\nEarly stopping skipped {skipped} of {len(schedule)} visits "
+              f"({skipped * (duration + pause)} s of measurement time).")
+    return tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log hwmon power while visiting the sites in webs.json.")
+    parser.add_argument("webs_json", help="JSON file mapping session names to URLs")
+    parser.add_argument("--interval", type=float, default=INTERVAL,
+                        help="Seconds between power readings, e.g. 0.01 for 100 Hz (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Samples buffered before each write to disk (default: %(default)s)")
+    parser.add_argument("--primary-only", action="store_true",
+                        help=f"Log only power1_input of the '{POWER_SENSOR_NAME}' sensor instead of every channel")
+    parser.add_argument("--energy-counters", action="store_true",
+                        help=f"Read cumulative energy counters at session boundaries into {COUNTER_FILE} "
+                             "instead of sampling power")
+    parser.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL,
+                        help="Seconds between energy counter checkpoints (default: %(default)s)")
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv",
+                        help="Write a CSV file or a '.pcol' columnar store (default: %(default)s)")
+    parser.add_argument("--no-idle", action="store_true",
+                        help=f"Sleep through the pauses instead of logging them as '{IDLE_SESSION}' baseline windows")
+    parser.add_argument("--browser", choices=list(DRIVERS), default=DRIVER,
+                        help="Browser driver loading the sites (default: %(default)s)")
+    parser.add_argument("--profile", help="Browser profile directory, e.g. one per parallel campaign slot")
+    parser.add_argument("--attribute", nargs="*", metavar="NAME",
+                        help="Apportion the primary sensor's power to the browser's process tree by CPU share "
+                             "(cpu_browser and power_browser columns); NAMEs override the browser's process names")
+    parser.add_argument("--live", metavar="HOST:PORT",
+                        help="Publish every reading to a running live_dashboard.py (e.g. 127.0.0.1:8765)")
+    parser.add_argument("--output",
+                        help=f"Log file (default: {OUTPUT_FILE}, or {COUNTER_FILE} with --energy-counters); "
+                             "the sampling statistics go next to it")
+    parser.add_argument("--trials", type=int, default=TRIALS,
+                        help="Visits per site (default: %(default)s)")
+    parser.add_argument("--order", choices=ORDERS, default=ORDER,
+                        help="Order of the visits across trials (default: %(default)s)")
+    parser.add_argument("--seed", type=int,
+                        help="Seed of the randomized orders (default: random, printed at start)")
+    parser.add_argument("--ci-target", type=float,
+                        help=f"Stop a site's trials once its {CONFIDENCE:.0%} CI half-width is within this "
+                             "fraction of its mean energy, e.g. 0.05 (power sampling only)")
+    parser.add_argument("--min-trials", type=int, default=MIN_TRIALS,
+                        help="Visits of a site before early stopping may end it (default: %(default)s)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the interrupted run of the log in a new segment, with its sites, trials, "
+                             "order and seed, skipping the visits it completed (power sampling only)")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+    if args.resume and args.energy_counters:
+        parser.error("--resume needs power sampling, not --energy-counters")
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+
+    # Load URLs from the provided JSON file
+    try:
+        with open(args.webs_json) as file:
+            urls = json.load(file)
+    except FileNotFoundError:
+        print(f"Error: The file '{args.webs_json}' was not found.")
+        sys.exit(1)
+    except json.JSONDecodeError:
+        print(f"Error: Could not decode JSON from '{args.webs_json}'. Please check the file format.")
+        sys.exit(1)
+
+    progress = None
+    if args.resume:
+        output_file = args.output or OUTPUT_FILE
+        state = load_progress(output_file)
+        if state is None:
+            print(f"Error: '{output_file}' has no progress file to resume from. Start a new run without --resume.")
+            sys.exit(1)
+        if state["finished"]:
+            print(f"The run of '{output_file}' is already complete.")
+            sys.exit(0)
+        # The schedule must be the interrupted run's, or completed visits would not match it
+        urls, args.trials, args.order, seed = state["urls"], state["trials"], state["order"], state["seed"]
+        print(f"Resuming '{output_file}': {len(state['completed'])} sessions completed in "
+              f"{len(state['segments'])} segments")
+
+    driver = make_driver(args.browser, args.profile)
+    tracker = None
+    if args.attribute is not None:
+        names = args.attribute or driver.process_names
+        if args.energy_counters or not names:
+            print("Warning: Process attribution needs power sampling and process names; it is disabled.")
+        else:
+            tracker = ProcessTracker(names)
+
+    if args.energy_counters:
+        counters = discover_counters()
+        if not counters:
+            print("Error: No readable energy counters found (hwmon energy*_input or RAPL energy_uj).")
+            sys.exit(1)
+        print(f"Starting energy counters: {', '.join(counter.label for counter in counters)}")
+        output_file = args.output or COUNTER_FILE
+        sampler = CounterSampler(counters, output_file, checkpoint_interval=args.checkpoint_interval,
+                                 columnar=args.format == "columnar")
+    else:
+        # Find every power/energy channel and the one reported in the 'power' column
+        channels = discover_channels()
+        primary = find_primary_channel(channels, POWER_SENSOR_NAME)
+
+        # Exit if the power sensor file is not found
+        if primary is None:
+            print(f'Error: The power consumption file does not exist on the system.')
+            sys.exit(1) # Exit with an error code
+        if args.primary_only:
+            channels = [primary]
+
+        print("Starting power meter: hwmon")
+        print(f"Logging {len(channels)} hwmon channels: {', '.join(channel.label for channel in channels)}")
+        output_file = args.output or OUTPUT_FILE
+        stats_file = f"{os.path.splitext(output_file)[0]}_stats.csv" if args.output else STATS_FILE
+        if args.resume:
+            progress = RunProgress.resume(output_file)
+        else:
+            progress = RunProgress.start(output_file, urls, args.trials, args.order, seed)
+        sampler = PowerSampler(channels, primary, progress.segment, interval=args.interval,
+                               batch_size=args.batch_size, stats_file=stats_file,
+                               columnar=args.format == "columnar", tracker=tracker,
+                               publisher=LivePublisher(parse_address(args.live), "hwmon") if args.live else None,
+                               sync_interval=SYNC_INTERVAL, append_stats=args.resume)
+
+    if args.format == "columnar":
+        output_file = columnar_path(output_file)
+
+    try:
+        if args.ci_target is not None and args.energy_counters:
+            print("Warning: --ci-target needs power sampling; all trials will run.")
+        run_sessions(sampler, urls, idle=not args.no_idle, trials=args.trials, order=args.order, seed=seed,
+                     ci_target=args.ci_target, min_trials=args.min_trials,
+                     driver=driver, progress=progress)
+    except KeyboardInterrupt:
+        print('\nStopping capture...') # Handle manual interruption
+    except OSError as e:
+        print(f"Error: Could not read a power sensor file during capture: {e}")
+        sys.exit(1)
+    finally:
+        sampler.close()
+    print(f"\nCapture completed. Data saved to {output_file}")
+    if progress is not None and len(progress.state["segments"]) > 1:
+        print(f"Segment {progress.segment} continues it; resume an interrupted run with --resume.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,569 @@
-# Copyright (C) 2025 Sandra Nicole Solórzano Carcelén sandranicole2001@hotmail.com
-#
-# This program is free software: you can redistribute it and/or modify
-# it under the terms of the GNU General Public License as published by
-# the Free Software Foundation, either version 3 of the License, or
-# (at your option) any later version.
-#
-# This program is distributed in the hope that it will be useful,
-# but WITHOUT ANY WARRANTY; without even the implied warranty of
-# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
-# GNU General Public License for more details.
-#
-# You should have received a copy of the GNU General Public License
-# along with this program. If not, see <https://www.gnu.org/licenses/>.
-
-# power_logger_shelly.py
-
-import requests
-import time
-import csv
-
-# Replace with the actual IP address of your Shelly device
-IP_SHELLY = "***.***.*.**"
-
-OUTPUT_FILE = "power_log_shelly.csv" # Define the output CSV file name
-INTERVAL = 1 # Define the interval between power readings in seconds
-
-print("Starting power meter: Shelly")
-
-def get_power():
-    """
-    Fetches power consumption data from the Shelly device.
-
-    Returns:
-        dict: A dictionary containing 'timestamp' and 'power' if successful,
-              otherwise None.
-    """
-    # Construct the URL for the Shelly RPC API to get switch status (assuming ID 0)
-    url = f"http://{IP_SHELLY}/rpc/Switch.GetStatus?id=0"
-    try:
-        # Send a GET request to the Shelly device with a 5-second timeout
-        response = requests.get(url, timeout=5)
-        # Check if the request was successful (status code 200)
-        if response.status_code == 200:
-            data = response.json()
-            # Return a dictionary with the current timestamp and the active power ('apower')
-            return {
-                "timestamp": time.strftime("%Y%m%dT%H:%M:%S"),
-                "power": data.get("apower", 0.0) # Use .get() with a default to avoid KeyError
-            }
-        else:
-            # Print an error if the status code is not 200
-            print(f"Error while getting status: {response.status_code}")
-            return None
-    except requests.RequestException as e:
-        # Catch any request-related errors (e.g., connection issues, timeouts)
-        print(f"Connection error while getting status: {e}")
-        return None
-
-# Initialize the CSV file with headers
-# 'mode="w"' ensures the file is created or overwritten, 'newline=""' handles line endings correctly
-with open(OUTPUT_FILE, mode='w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(["timestamp", "power"])
-
-print("Starting power data capture...")
-try:
-    # Loop indefinitely to continuously capture power data
-    while True:
-        data = get_power() # Get power data from Shelly
-        if data:
-            # If data is successfully retrieved, append it to the CSV file
-            with open(OUTPUT_FILE, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    data["timestamp"],
-                    data["power"]
-                ])
-            print(f'Shelly: {data["power"]} W')
-
-        time.sleep(INTERVAL) # Wait for the defined interval before the next reading
-except KeyboardInterrupt:
-    # Handle graceful exit when the user presses Ctrl+C
-    print(f"\nStopping capture.")
-
-print(f"Capture completed.")
\ No newline at end of file
+# Copyright (C) 2025 Sandra Nicole Solórzano Carcelén sandranicole2001@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# power_logger_shelly.py
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import signal
+import sys
+import time
+
+from live_dashboard import LivePublisher, parse_address
+from logger_overhead import OVERHEAD_FIELDS, OverheadMeter
+from power_clock import MonotonicClock, write_header
+from power_store import StoreWriter, columnar_path
+from shelly_devices import DEVICES_FILE, SWITCH_ID, load_devices
+from ws_protocol import (OP_BINARY, OP_CLOSE, OP_CONTINUATION, OP_PING, OP_PONG, OP_TEXT,
+                         accept_key, encode_frame, new_key, read_frame)
+
+# Replace with the actual IP address of your Shelly device (append ':port' if it is not 80)
+IP_SHELLY = "***.***.*.**"
+DEVICE_LABEL = "shelly" # Device column value when a single device is polled
+
+OUTPUT_FILE = "power_log_shelly.csv" # Define the output CSV file name
+INTERVAL = 1 # Define the interval between power readings in seconds
+TIMEOUT = 0.9 # Seconds a request may take before the reading is recorded as a gap
+IDLE_TIMEOUT = 30 # Push mode: seconds without any message before the device is asked for its status
+RECONNECT_DELAY = 5 # Push mode: seconds between attempts to reopen a dropped WebSocket
+
+HEALTH_FILE = "power_log_shelly_health.csv" # Per-device request counters written at the end
+OVERHEAD_FILE = "power_log_shelly_overhead.csv" # The logger's own CPU and I/O time per window
+OVERHEAD_INTERVAL = 10 # Seconds per overhead window
+
+SHELLY_FIELDS = ["timestamp", "device", "power", "rtt_ms", "status"]
+STATUSES = ["ok", "push", "timeout", "error", "skipped", "disconnected"]
+HEALTH_FIELDS = ["device"] + STATUSES + ["rtt_mean_ms", "rtt_max_ms"]
+OVERHEAD_LOG_FIELDS = OVERHEAD_FIELDS + ["skipped"]
+
+
+class ShellyConnection:
+    """
+    Minimal HTTP/1.1 client for the Shelly RPC API over one keep-alive connection.
+
+    The TCP connection is opened on the first request and reused afterwards, so a
+    reading costs one request/response round trip instead of a new connection.
+    After any error the connection is dropped and reopened by the next request.
+    """
+
+    def __init__(self, address):
+        host, _, port = address.partition(":")
+        self.host = host
+        self.port = int(port) if port else 80
+        self.reader = None
+        self.writer = None
+
+    async def get_json(self, path):
+        """
+        Sends a GET request for `path` and returns the decoded JSON body.
+
+        Raises:
+            ConnectionError: If the device closes the connection or answers with a non-200 status.
+            EOFError: If the device closes the connection in the middle of the body (IncompleteReadError).
+            OSError, ValueError: On network errors or malformed responses.
+        """
+        try:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                              f"Connection: keep-alive\r\n\r\n".encode("ascii"))
+            await self.writer.drain()
+
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError("Connection closed by the device")
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if "content-length" in headers:
+                body = await self.reader.readexactly(int(headers["content-length"]))
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                body = await self._read_chunked()
+            else:
+                body = await self.reader.read()
+                headers["connection"] = "close"
+        except BaseException:
+            # The stream state is unknown after a failure or cancellation: start over next time
+            self.drop()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            self.drop()
+        if status != 200:
+            raise ConnectionError(f"HTTP status {status}")
+        return json.loads(body)
+
+    async def _read_chunked(self):
+        body = b""
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await self.reader.readline() # Trailing CRLF
+                return body
+            body += await self.reader.readexactly(size)
+            await self.reader.readline()
+
+    def drop(self):
+        """Closes the connection without waiting; the next request reconnects."""
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+        return writer
+
+    async def close(self):
+        """Closes the connection, if open, and waits until it is shut down."""
+        writer = self.drop()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class ShellyPoller:
+    """
+    Polls one Shelly switch on a fixed deadline schedule and appends every reading to a CSV log.
+
+    Requests fire at start + k * interval regardless of how long earlier requests
+    took, and each one is cut off after `timeout` seconds, so a slow or offline
+    device delays at most one reading. Readings are timestamped when the response
+    arrives and logged with their round-trip time. Failed requests and deadlines
+    missed entirely are logged as rows without power and a non-'ok' status
+    ('timeout', 'error' or 'skipped'), so gaps stay visible in the data.
+    Several pollers can share one writer and event loop, one per device.
+    With a `meter` (see logger_overhead.py), the time spent handling and writing
+    every row is recorded; `quiet` suppresses the per-reading console output.
+    With a `publisher` (see live_dashboard.py), every reading is also sent to the live dashboard.
+    """
+
+    def __init__(self, connection, writer, clock, label=DEVICE_LABEL, switch_id=SWITCH_ID,
+                 interval=INTERVAL, timeout=TIMEOUT, meter=None, quiet=False, publisher=None):
+        self.connection = connection
+        self.writer = writer
+        self.clock = clock
+        self.label = label
+        self.path = f"/rpc/Switch.GetStatus?id={switch_id}"
+        self.interval = interval
+        self.timeout = timeout
+        self.meter = meter
+        self.quiet = quiet
+        self.publisher = publisher
+        # Health counters: rows per status and round-trip times of answered requests
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.rtt_count = 0
+        self.rtt_sum_ms = 0.0
+        self.rtt_max_ms = 0.0
+
+    async def read_once(self):
+        """
+        Performs one request and returns the CSV row describing its outcome.
+        """
+        sent_ns = time.monotonic_ns()
+        try:
+            data = await asyncio.wait_for(self.connection.get_json(self.path), self.timeout)
+        except asyncio.TimeoutError:
+            status, power = "timeout", ""
+        except (OSError, EOFError, ValueError, IndexError) as e:
+            # Catch any request-related errors (e.g., connection issues, truncated or malformed responses);
+            # get_json already dropped the connection, so the next request reconnects
+            print(f"Connection error while getting status of '{self.label}': {e}")
+            status, power = "error", ""
+        else:
+            status, power = "ok", data.get("apower", 0.0) # Use .get() with a default to avoid KeyError
+        timestamp = self.clock.now_ns()
+        rtt_ms = round((time.monotonic_ns() - sent_ns) / 1e6, 3)
+        return [timestamp, self.label, power, rtt_ms, status]
+
+    def record(self, row):
+        """Writes a row and updates the health counters."""
+        start = time.monotonic_ns()
+        self.writer.writerow(row)
+        written = time.monotonic_ns()
+        status = row[4]
+        self.counts[status] += 1
+        if status in ("ok", "push") and row[3] != "":
+            self.rtt_count += 1
+            self.rtt_sum_ms += row[3]
+            self.rtt_max_ms = max(self.rtt_max_ms, row[3])
+        if status == "ok" and not self.quiet:
+            print(f'Shelly {self.label}: {row[2]} W')
+        if self.publisher is not None and status in ("ok", "push"):
+            self.publisher.publish(row[0], row[2])
+        if self.meter is not None:
+            self.meter.io(written - start)
+            self.meter.loop(time.monotonic_ns() - start)
+
+    def health(self):
+        """Returns the health counters of this device as a HEALTH_FIELDS dict."""
+        answered = self.rtt_count
+        return {"device": self.label, **self.counts,
+                "rtt_mean_ms": round(self.rtt_sum_ms / answered, 3) if answered else "",
+                "rtt_max_ms": self.rtt_max_ms if answered else ""}
+
+    async def run(self, samples=None):
+        """
+        Polls until cancelled, or until `samples` deadlines have been handled.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        k = 0
+        while samples is None or k < samples:
+            delay = start + k * self.interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            row = await self.read_once()
+            self.record(row)
+            k += 1
+
+            # Deadlines that already passed are logged as skipped instead of being fired late
+            now = loop.time()
+            while start + k * self.interval < now and (samples is None or k < samples):
+                missed_ns = int((now - (start + k * self.interval)) * 1e9)
+                self.record([self.clock.now_ns() - missed_ns, self.label, "", "", "skipped"])
+                k += 1
+
+
+class ShellyPushListener:
+    """
+    Receives the power of one Shelly switch from status notifications on the
+    device's WebSocket RPC channel (ws://<ip>/rpc) instead of polling it.
+
+    Gen2 devices push a NotifyStatus event to every WebSocket client that has sent
+    a request with its own 'src', so after the handshake a Switch.GetStatus request
+    subscribes the channel and returns the current power. Every 'apower' update is
+    then logged with its receipt time and status 'push'. If nothing arrives for
+    `idle_timeout` seconds, another Switch.GetStatus request checks that the device
+    is still there. When the socket drops, a 'disconnected' row is logged and the
+    device is polled over HTTP by its ShellyPoller until the socket can be reopened.
+    """
+
+    def __init__(self, poller, address, switch_id=SWITCH_ID, idle_timeout=IDLE_TIMEOUT,
+                 reconnect_delay=RECONNECT_DELAY):
+        self.poller = poller
+        host, _, port = address.partition(":")
+        self.host = host
+        self.port = int(port) if port else 80
+        self.switch_id = switch_id
+        self.component = f"switch:{switch_id}"
+        self.src = f"meenw-{poller.label}-{os.getpid()}"
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.request_id = 0
+        self.sent_ns = {}
+        self.reader = None
+        self.writer = None
+        self.messages = None
+        self.receiver = None
+
+    async def connect(self):
+        """Opens the WebSocket and subscribes to notifications with a first status request."""
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.poller.timeout)
+        self.reader, self.writer = reader, writer
+        key = new_key()
+        writer.write(f"GET /rpc HTTP/1.1\r\nHost: {self.host}\r\nUpgrade: websocket\r\n"
+                     f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                     f"Sec-WebSocket-Version: 13\r\n\r\n".encode("ascii"))
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), self.poller.timeout)
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.poller.timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if status_line.split()[1:2] != [b"101"] or headers.get("sec-websocket-accept") != accept_key(key):
+            raise ConnectionError(f"WebSocket handshake rejected: {status_line.decode('latin-1').strip()}")
+
+        # A background task parses frames into a queue, so waiting for a message can time out safely
+        self.messages = asyncio.Queue()
+        self.receiver = asyncio.create_task(self._receive())
+        await self.request_status()
+
+    async def request_status(self):
+        """Sends a Switch.GetStatus request over the socket."""
+        self.request_id += 1
+        message = {"id": self.request_id, "src": self.src, "method": "Switch.GetStatus",
+                   "params": {"id": self.switch_id}}
+        self.sent_ns[self.request_id] = time.monotonic_ns()
+        self.writer.write(encode_frame(OP_TEXT, json.dumps(message).encode(), mask=True))
+        await self.writer.drain()
+
+    async def _receive(self):
+        fragments = []
+        try:
+            while True:
+                fin, opcode, payload = await read_frame(self.reader)
+                if opcode == OP_PING:
+                    self.writer.write(encode_frame(OP_PONG, payload, mask=True))
+                elif opcode == OP_CLOSE:
+                    raise ConnectionError("WebSocket closed by the device")
+                elif opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                    fragments.append(payload)
+                    if fin:
+                        self.messages.put_nowait(json.loads(b"".join(fragments)))
+                        fragments = []
+        except Exception as e:
+            # Hand the failure to listen(), which falls back to polling
+            self.messages.put_nowait(e)
+
+    async def listen(self):
+        """Logs power updates until the socket fails."""
+        while True:
+            try:
+                message = await asyncio.wait_for(self.messages.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if self.sent_ns:
+                    raise ConnectionError(f"No answer from the device for {self.idle_timeout} s")
+                await self.request_status()
+                continue
+            if isinstance(message, Exception):
+                raise message
+
+            rtt_ms = ""
+            if message.get("id") in self.sent_ns:
+                # Answer to one of our Switch.GetStatus requests
+                rtt_ms = round((time.monotonic_ns() - self.sent_ns.pop(message["id"])) / 1e6, 3)
+                apower = message.get("result", {}).get("apower")
+            elif message.get("method") in ("NotifyStatus", "NotifyFullStatus"):
+                apower = message.get("params", {}).get(self.component, {}).get("apower")
+            else:
+                apower = None
+            if apower is not None:
+                self.poller.record([self.poller.clock.now_ns(), self.poller.label, apower, rtt_ms, "push"])
+
+    def drop(self):
+        """Closes the socket without waiting."""
+        if self.receiver is not None:
+            self.receiver.cancel()
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = self.receiver = None
+        self.sent_ns.clear()
+
+    async def poll_until_reconnected(self):
+        """Polls over HTTP while retrying the WebSocket every `reconnect_delay` seconds."""
+        polling = asyncio.create_task(self.poller.run())
+        try:
+            while True:
+                await asyncio.sleep(self.reconnect_delay)
+                try:
+                    await self.connect()
+                    return
+                except (OSError, EOFError, ValueError, IndexError, asyncio.TimeoutError):
+                    self.drop()
+        finally:
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+
+    async def run(self):
+        """Listens until cancelled, switching between push and polling as the socket comes and goes."""
+        connected = False
+        while True:
+            try:
+                if not connected:
+                    await self.connect()
+                print(f"Shelly {self.poller.label}: receiving push notifications")
+                await self.listen()
+            except (OSError, EOFError, ValueError, IndexError, asyncio.TimeoutError) as e:
+                print(f"Shelly {self.poller.label}: WebSocket unavailable ({e}), falling back to polling")
+            self.drop()
+            self.poller.record([self.poller.clock.now_ns(), self.poller.label, "", "", "disconnected"])
+            await self.poll_until_reconnected()
+            connected = True
+
+
+class OverheadLog:
+    """
+    Writes the logger's own overhead (see logger_overhead.py) to a CSV file, one row
+    per window of `interval` seconds, with the deadlines skipped by all pollers in it.
+    obtain_energy.py matches the windows to the sessions by their timestamps.
+    With `append`, an existing file is continued.
+    """
+
+    def __init__(self, meter, pollers, overhead_file=OVERHEAD_FILE, interval=OVERHEAD_INTERVAL, append=False):
+        self.meter = meter
+        self.pollers = pollers
+        self.interval = interval
+        self.skipped = 0
+        self.file = open(overhead_file, 'a' if append else 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=OVERHEAD_LOG_FIELDS)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self):
+        """Ends the current window and writes its summary."""
+        skipped = sum(poller.counts["skipped"] for poller in self.pollers)
+        self.writer.writerow({**self.meter.summary(), "skipped": skipped - self.skipped})
+        self.file.flush()
+        self.skipped = skipped
+
+    async def run(self):
+        """Writes a window every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
+
+    def close(self):
+        """Writes the last, partial window and closes the file."""
+        self.write()
+        self.file.close()
+        self.meter.close()
+
+
+async def capture(devices, output_file=OUTPUT_FILE, interval=INTERVAL, timeout=TIMEOUT, samples=None,
+                  health_file=HEALTH_FILE, push=False, columnar=False, overhead_file=OVERHEAD_FILE, quiet=False,
+                  live=None, append=False):
+    """
+    Polls every device concurrently and writes a single log keyed by device to
+    `output_file`, until cancelled (Ctrl+C or SIGTERM) or `samples` deadlines have passed.
+
+    Args:
+        devices (list): Device dicts as returned by shelly_devices.load_devices().
+        push (bool): Receive WebSocket status notifications instead of polling, falling
+                     back to polling while a device's socket is down. `samples` is ignored.
+        columnar (bool): Append to the '.pcol' store paired with `output_file` instead of the CSV.
+        overhead_file (str): CSV file for the logger's overhead windows, None to not instrument the logger.
+        quiet (bool): Do not print every reading.
+        live (tuple): (host, port) of a live dashboard to publish the readings to, one stream per device.
+        append (bool): Continue the existing log and overhead file instead of replacing them,
+                       e.g. while an interrupted hwmon run is resumed.
+
+    Returns:
+        list: The ShellyPoller of each device.
+    """
+    # Timestamps are epoch nanoseconds derived from the monotonic clock
+    clock = MonotonicClock()
+
+    # Stop cleanly when main.py terminates the logger, so the health summary is still written
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+    if columnar:
+        file = writer = StoreWriter(columnar_path(output_file), SHELLY_FIELDS, header=clock.header(),
+                                    append=append, autoflush=True)
+    else:
+        # Initialize the CSV file with the clock metadata and headers
+        # 'mode="w"' ensures the file is created or overwritten; line buffering flushes every row
+        file = open(output_file, mode='a' if append else 'w', newline='', buffering=1)
+        writer = csv.writer(file)
+        # Appended rows carry epoch timestamps like the existing ones and need no second header
+        if file.tell() == 0:
+            write_header(file, clock)
+            writer.writerow(SHELLY_FIELDS)
+
+    meter = OverheadMeter(clock) if overhead_file else None
+    pollers = [ShellyPoller(ShellyConnection(device["ip"]), writer, clock, device["label"],
+                            device["switch_id"], interval, timeout, meter, quiet,
+                            LivePublisher(live, f"shelly:{device['label']}") if live else None)
+               for device in devices]
+    overhead = OverheadLog(meter, pollers, overhead_file, append=append) if meter else None
+    overhead_task = asyncio.create_task(overhead.run()) if overhead else None
+    if push:
+        listeners = [ShellyPushListener(poller, device["ip"], device["switch_id"])
+                     for poller, device in zip(pollers, devices)]
+        tasks = [listener.run() for listener in listeners]
+    else:
+        listeners = []
+        tasks = [poller.run(samples) for poller in pollers]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if overhead_task is not None:
+            overhead_task.cancel()
+            overhead.close()
+        for listener in listeners:
+            listener.drop()
+        for poller in pollers:
+            await poller.connection.close()
+            if poller.publisher is not None:
+                poller.publisher.close()
+        file.close()
+        write_health(pollers, health_file)
+    return pollers
+
+
+def write_health(pollers, health_file=HEALTH_FILE):
+    """
+    Prints the per-device health counters and saves them to `health_file`.
+    """
+    with open(health_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=HEALTH_FIELDS)
+        writer.writeheader()
+        for poller in pollers:
+            health = poller.health()
+            writer.writerow(health)
+            print(f"Shelly {poller.label}: {health['ok']} polled and {health['push']} pushed readings, "
+                  f"{health['timeout']} timeouts, {health['error']} errors, {health['skipped']} skipped, "
+                  f"{health['disconnected']} disconnects, mean RTT {health['rtt_mean_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log the power measured by one or more Shelly plugs.")
+    parser.add_argument("--ip", default=IP_SHELLY, help="Address of the Shelly device, optionally with ':port'")
+    parser.add_argument("--switch-id", type=int, default=SWITCH_ID, help="Switch component id (default: %(default)s)")
+    parser.add_argument("--devices", help=f"JSON device list to poll instead of --ip/--switch-id, e.g. {DEVICES_FILE}")
+    parser.add_argument("--push", action="store_true",
+                        help="Receive status notifications over WebSocket, polling only while the socket is down")
+    parser.add_argument("--interval", type=float, default=INTERVAL,
+                        help="Seconds between readings (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        help="Seconds before a request is recorded as a gap (default: %(default)s)")
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv",
+                        help="Write a CSV file or a '.pcol' columnar store (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="Do not print every reading")
+    parser.add_argument("--live", metavar="HOST:PORT",
+                        help="Publish every reading to a running live_dashboard.py (e.g. 127.0.0.1:8765)")
+    parser.add_argument("--append", action="store_true",
+                        help="Continue the existing log instead of replacing it (resumed runs)")
+    args = parser.parse_args()
+
+    if args.devices:
+        try:
+            devices = load_devices(args.devices)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load the device list '{args.devices}': {e}")
+            sys.exit(1)
+    else:
+        devices = [{"ip": args.ip, "switch_id": args.switch_id, "label": DEVICE_LABEL}]
+
+    print("Starting power meter: Shelly")
+    print(f"Starting power data capture from {len(devices)} device(s)...")
+    try:
+        asyncio.run(capture(devices, OUTPUT_FILE, args.interval, args.timeout, push=args.push,
+                            columnar=args.format == "columnar", quiet=args.quiet,
+                            live=parse_address(args.live) if args.live else None, append=args.append))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # Handle graceful exit when the user presses Ctrl+C or the logger is terminated
+        print(f"\nStopping capture.")
+
+    print(f"Capture completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from obtain_energy import ENERGY_RULE, MAX_GAP, sample_energy
+from power_clock import to_datetime
+from power_correction import BASELINE_SESSIONS
+from power_store import read_table, resolve, write_table
+
+# Multi-resolution aggregates of a fused or corrected power log. Every level splits
+# each session into fixed time buckets and keeps, per power column, the minimum,
+# maximum, mean, and the energy of the samples in the bucket, so a plot over hours
+# reads a few thousand buckets instead of millions of samples and a quick-look
+# energy query sums a handful of buckets. The levels are built once, each from the
+# one below it, and stored as columnar stores in a '<log>.levels' directory next to the log.
+
+FUSION_DATA = "power_log_fusion.csv"
+LEVELS = (1, 10, 60, 600, 3600) # Bucket widths in seconds, finest first
+POWER_COLUMNS = ("power_shelly", "power_hwmon")
+# Columns that split a session into separately integrated parts (see obtain_energy.sample_energy)
+SEGMENT_COLUMNS = ("shard", "trial")
+PLOT_POINTS = 2000 # Point budget of a plotted series
+LEVELS_META = "levels.json"
+
+
+def levels_dir(path):
+    """Returns the directory holding the levels of a log, e.g. 'power_log_fusion.levels'."""
+    return os.path.splitext(path)[0] + ".levels"
+
+
+def level_path(path, width):
+    """Returns the (CSV-style) path of one level; the level itself is its '.pcol' twin."""
+    return os.path.join(levels_dir(path), f"{width}s.csv")
+
+
+def source_mtime(source):
+    """Returns the modification time of a log file, or of the newest file of a columnar store, in ns."""
+    if os.path.isdir(source):
+        return max((os.stat(os.path.join(source, name)).st_mtime_ns for name in os.listdir(source)), default=0)
+    return os.stat(source).st_mtime_ns
+
+
+def combine(buckets, width, power_columns):
+    """
+    Merges buckets (or single-sample rows) into buckets of `width` seconds per session
+    (and shard and trial, if the rows have them).
+
+    Returns:
+        pd.DataFrame: One row per session and bucket with 'session', 'shard' and 'trial' (if
+                      present), 'bucket_ns' (bucket start), 'first_ns', 'last_ns', 'count',
+                      '<column>_min', '<column>_max', '<column>_mean', '<column>_energy' (Joules),
+                      'duration_s' and 'gap_s'.
+    """
+    segments = [column for column in SEGMENT_COLUMNS if column in buckets.columns]
+    frame = buckets.copy()
+    frame['bucket_ns'] = frame['first_ns'] // (width * 1_000_000_000) * (width * 1_000_000_000)
+    aggregations = {'first_ns': 'min', 'last_ns': 'max', 'count': 'sum', 'duration_s': 'sum', 'gap_s': 'sum'}
+    for column in power_columns:
+        # Means are recombined from their sums, weighted by the number of samples
+        frame[f'{column}_mean'] = frame[f'{column}_mean'] * frame['count']
+        aggregations.update({f'{column}_min': 'min', f'{column}_max': 'max',
+                             f'{column}_mean': 'sum', f'{column}_energy': 'sum'})
+    merged = frame.groupby(['session', *segments, 'bucket_ns'], sort=True, observed=True).agg(aggregations)
+    for column in power_columns:
+        merged[f'{column}_mean'] = merged[f'{column}_mean'] / merged['count']
+    return merged.reset_index()
+
+
+def build_levels(path=FUSION_DATA, df=None, levels=LEVELS, power_columns=POWER_COLUMNS,
+                 rule=ENERGY_RULE, max_gap=MAX_GAP):
+    """
+    Builds and stores the aggregate levels of a power log.
+
+    Bucket energies come from obtain_energy.sample_energy(), so summing them over a
+    session gives exactly the energy obtain_energy.py integrates from the raw samples
+    with the same `rule` and `max_gap`, at any level. Repeated visits ('trial') and
+    merged shards ('shard') are integrated and bucketed separately, like there.
+
+    Args:
+        path (str): The log (CSV or columnar store); the levels are stored next to it.
+        df (pd.DataFrame): Already loaded data of `path` to use instead of reading it.
+        levels (tuple): Bucket widths in seconds, finest first.
+        power_columns (tuple): Power columns to aggregate; missing ones are skipped.
+        rule (str): Integration rule, see obtain_energy.integrate_power().
+        max_gap (float): Longest interval in seconds still integrated, None for no limit.
+
+    Returns:
+        dict: Bucket width -> number of buckets.
+    """
+    source = resolve(path)
+    if df is None:
+        df = read_table(path)
+    power_columns = [column for column in power_columns if column in df.columns]
+    segments = [column for column in SEGMENT_COLUMNS if column in df.columns]
+    df = pd.DataFrame({'session': df['session'], **{column: df[column] for column in segments},
+                       'timestamp': to_datetime(df['timestamp']),
+                       **{column: pd.to_numeric(df[column], errors='coerce') for column in power_columns}})
+    df = df.dropna().sort_values(by=['session', *segments, 'timestamp'], kind='stable')
+    # sample_energy's stable sort keeps this order, so its rows line up with df's
+    energies = sample_energy(df, power_columns, rule, max_gap)
+
+    timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    samples = pd.DataFrame({'session': df['session'].to_numpy(),
+                            **{column: df[column].to_numpy() for column in segments}, 'first_ns': timestamps,
+                            'last_ns': timestamps, 'count': 1,
+                            'duration_s': energies['Duration (s)'].to_numpy(),
+                            'gap_s': energies['Gap (s)'].to_numpy()})
+    for column in power_columns:
+        values = df[column].to_numpy(dtype=float)
+        samples[f'{column}_min'] = values
+        samples[f'{column}_max'] = values
+        samples[f'{column}_mean'] = values
+        samples[f'{column}_energy'] = energies[column].to_numpy()
+
+    os.makedirs(levels_dir(path), exist_ok=True)
+    counts = {}
+    buckets = samples
+    for width in levels:
+        buckets = combine(buckets, width, power_columns)
+        write_table(buckets, level_path(path, width), columnar=True)
+        counts[width] = len(buckets)
+
+    meta = {"source": source, "source_mtime_ns": source_mtime(source), "levels": list(levels),
+            "power_columns": power_columns, "rule": rule, "max_gap": max_gap,
+            "first_ns": int(timestamps.min()) if len(timestamps) else None,
+            "last_ns": int(timestamps.max()) if len(timestamps) else None}
+    tmp = os.path.join(levels_dir(path), LEVELS_META + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(levels_dir(path), LEVELS_META))
+    return counts
+
+
+def read_levels_meta(path):
+    """
+    Returns the metadata of a log's levels, or None if they are missing or older
+    than the log (the log was rewritten after they were built).
+    """
+    try:
+        with open(os.path.join(levels_dir(path), LEVELS_META)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    source = resolve(path)
+    if not os.path.exists(source) or meta.get("source") != source:
+        return None
+    return meta if source_mtime(source) <= meta["source_mtime_ns"] else None
+
+
+def choose_level(levels, span_s, points):
+    """
+    Returns the coarsest bucket width that still yields `points` buckets over
+    `span_s` seconds, or None if even the finest level is too coarse (use the raw samples).
+    """
+    fitting = [width for width in levels if span_s / width >= points]
+    return max(fitting) if fitting else None
+
+
+def read_level(path, width):
+    """Loads one level of a log as a DataFrame."""
+    return read_table(level_path(path, width))
+
+
+def power_envelope(path, column, points=PLOT_POINTS, sessions=None):
+    """
+    Returns the min/max/mean envelope of a power column at the coarsest level
+    that still resolves the log's time span into `points` buckets.
+
+    Args:
+        path (str): The aggregated log.
+        column (str): Power column, e.g. 'power_hwmon'.
+        points (int): Point budget of the whole span.
+        sessions (iterable): Sessions to keep, None for all.
+
+    Returns:
+        tuple: (bucket width in seconds, DataFrame with 'session', 'bucket_ns', 'min',
+               'max' and 'mean'), or None if no up-to-date level fits the budget.
+    """
+    meta = read_levels_meta(path)
+    if meta is None or column not in meta["power_columns"] or meta["first_ns"] is None:
+        return None
+    width = choose_level(meta["levels"], (meta["last_ns"] - meta["first_ns"]) / 1e9, points)
+    if width is None:
+        return None
+    level = read_level(path, width)
+    if sessions is not None:
+        level = level[level['session'].isin(list(sessions))]
+    if any(column in level.columns for column in SEGMENT_COLUMNS):
+        # Visits (or shards) sharing a bucket are drawn as one point
+        level = level.assign(weighted=level[f'{column}_mean'] * level['count'])
+        level = level.groupby(['session', 'bucket_ns'], sort=True, observed=True).agg(
+            {f'{column}_min': 'min', f'{column}_max': 'max', 'weighted': 'sum', 'count': 'sum'}).reset_index()
+        level[f'{column}_mean'] = level['weighted'] / level['count']
+    envelope = pd.DataFrame({'session': level['session'], 'bucket_ns': level['bucket_ns'],
+                             'min': level[f'{column}_min'], 'max': level[f'{column}_max'],
+                             'mean': level[f'{column}_mean']})
+    return width, envelope
+
+
+def quick_energy(path):
+    """
+    Energy per session from the coarsest stored level, without touching the raw samples.
+    Baseline sessions are left out, like in obtain_energy.py.
+
+    Returns:
+        pd.DataFrame: 'Session', '<column> Energy (Wh)' per power column and 'Duration (s)',
+                      or None if the levels are missing or out of date.
+    """
+    meta = read_levels_meta(path)
+    if meta is None:
+        return None
+    level = read_level(path, max(meta["levels"]))
+    level = level[~level['session'].isin(BASELINE_SESSIONS)]
+    columns = [f'{column}_energy' for column in meta["power_columns"]] + ['duration_s']
+    totals = level.groupby('session', sort=True, observed=True)[columns].sum()
+    result = pd.DataFrame({'Session': totals.index})
+    for column in meta["power_columns"]:
+        result[f'{column} Energy (Wh)'] = totals[f'{column}_energy'].to_numpy() / 3600
+    result['Duration (s)'] = totals['duration_s'].to_numpy()
+    return result
+
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a series to `points` points.
+
+    The first and last points are kept; every bucket in between contributes the
+    point forming the largest triangle with the point chosen in the previous bucket
+    and the mean of the next bucket, which preserves peaks and the overall shape.
+
+    Args:
+        x (array-like): Increasing x values.
+        y (array-like): y values.
+        points (int): Number of points to keep (at least 3).
+
+    Returns:
+        np.ndarray: Indices of the kept points, increasing.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # Bucket edges over the points between the first and the last one
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        following = slice(edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n)
+        next_x = x[following].mean()
+        next_y = y[following].mean()
+        # Twice the triangle area for every candidate of the bucket at once
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query multi-resolution aggregates of a power log.")
+    parser.add_argument("command", choices=["build", "energy", "info"],
+                        help="build the levels, print the quick-look energy per session, or list the levels")
+    parser.add_argument("--input", default=FUSION_DATA,
+                        help="Fused or corrected power log (CSV or columnar store) (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        try:
+            counts = build_levels(args.input)
+        except FileNotFoundError:
+            print(f"Error: The file '{args.input}' was not found.")
+            sys.exit(1)
+        for width, count in counts.items():
+            print(f"{width:>6} s: {count} buckets")
+        print(f"Levels saved to {levels_dir(args.input)}")
+    elif args.command == "energy":
+        energy = quick_energy(args.input)
+        if energy is None:
+            print(f"Error: No up-to-date levels for '{args.input}'. Run 'python3 power_resample.py build' first.")
+            sys.exit(1)
+        print(energy.to_string(index=False))
+    else:
+        meta = read_levels_meta(args.input)
+        if meta is None:
+            print(f"No up-to-date levels for '{args.input}'.")
+            sys.exit(1)
+        print(json.dumps(meta, indent=2))
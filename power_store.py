@@ -0,0 +1,383 @@
+import argparse
+import json
+import math
+import os
+import sys
+from array import array
+
+from power_clock import parse_timestamp, read_header
+from hwmon_channels import channel_kind
+
+# Columnar storage for power logs: a '<name>.pcol' directory next to '<name>.csv' with
+# one raw little-endian binary file per column and a meta.json describing them:
+#   timestamp           int64 epoch nanoseconds
+#   power columns       float32 (energy counters and other numbers float64)
+#   text columns        int32 codes into a list of categories kept in meta.json
+# Columns are plain arrays on disk, so loggers can append to them with the standard
+# library and the analysis scripts can memory-map them with NumPy without parsing.
+
+STORE_SUFFIX = ".pcol"
+META_FILE = "meta.json"
+STORE_VERSION = 1
+
+# dtype name -> (array typecode, NumPy dtype)
+DTYPES = {
+    "int64": ("q", "<i8"),
+    "float32": ("f", "<f4"),
+    "float64": ("d", "<f8"),
+    "category": ("i", "<i4"),
+}
+# Columns of the known logs that are stored as categories; all other columns are numeric
+TEXT_COLUMNS = {"session", "device", "status", "event", "channel", "shard"}
+INTEGER_COLUMNS = {"timestamp", "value_uj", "trial"} # max_range_uj stays float so unknown ranges can be NaN
+
+
+def columnar_path(csv_path):
+    """Returns the store path paired with a CSV path, e.g. 'power_log_fusion.pcol'."""
+    root, _ = os.path.splitext(csv_path)
+    return root + STORE_SUFFIX
+
+
+def is_store(path):
+    """Tells whether `path` is a columnar store directory."""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def default_dtype(column):
+    """Returns the storage dtype used for a log column."""
+    if column in TEXT_COLUMNS:
+        return "category"
+    if column in INTEGER_COLUMNS:
+        return "int64"
+    # Cumulative energy counters keep float64: float32 would lose their increments once they grow large
+    if column.startswith("power") or channel_kind(column) == "power":
+        return "float32"
+    return "float64"
+
+
+def resolve(path):
+    """
+    Returns the file to read for a log path: the CSV itself or its columnar twin,
+    whichever exists, preferring the more recently written one if both do.
+    """
+    if is_store(path):
+        return path
+    store = columnar_path(path)
+    if not is_store(store):
+        return path
+    if not os.path.exists(path):
+        return store
+    store_mtime = max(os.path.getmtime(os.path.join(store, name)) for name in os.listdir(store))
+    return store if store_mtime >= os.path.getmtime(path) else path
+
+
+class StoreWriter:
+    """
+    Appends rows to a columnar store, mirroring the writerow()/writerows() interface
+    of csv.writer so the loggers can use either.
+
+    Args:
+        path (str): Store directory; created if missing.
+        columns (list): Column names, in row order.
+        dtypes (dict): Optional column -> dtype overrides (see DTYPES).
+        header (str): Metadata line kept in meta.json, e.g. the clock anchors.
+        append (bool): Keep existing rows instead of truncating the store.
+        autoflush (bool): Flush to the OS after every write call.
+    """
+
+    def __init__(self, path, columns, dtypes=None, header=None, append=False, autoflush=False):
+        self.path = path
+        self.autoflush = autoflush
+        self.meta_dirty = False
+        os.makedirs(path, exist_ok=True)
+        if append and is_store(path):
+            self.meta = read_meta(path)
+            if [column["name"] for column in self.meta["columns"]] != list(columns):
+                raise ValueError(f"Columns of {path} do not match {columns}")
+        else:
+            dtypes = dtypes or {}
+            self.meta = {
+                "version": STORE_VERSION,
+                "header": header,
+                "columns": [{"name": name, "dtype": dtypes.get(name, default_dtype(name))} for name in columns],
+                "categories": {},
+            }
+            for column in self.meta["columns"]:
+                if column["dtype"] == "category":
+                    self.meta["categories"][column["name"]] = []
+            self._write_meta()
+        self.codes = {name: {value: code for code, value in enumerate(values)}
+                      for name, values in self.meta["categories"].items()}
+        mode = "ab" if append else "wb"
+        self.files = [open(os.path.join(path, f"{i}.bin"), mode) for i in range(len(self.meta["columns"]))]
+        self.typecodes = [DTYPES[column["dtype"]][0] for column in self.meta["columns"]]
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+    def _add_categories(self, name, values):
+        """Registers unseen values of a category column and returns its value -> code mapping."""
+        codes = self.codes[name]
+        categories = self.meta["categories"][name]
+        for value in values:
+            if value not in codes:
+                codes[value] = len(categories)
+                categories.append(value)
+                self.meta_dirty = True
+        return codes
+
+    def _encode(self, index, values):
+        column = self.meta["columns"][index]
+        dtype = column["dtype"]
+        if dtype == "category":
+            values = [str(value) for value in values]
+            codes = self._add_categories(column["name"], dict.fromkeys(values))
+            return [codes[value] for value in values]
+        if dtype == "int64":
+            return [int(value) if value != "" else 0 for value in values]
+        return [float(value) if value != "" else math.nan for value in values]
+
+    def writerows(self, rows):
+        """Appends rows (sequences in column order)."""
+        rows = list(rows)
+        if not rows:
+            return
+        self.meta_dirty = False
+        columns = list(zip(*rows))
+        encoded = [array(self.typecodes[i], self._encode(i, values)) for i, values in enumerate(columns)]
+        # New categories must be on disk before any code referring to them
+        if self.meta_dirty:
+            self._write_meta()
+        for f, values in zip(self.files, encoded):
+            values.tofile(f)
+        if self.autoflush:
+            self.flush()
+
+    def write_frame(self, df):
+        """Appends the rows of a pandas DataFrame holding the store's columns, column by column."""
+        import pandas as pd
+
+        self.meta_dirty = False
+        encoded = []
+        for column in self.meta["columns"]:
+            values = df[column["name"]]
+            if column["dtype"] == "category":
+                values = values.astype(str)
+                codes = self._add_categories(column["name"], values.unique())
+                encoded.append(values.map(codes).to_numpy(dtype=DTYPES["category"][1]))
+            else:
+                encoded.append(pd.to_numeric(values, errors="coerce").to_numpy(dtype=DTYPES[column["dtype"]][1]))
+        if self.meta_dirty:
+            self._write_meta()
+        for f, values in zip(self.files, encoded):
+            values.tofile(f)
+        if self.autoflush:
+            self.flush()
+
+    def writerow(self, row):
+        """Appends a single row."""
+        self.writerows([row])
+
+    def flush(self):
+        for f in self.files:
+            f.flush()
+
+    def sync(self):
+        """Flushes the columns and forces them to disk."""
+        for f in self.files:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def read_meta(path):
+    """Returns the decoded meta.json of a store."""
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def store_columns(path):
+    """Returns the column names of a store."""
+    return [column["name"] for column in read_meta(path)["columns"]]
+
+
+def store_length(path, meta=None):
+    """
+    Returns the number of complete rows: the length of the shortest column, so a
+    row whose append was interrupted half-way is ignored.
+    """
+    meta = meta or read_meta(path)
+    lengths = [os.path.getsize(os.path.join(path, f"{i}.bin")) // array(DTYPES[column["dtype"]][0]).itemsize
+               for i, column in enumerate(meta["columns"])]
+    return min(lengths, default=0)
+
+
+def iter_store_rows(path, columns=None, chunk_size=10_000):
+    """
+    Yields the rows of a store as tuples of Python values, reading `chunk_size`
+    rows per column at a time. Uses only the standard library.
+
+    Args:
+        columns (list): Names of the columns to return, in this order (default: all).
+    """
+    meta = read_meta(path)
+    names = [column["name"] for column in meta["columns"]]
+    wanted = [names.index(name) for name in (columns or names)]
+    total = store_length(path, meta)
+    files = [open(os.path.join(path, f"{i}.bin"), "rb") for i in wanted]
+    try:
+        decoders = []
+        for i in wanted:
+            column = meta["columns"][i]
+            decoders.append(meta["categories"][column["name"]] if column["dtype"] == "category" else None)
+        remaining = total
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            chunk = []
+            for f, i, categories in zip(files, wanted, decoders):
+                values = array(DTYPES[meta["columns"][i]["dtype"]][0])
+                values.fromfile(f, n)
+                chunk.append([categories[code] for code in values] if categories is not None else values)
+            yield from zip(*chunk)
+            remaining -= n
+    finally:
+        for f in files:
+            f.close()
+
+
+def read_store(path, columns=None):
+    """
+    Loads a store as a pandas DataFrame backed by read-only memory maps of the
+    column files, so numeric columns are not copied or parsed. Category columns
+    become pandas Categoricals.
+    """
+    import numpy as np
+    import pandas as pd
+
+    meta = read_meta(path)
+    total = store_length(path, meta)
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        name = column["name"]
+        if columns is not None and name not in columns:
+            continue
+        dtype = np.dtype(DTYPES[column["dtype"]][1])
+        if total:
+            values = np.memmap(os.path.join(path, f"{i}.bin"), dtype=dtype, mode="r", shape=(total,))
+        else:
+            values = np.empty(0, dtype=dtype)
+        if column["dtype"] == "category":
+            values = pd.Categorical.from_codes(values, categories=meta["categories"][name])
+        data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def read_table(path, **csv_options):
+    """
+    Loads a power log as a DataFrame from its CSV or its columnar twin (see resolve()).
+    The '#' metadata lines at the top of CSV logs are skipped.
+    """
+    import pandas as pd
+
+    source = resolve(path)
+    if is_store(source):
+        return read_store(source)
+    metadata_lines = 0
+    with open(source, "r") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            metadata_lines += 1
+    return pd.read_csv(source, skiprows=metadata_lines, **csv_options)
+
+
+def write_table(df, path, columnar=False):
+    """
+    Saves a DataFrame as a CSV file, or as the columnar twin of `path` when `columnar` is set.
+    """
+    import pandas as pd
+
+    if not columnar:
+        df.to_csv(path, index=False)
+        return path
+    store = columnar_path(path)
+    # Columns pandas could not read as numbers are kept as categories
+    dtypes = {column: "category" for column in df.columns
+              if not pd.api.types.is_numeric_dtype(df[column]) and default_dtype(column) != "category"}
+    writer = StoreWriter(store, list(df.columns), dtypes)
+    try:
+        writer.write_frame(df)
+    finally:
+        writer.close()
+    return store
+
+
+def convert(csv_path, store_path=None, chunk_size=100_000):
+    """
+    Converts a CSV power log into a columnar store, chunk by chunk.
+    Legacy 'YYYYMMDDTHH:MM:SS' timestamps are converted to epoch nanoseconds.
+
+    Returns:
+        tuple: (store path, number of rows written).
+    """
+    import csv
+    from power_clock import skip_comments
+
+    store_path = store_path or columnar_path(csv_path)
+    header_line = read_header(csv_path)
+    rows = 0
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(skip_comments(f))
+        columns = next(reader)
+        writer = StoreWriter(store_path, columns,
+                             header="# " + " ".join(f"{key}={value}" for key, value in header_line.items()) if header_line else None)
+        ts_col = columns.index("timestamp") if "timestamp" in columns else None
+        try:
+            batch = []
+            for row in reader:
+                if ts_col is not None:
+                    row[ts_col] = parse_timestamp(row[ts_col])
+                batch.append(row)
+                if len(batch) >= chunk_size:
+                    writer.writerows(batch)
+                    rows += len(batch)
+                    batch = []
+            writer.writerows(batch)
+            rows += len(batch)
+        finally:
+            writer.close()
+    return store_path, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert CSV power logs to the columnar store format.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="Convert CSV logs into '.pcol' stores")
+    convert_parser.add_argument("csv_files", nargs="+")
+    info_parser = subparsers.add_parser("info", help="Show the columns and size of a store")
+    info_parser.add_argument("stores", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        for csv_file in args.csv_files:
+            try:
+                store, rows = convert(csv_file)
+            except (OSError, ValueError, StopIteration) as e:
+                print(f"Error converting '{csv_file}': {e}")
+                sys.exit(1)
+            csv_size = os.path.getsize(csv_file)
+            store_size = sum(os.path.getsize(os.path.join(store, name)) for name in os.listdir(store))
+            print(f"{csv_file} -> {store}: {rows} rows, {csv_size / 1e6:.1f} MB -> {store_size / 1e6:.1f} MB")
+    else:
+        for store in args.stores:
+            meta = read_meta(store)
+            print(f"{store}: {store_length(store, meta)} rows")
+            for column in meta["columns"]:
+                extra = f" ({len(meta['categories'][column['name']])} categories)" if column["dtype"] == "category" else ""
+                print(f"  {column['name']}: {column['dtype']}{extra}")
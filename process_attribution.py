@@ -0,0 +1,190 @@
+import os
+from collections import deque
+
+# Per-process attribution of the measured power. Every tick of the hwmon sampler
+# reads the CPU time of the browser's process tree from /proc/<pid>/stat and the
+# busy time of the whole machine from /proc/stat; the browser's share of the busy
+# time over the last SHARE_WINDOW seconds apportions the package power read in the
+# tick. Both counters advance in clock ticks (usually 10 ms), so at high sampling
+# rates a single tick often sees no change or a whole jiffy; the share is therefore a
+# ratio of the sums over the window, and no CPU time is dropped or clipped per tick.
+# The stat files stay open and are re-read with pread(), like the sysfs sensors,
+# and the process list is rescanned only every RESCAN_INTERVAL seconds, reading the
+# stat file of new processes only, so attribution adds a few microseconds per tick.
+
+PROC = "/proc"
+RESCAN_INTERVAL = 1.0 # Seconds between scans for new processes of the browser
+SHARE_WINDOW = 1.0 # Seconds of CPU time the browser's share is computed over
+STAT_SIZE = 1024 # Bytes read from a stat file; the fields used come well before that
+# Fields of /proc/stat's 'cpu' line counted as busy time: user, nice, system, irq, softirq, steal
+BUSY_FIELDS = (0, 1, 2, 5, 6, 7)
+
+
+def parse_pid_stat(data):
+    """
+    Parses the contents of /proc/<pid>/stat.
+
+    Returns:
+        tuple: (command name, parent pid, user + system CPU time in clock ticks).
+    """
+    # The command name may contain spaces and parentheses; it ends at the last ')'
+    head, _, tail = data.rpartition(b")")
+    fields = tail.split()
+    return head.partition(b"(")[2].decode(errors="replace"), int(fields[1]), int(fields[11]) + int(fields[12])
+
+
+def parse_busy(data):
+    """Returns the busy CPU time of all CPUs, in clock ticks, from the contents of /proc/stat."""
+    fields = data[:data.index(b"\n")].split()[1:]
+    return sum(int(fields[i]) for i in BUSY_FIELDS if i < len(fields))
+
+
+class ProcessTracker:
+    """
+    Tracks the CPU time of a process tree: every process whose command name is one
+    of `names` and all of its descendants, including those started later.
+
+    Args:
+        names (iterable): Command names of the root processes (as in /proc/<pid>/comm,
+                          at most 15 characters), e.g. ('firefox',).
+        proc (str): Mount point of procfs.
+        rescan_interval (float): Seconds between scans for new processes.
+        window (float): Seconds of CPU time the share is computed over; keep it at least
+                        as long as `rescan_interval`, see sample().
+    """
+
+    def __init__(self, names, proc=PROC, rescan_interval=RESCAN_INTERVAL, window=SHARE_WINDOW):
+        self.names = {name[:15] for name in names}
+        self.proc = proc
+        self.rescan_ns = int(rescan_interval * 1_000_000_000)
+        self.window_ns = int(window * 1_000_000_000)
+        self.stat_fd = os.open(os.path.join(proc, "stat"), os.O_RDONLY)
+        self.known = {} # pid -> whether it belongs to the tree, for every pid seen in a scan
+        self.parents = {}
+        self.fds = {} # pid -> open stat file of the tree's processes
+        self.ticks = {} # pid -> CPU time at the previous sample
+        self.recent = deque() # [monotonic ns, ns since the previous sample, tree ticks, busy ticks] per sample
+        self.used_sum = 0.0 # Tree ticks in `recent`
+        self.busy_sum = 0 # Busy ticks in `recent`
+        self.last_ns = None
+        self.last_scan_ns = None
+        self.next_scan_ns = 0
+        self.scan(initial=True)
+        self.busy = self.read_busy()
+
+    def read_busy(self):
+        return parse_busy(os.pread(self.stat_fd, 4096, 0))
+
+    def scan(self, initial=False):
+        """
+        Looks for processes that joined or left the tree since the last scan. CPU time
+        of processes already running at the first scan is counted from then on;
+        processes started later are counted from their start.
+
+        Returns:
+            int: CPU time in clock ticks the processes that joined used before this scan.
+        """
+        joined = 0
+        pids = {int(entry) for entry in os.listdir(self.proc) if entry.isdigit()}
+        for pid in list(self.known):
+            if pid not in pids:
+                self.forget(pid)
+        # Parents usually have lower pids, so most processes are classified after their parent
+        for pid in sorted(pids - self.known.keys()):
+            try:
+                fd = os.open(os.path.join(self.proc, str(pid), "stat"), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                name, parent, ticks = parse_pid_stat(os.pread(fd, STAT_SIZE, 0))
+            except (OSError, ValueError, IndexError):
+                os.close(fd)
+                continue
+            self.parents[pid] = parent
+            self.known[pid] = name in self.names or self.in_tree(parent)
+            if self.known[pid]:
+                self.fds[pid] = fd
+                self.ticks[pid] = ticks
+                if not initial:
+                    joined += ticks
+            else:
+                os.close(fd)
+        return joined
+
+    def in_tree(self, pid):
+        """Tells whether a pid belongs to the tree, following unclassified parents."""
+        seen = set()
+        while pid not in self.known and pid in self.parents and pid not in seen:
+            seen.add(pid)
+            pid = self.parents[pid]
+        return self.known.get(pid, False)
+
+    def forget(self, pid):
+        self.known.pop(pid, None)
+        self.parents.pop(pid, None)
+        self.ticks.pop(pid, None)
+        fd = self.fds.pop(pid, None)
+        if fd is not None:
+            os.close(fd)
+
+    def sample(self, now_ns):
+        """
+        Reads the CPU time of the tree and of the machine.
+
+        Args:
+            now_ns (int): Monotonic time of the tick in ns, for scheduling rescans.
+
+        Returns:
+            float: Share (0..1) of the machine's busy CPU time over the last `window`
+                   seconds spent by the tree, 0 if the machine was not busy.
+        """
+        joined = 0
+        scanned = now_ns >= self.next_scan_ns
+        if scanned:
+            joined = self.scan()
+            self.next_scan_ns = now_ns + self.rescan_ns
+        used = 0
+        ticks = self.ticks
+        for pid, fd in list(self.fds.items()):
+            try:
+                current = parse_pid_stat(os.pread(fd, STAT_SIZE, 0))[2]
+            except (OSError, ValueError, IndexError):
+                # The process exited; its time since the previous sample is lost
+                self.forget(pid)
+                continue
+            used += current - ticks[pid]
+            ticks[pid] = current
+        busy = self.read_busy()
+        delta = busy - self.busy
+        self.busy = busy
+
+        recent = self.recent
+        recent.append([now_ns, now_ns - self.last_ns if self.last_ns is not None else 0, used, delta])
+        self.used_sum += used
+        self.busy_sum += delta
+        if joined:
+            # Processes found by this scan ran some time since the previous one: spread
+            # their earlier CPU time over the samples of that interval still in the window
+            since = [entry for entry in recent if self.last_scan_ns is None or entry[0] > self.last_scan_ns]
+            span = sum(entry[1] for entry in since)
+            for entry in since:
+                entry[2] += joined * entry[1] / span if span else joined / len(since)
+            self.used_sum += joined
+        if scanned:
+            self.last_scan_ns = now_ns
+        self.last_ns = now_ns
+        while recent and recent[0][0] <= now_ns - self.window_ns:
+            _, _, old_used, old_busy = recent.popleft()
+            self.used_sum -= old_used
+            self.busy_sum -= old_busy
+        return min(self.used_sum / self.busy_sum, 1.0) if self.busy_sum > 0 else 0.0
+
+    def processes(self):
+        """Returns the number of processes currently in the tree."""
+        return len(self.fds)
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds.clear()
+        os.close(self.stat_fd)
@@ -0,0 +1,122 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from power_store import columnar_path
+
+# Batch rendering of the plots of many archived runs. Every run directory holds the
+# logs of one measurement (power_log_fusion.csv or its '.pcol' store, results/);
+# runs are spread over worker processes, so the wall time is bounded by the number
+# of CPUs rather than by one matplotlib process drawing figure after figure.
+
+FUSION_DATA = "power_log_fusion.csv"
+RESULTS_FOLDER = "results"
+ENERGY_SUMMARY = "energy_consumption_shelly.csv"
+BAR_CHART = "total_energy_wh_bar_chart.png"
+
+
+def has_fused_log(run_dir):
+    """Returns whether a directory holds a fused log (CSV or columnar store)."""
+    path = os.path.join(run_dir, FUSION_DATA)
+    return os.path.exists(path) or os.path.exists(columnar_path(path))
+
+
+def find_runs(paths):
+    """
+    Expands the given paths into run directories: a directory holding a fused log
+    is a run, otherwise its immediate subdirectories holding one are.
+    """
+    runs = []
+    for path in paths:
+        if has_fused_log(path):
+            runs.append(path)
+        elif os.path.isdir(path):
+            runs.extend(sorted(entry.path for entry in os.scandir(path)
+                               if entry.is_dir() and has_fused_log(entry.path)))
+        else:
+            print(f"Warning: '{path}' is not a run directory; skipping it.")
+    return runs
+
+
+def init_worker():
+    """Selects the non-interactive Agg backend in each worker before anything is drawn."""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def render_run(run_dir, quiet=True):
+    """
+    Renders the period plots, the overviews (when the run has aggregate levels)
+    and the energy bar chart (when its energy summary exists) of one run into its
+    results folder.
+
+    Args:
+        run_dir (str): Run directory.
+        quiet (bool): Discard the progress messages of the plotting functions.
+
+    Returns:
+        tuple: (run_dir, seconds taken, error message or None).
+    """
+    # Imported here, after init_worker() has selected the backend
+    import pandas as pd
+    from graph_energy import plot_energy_bar_chart
+    from graph_period import plot_power_overviews, plot_separated_power_comparison
+    from power_resample import read_levels_meta
+
+    start = time.perf_counter()
+    results = os.path.join(run_dir, RESULTS_FOLDER)
+    fused = os.path.join(run_dir, FUSION_DATA)
+    try:
+        os.makedirs(results, exist_ok=True)
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            plot_separated_power_comparison(fused, output_folder=results)
+            if read_levels_meta(fused) is not None:
+                plot_power_overviews(fused, results)
+            energy_summary = os.path.join(results, ENERGY_SUMMARY)
+            if os.path.exists(energy_summary):
+                plot_energy_bar_chart(pd.read_csv(energy_summary), os.path.join(results, BAR_CHART))
+    except Exception as e:
+        return run_dir, time.perf_counter() - start, str(e)
+    return run_dir, time.perf_counter() - start, None
+
+
+def render_runs(runs, workers=None, quiet=True):
+    """
+    Renders the plots of every run on a pool of `workers` processes (one per CPU by default).
+
+    Returns:
+        list: The runs that failed, as (run_dir, error message) tuples.
+    """
+    failed = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = [pool.submit(render_run, run, quiet) for run in runs]
+        for done, future in enumerate(as_completed(futures), 1):
+            run_dir, seconds, error = future.result()
+            status = f"failed: {error}" if error else f"{seconds:.1f} s"
+            print(f"[{done}/{len(runs)}] {run_dir}: {status}")
+            if error:
+                failed.append((run_dir, error))
+    print(f"Rendered {len(runs) - len(failed)} of {len(runs)} runs in {time.perf_counter() - start:.1f} s.")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the plots of many archived runs in parallel.")
+    parser.add_argument("runs", nargs="+",
+                        help="Run directories, or directories whose subdirectories are runs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes (default: %(default)s, the number of CPUs)")
+    parser.add_argument("--verbose", action="store_true", help="Show the messages of the plotting functions")
+    args = parser.parse_args()
+
+    runs = find_runs(args.runs)
+    if not runs:
+        print("Error: No run directories with a fused log found.")
+        sys.exit(1)
+    if render_runs(runs, args.workers, quiet=not args.verbose):
+        sys.exit(1)
@@ -0,0 +1,177 @@
+import json
+import os
+
+from power_store import resolve
+
+# Crash-safe, resumable hwmon logs. Every logger start writes a new segment: the run's
+# first segment is the log itself (power_log_hwmon.csv), a resumed run continues in
+# power_log_hwmon.001.csv, .002.csv, ... A progress file next to the log
+# ('power_log_hwmon.progress.json') lists the segments, how many of each segment's rows
+# belong to completed sessions, and which visits are done. It is replaced atomically
+# after every session, once the session's rows have been fsync'ed, so after a crash it
+# always describes rows that are on disk. Rows past a segment's committed count belong
+# to the interrupted session and are ignored by the readers; the restarted logger
+# measures that session again and then goes on with the next unfinished site.
+
+PROGRESS_SUFFIX = ".progress.json"
+PROGRESS_VERSION = 1
+
+
+def progress_path(log_path):
+    """Returns the progress file of a log, e.g. 'power_log_hwmon.progress.json'."""
+    return os.path.splitext(log_path)[0] + PROGRESS_SUFFIX
+
+
+def segment_path(log_path, number):
+    """Returns the path of segment `number` of a log; segment 0 is the log itself."""
+    if number == 0:
+        return log_path
+    root, ext = os.path.splitext(log_path)
+    return f"{root}.{number:03d}{ext}"
+
+
+def write_json_durably(path, data):
+    """Replaces a JSON file atomically, with its content on disk before the rename."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # The rename itself is durable once the directory is synced
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def load_progress(log_path):
+    """Returns the progress of a log's run as a dict, or None if it has none."""
+    try:
+        with open(progress_path(log_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def log_segments(log_path):
+    """
+    Returns the segments of a log as (path, committed rows) tuples in write order,
+    or None for a log without a progress file (a single file, read completely).
+    """
+    progress = load_progress(log_path)
+    if progress is None:
+        return None
+    directory = os.path.dirname(log_path)
+    return [(os.path.join(directory, segment["name"]), segment["rows"]) for segment in progress["segments"]]
+
+
+def log_files(log_path):
+    """Returns every file a log's content depends on: its segments (resolved) and its progress file."""
+    segments = log_segments(log_path)
+    if segments is None:
+        return [resolve(log_path)]
+    return [resolve(path) for path, _ in segments] + [progress_path(log_path)]
+
+
+def read_log(log_path):
+    """
+    Loads a log as one DataFrame: the committed rows of all its segments, or the
+    whole file for a log without a progress file.
+    """
+    import pandas as pd
+    from power_store import read_table
+
+    segments = log_segments(log_path)
+    if segments is None:
+        return read_table(log_path)
+    frames = [read_table(path).head(rows) for path, rows in segments if os.path.exists(resolve(path))]
+    return pd.concat(frames, ignore_index=True, sort=False) if frames else read_table(log_path).head(0)
+
+
+class RunProgress:
+    """
+    Progress of a measurement run, saved in the log's progress file.
+
+    Args:
+        log_path (str): The run's log (first segment).
+        state (dict): The saved progress, see start() and resume().
+    """
+
+    def __init__(self, log_path, state):
+        self.log_path = log_path
+        self.state = state
+        self.completed = {(session, trial) for session, trial, _ in state["completed"]}
+
+    @classmethod
+    def start(cls, log_path, urls, trials, order, seed):
+        """Starts the progress of a new run, whose first segment is `log_path`."""
+        state = {"version": PROGRESS_VERSION, "urls": urls, "trials": trials, "order": order, "seed": seed,
+                 "segments": [{"name": os.path.basename(log_path), "rows": 0}],
+                 "completed": [], "finished": False}
+        progress = cls(log_path, state)
+        progress.save()
+        return progress
+
+    @classmethod
+    def resume(cls, log_path):
+        """
+        Continues the run of `log_path` in a new segment.
+
+        Raises:
+            FileNotFoundError: If the log has no progress file.
+        """
+        state = load_progress(log_path)
+        if state is None:
+            raise FileNotFoundError(progress_path(log_path))
+        number = len(state["segments"])
+        state["segments"].append({"name": os.path.basename(segment_path(log_path, number)), "rows": 0})
+        progress = cls(log_path, state)
+        progress.save()
+        return progress
+
+    @property
+    def segment(self):
+        """Path of the segment this run writes."""
+        return os.path.join(os.path.dirname(self.log_path), self.state["segments"][-1]["name"])
+
+    def done(self, session, trial=0):
+        """Tells whether a visit (or the Background session, trial 0) was completed earlier."""
+        return (session, trial) in self.completed
+
+    def energies(self):
+        """Returns (session, energy above the idle level in J) of every completed visit, in completion order."""
+        return [(session, energy) for session, trial, energy in self.state["completed"] if trial]
+
+    def commit(self, sampler, session=None, trial=0, energy=None):
+        """
+        Makes the sampler's rows durable and records them as committed, plus the
+        completed visit `session`/`trial` with its energy, if given. The sampler's
+        latest idle baseline is saved along, so a resumed run measures the energies
+        of its visits against the same level.
+        """
+        sampler.sync()
+        self.state["segments"][-1]["rows"] = sampler.rows
+        self.state["baseline"] = sampler.baseline
+        if session is not None:
+            self.state["completed"].append([session, trial, energy])
+            self.completed.add((session, trial))
+        self.save()
+
+    @property
+    def baseline(self):
+        """The sampler's idle baseline at the last commit (see PowerSampler), None before the first."""
+        return self.state.get("baseline")
+
+    def finish(self):
+        self.state["finished"] = True
+        self.save()
+
+    def save(self):
+        write_json_durably(progress_path(self.log_path), self.state)
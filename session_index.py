@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import sys
+
+from power_store import is_store, resolve
+
+# Session index of a fused log: the row ranges each session occupies, with their
+# first and last timestamps and sample counts, saved as '<log>.sessions.json' next
+# to the log. Fused logs are written in time order and sessions follow each other,
+# so every session is one (or, for repeated sessions like Idle, a few) contiguous
+# row ranges; selecting a session becomes a slice instead of a scan of every row.
+
+INDEX_SUFFIX = ".sessions.json"
+
+
+def index_path(log_path):
+    """Returns the index path of a log, e.g. 'power_log_fusion.sessions.json'."""
+    return os.path.splitext(log_path)[0] + INDEX_SUFFIX
+
+
+def log_size(source):
+    """Returns the size in bytes of a log file or of all files of a columnar store."""
+    if os.path.isdir(source):
+        return sum(os.path.getsize(os.path.join(source, name)) for name in os.listdir(source))
+    return os.path.getsize(source)
+
+
+class SessionIndexBuilder:
+    """
+    Builds a session index while rows are written, in O(1) per row.
+    """
+
+    def __init__(self):
+        self.ranges = [] # [session, start row, end row (exclusive), first timestamp, last timestamp]
+        self.rows = 0
+
+    def add(self, timestamp, session):
+        """Records the next row of the log."""
+        last = self.ranges[-1] if self.ranges else None
+        if last is not None and last[0] == session:
+            last[2] = self.rows + 1
+            last[4] = timestamp
+        else:
+            self.ranges.append([session, self.rows, self.rows + 1, timestamp, timestamp])
+        self.rows += 1
+
+    def track(self, rows, timestamp_col=0, session_col=3):
+        """Yields `rows` unchanged, recording each one (fused rows by default)."""
+        for row in rows:
+            self.add(row[timestamp_col], row[session_col])
+            yield row
+
+    def save(self, log_path):
+        """
+        Writes the index of the log at `log_path` (CSV or columnar store), which must be complete.
+
+        Returns:
+            str: The index path.
+        """
+        source = resolve(log_path)
+        sessions = {}
+        for i, (session, start, end, first_ns, last_ns) in enumerate(self.ranges):
+            entry = sessions.setdefault(session, {"rows": 0, "ranges": [], "first_ns": first_ns})
+            entry["rows"] += end - start
+            entry["ranges"].append(i)
+            entry["last_ns"] = last_ns
+        index = {"source": source, "source_bytes": log_size(source), "rows": self.rows,
+                 "ranges": [{"session": session, "start": start, "end": end, "first_ns": first_ns, "last_ns": last_ns}
+                            for session, start, end, first_ns, last_ns in self.ranges],
+                 "sessions": sessions}
+        path = index_path(log_path)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+        return path
+
+
+class SessionIndex:
+    """
+    Row ranges of the sessions of a log, for slice-based access to its DataFrame.
+
+    Args:
+        index (dict): The index as stored by SessionIndexBuilder.save().
+    """
+
+    def __init__(self, index):
+        self.rows = index["rows"]
+        self.ranges = index["ranges"]
+        self.index = index
+
+    def sessions(self):
+        """Returns the session names in order of first appearance."""
+        return list(self.index["sessions"])
+
+    def count(self, session):
+        """Returns the number of rows of a session (0 if it does not occur)."""
+        return self.index["sessions"].get(session, {}).get("rows", 0)
+
+    def time_range(self, session):
+        """Returns (first, last) epoch nanosecond timestamp of a session, or None."""
+        entry = self.index["sessions"].get(session)
+        return (entry["first_ns"], entry["last_ns"]) if entry else None
+
+    def session_ranges(self, session):
+        """Returns the (start, end) row ranges of a session, end exclusive."""
+        entry = self.index["sessions"].get(session)
+        if entry is None:
+            return []
+        return [(self.ranges[i]["start"], self.ranges[i]["end"]) for i in entry["ranges"]]
+
+    def matches(self, df):
+        """Tells whether `df` has the indexed log's rows, in file order."""
+        return len(df) == self.rows
+
+    def take(self, df, ranges):
+        """Returns the rows of `df` in the given ranges; a single range is a plain slice."""
+        import numpy as np
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            return df.iloc[start:end]
+        if not ranges:
+            return df.iloc[0:0]
+        return df.iloc[np.concatenate([np.arange(start, end) for start, end in ranges])]
+
+    def select(self, df, session):
+        """Returns the rows of one session of `df`."""
+        return self.take(df, self.session_ranges(session))
+
+    def exclude(self, df, sessions):
+        """Returns the rows of `df` outside the given sessions, in file order."""
+        excluded = set(sessions)
+        kept = [(r["start"], r["end"]) for r in self.ranges if r["session"] not in excluded]
+        # Neighbouring kept ranges are merged, so the result is a single slice where possible
+        merged = []
+        for start, end in kept:
+            if merged and merged[-1][1] == start:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return self.take(df, merged)
+
+    def groups(self, df, exclude=()):
+        """Returns a dict session name -> its rows of `df`, in order of first appearance."""
+        return {session: self.select(df, session) for session in self.sessions() if session not in exclude}
+
+
+def load_index(log_path):
+    """
+    Loads the index of a log.
+
+    Returns:
+        SessionIndex: The index, or None if there is none or the log changed since it was written.
+    """
+    try:
+        with open(index_path(log_path)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    source = resolve(log_path)
+    if not os.path.exists(source) or log_size(source) != index.get("source_bytes"):
+        return None
+    return SessionIndex(index)
+
+
+def index_frame(df, log_path):
+    """
+    Builds and saves the index of an existing log from its DataFrame, in file order.
+
+    Returns:
+        SessionIndex: The new index.
+    """
+    import numpy as np
+    from power_clock import to_datetime
+
+    sessions = df["session"].astype(str).to_numpy()
+    timestamps = to_datetime(df["timestamp"]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    builder = SessionIndexBuilder()
+    if len(sessions):
+        starts = np.flatnonzero(np.concatenate(([True], sessions[1:] != sessions[:-1])))
+        ends = np.append(starts[1:], len(sessions))
+        builder.ranges = [[sessions[start], int(start), int(end), int(timestamps[start]), int(timestamps[end - 1])]
+                          for start, end in zip(starts, ends)]
+        builder.rows = len(sessions)
+    builder.save(log_path)
+    return load_index(log_path)
+
+
+def read_session(log_path, session, index=None):
+    """
+    Loads the rows of one session of a log without parsing the others: columnar
+    stores are memory-mapped and sliced (constant time), CSV logs skip the other lines.
+
+    Args:
+        log_path (str): The log (CSV or columnar store).
+        session (str): Session name.
+        index (SessionIndex): Index of the log, loaded with load_index() if not given.
+
+    Returns:
+        pd.DataFrame: The session's rows, or None if the log has no up-to-date index.
+    """
+    import pandas as pd
+    from power_store import read_store
+
+    index = index or load_index(log_path)
+    if index is None:
+        return None
+    ranges = index.session_ranges(session)
+    source = resolve(log_path)
+    if is_store(source):
+        return index.take(read_store(source), ranges)
+
+    # The '#' metadata lines and the header precede the data rows
+    with open(source, "r") as f:
+        skipped = 0
+        for line in f:
+            if not line.startswith("#"):
+                break
+            skipped += 1
+    # Line `skipped` is the header; data row k is line skipped + 1 + k
+    parts = [pd.read_csv(source, skiprows=lambda line, start=start: line < skipped or skipped < line <= skipped + start,
+                         nrows=end - start)
+             for start, end in ranges]
+    if not parts:
+        return pd.read_csv(source, skiprows=skipped, nrows=0)
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or show the session index of a fused log.")
+    parser.add_argument("command", choices=["build", "show"],
+                        help="build the index of an existing log, or list its sessions")
+    parser.add_argument("log", nargs="?", default="power_log_fusion.csv",
+                        help="Fused log (CSV or columnar store) (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from power_store import read_table
+        try:
+            index_frame(read_table(args.log), args.log)
+        except (FileNotFoundError, KeyError) as e:
+            print(f"Error: Could not index '{args.log}': {e}")
+            sys.exit(1)
+        print(f"Index saved to {index_path(args.log)}")
+
+    index = load_index(args.log)
+    if index is None:
+        print(f"No up-to-date index for '{args.log}'. Run 'python3 session_index.py build {args.log}'.")
+        sys.exit(1)
+    print(f"{'session':<30} {'rows':>10} {'ranges':>7} {'duration (s)':>13}")
+    for session in index.sessions():
+        first_ns, last_ns = index.time_range(session)
+        print(f"{session:<30} {index.count(session):>10} {len(index.session_ranges(session)):>7} "
+              f"{(last_ns - first_ns) / 1e9:>13.1f}")
@@ -0,0 +1,9 @@
+# Session names shared by the hwmon logger and the analysis scripts. Kept in a module
+# of their own so the analysis does not import the logger (and its browser drivers)
+# and the logger does not import pandas through power_correction.py.
+
+IDLE_SESSION = "Idle" # Session name of the pauses, logged as idle baseline windows for power_correction.py
+
+# Sessions measuring the idle system: the initial Background capture and the Idle pauses between sessions.
+# They define the baseline and are left out of the per-session analysis.
+BASELINE_SESSIONS = ("Background", IDLE_SESSION)
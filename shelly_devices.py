@@ -0,0 +1,34 @@
+import json
+
+# Shelly device list shared by the Shelly logger, which polls the devices, and
+# power_fusion.py, which pairs each device with the hwmon log of its host. Kept in
+# a module of their own so the fusion does not import the logger (and its asyncio
+# client, WebSocket framing and live dashboard publisher).
+
+DEVICES_FILE = "shelly_devices.json" # Example device list, passed with --devices
+SWITCH_ID = 0 # Switch component whose power is read
+
+
+def load_devices(file_path=DEVICES_FILE):
+    """
+    Reads the Shelly device list: a JSON list of objects with the keys 'ip'
+    (optionally 'ip:port'), 'switch_id' (default 0), 'label' (default: the ip)
+    and optionally 'host' and 'hwmon_log', used by power_fusion.py to pair the
+    device with the hwmon log of the machine it meters.
+
+    Raises:
+        ValueError: If an entry has no 'ip' or two devices share a label.
+    """
+    with open(file_path) as f:
+        entries = json.load(f)
+    devices = []
+    for entry in entries:
+        if "ip" not in entry:
+            raise ValueError(f"Device entry without 'ip' in {file_path}: {entry}")
+        devices.append({**entry, "switch_id": int(entry.get("switch_id", SWITCH_ID)),
+                        "label": str(entry.get("label", entry["ip"]))})
+    labels = [device["label"] for device in devices]
+    duplicates = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate device labels in {file_path}: {duplicates}")
+    return devices
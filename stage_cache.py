@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+# Content-addressed cache of post-processing stage results. A stage's key is the
+# SHA-256 of its name, its parameters, the source code of the module computing it
+# and the fingerprints of its inputs: files (hashed by content) or the keys of the
+# upstream stages it consumes, so a change anywhere invalidates everything downstream.
+# Each entry is a directory holding the stage's pickled return value, copies of the
+# files it wrote and a meta.json; the least recently used entries are evicted once
+# the cache grows beyond its size bound.
+
+CACHE_DIR = ".cache"
+MAX_CACHE_BYTES = 1 << 30 # Total size of the cached entries before eviction (1 GiB)
+FINGERPRINT_FILE = "fingerprints.json"
+HASH_CHUNK = 1 << 20
+
+
+def path_size(path):
+    """Returns the size in bytes of a file, or of all files below a directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def copy_path(source, target):
+    """
+    Copies a file or a directory tree (e.g. a '.pcol' store) over `target`. The copy
+    gets a fresh modification time, as power_store.resolve() compares them.
+    """
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    if os.path.isdir(source):
+        shutil.copytree(source, target, copy_function=shutil.copy)
+    else:
+        shutil.copy(source, target)
+
+
+class StageCache:
+    """
+    Skips pipeline stages whose inputs, parameters and code have not changed.
+
+    Content hashes of input files are memoised by (size, mtime), so unchanged
+    multi-GB logs are only read once. Safe to use from several threads.
+
+    Args:
+        root (str): Cache directory.
+        max_bytes (int): Size bound of the cache; older entries are evicted beyond it.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        try:
+            with open(os.path.join(root, FINGERPRINT_FILE)) as f:
+                self.fingerprints = json.load(f)
+        except (OSError, ValueError):
+            self.fingerprints = {}
+
+    def file_digest(self, path):
+        """
+        Returns the SHA-256 of a file's content, or of the names and contents of a
+        directory's files. None if `path` does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for name in sorted(os.listdir(path)):
+                digest.update(name.encode())
+                digest.update((self.file_digest(os.path.join(path, name)) or "").encode())
+            return digest.hexdigest()
+
+        stat = os.stat(path)
+        absolute = os.path.abspath(path)
+        with self.lock:
+            memo = self.fingerprints.get(absolute)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        with self.lock:
+            self.fingerprints[absolute] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+            self._save_fingerprints()
+        return digest.hexdigest()
+
+    def _save_fingerprints(self):
+        tmp = os.path.join(self.root, FINGERPRINT_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.fingerprints, f)
+        os.replace(tmp, os.path.join(self.root, FINGERPRINT_FILE))
+
+    def key(self, stage, files=(), upstream=(), params=None, code=()):
+        """
+        Returns the cache key of a stage.
+
+        Args:
+            stage (str): Stage name.
+            files (iterable): Input file or store paths, hashed by content.
+            upstream (iterable): Keys of the stages whose results are consumed.
+            params (dict): JSON-serialisable parameters.
+            code (iterable): Modules whose source code computes the stage.
+        """
+        digest = hashlib.sha256(stage.encode())
+        digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+        for module in code:
+            digest.update((self.file_digest(module.__file__) or "").encode())
+        for path in files:
+            digest.update(path.encode())
+            digest.update((self.file_digest(path) or "missing").encode())
+        for key in upstream:
+            digest.update(key.encode())
+        return digest.hexdigest()
+
+    def run(self, stage, key, compute, outputs=()):
+        """
+        Returns the result of `compute()`, restoring it and the files it writes
+        (`outputs`) from the cache entry of `key` when there is one. A result of
+        None means the stage failed (the analysis functions' convention) and is not cached.
+
+        Args:
+            stage (str): Stage name, used in the entry name and messages.
+            key (str): Cache key from key().
+            compute (callable): Computes the result and writes `outputs`.
+            outputs (iterable): Paths written by `compute`; missing ones are not cached.
+        """
+        entry = os.path.join(self.root, f"{stage.replace(' ', '_')}-{key[:32]}")
+        meta_path = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(os.path.join(entry, "result.pkl"), "rb") as f:
+                result = pickle.load(f)
+            for i, (path, digest) in enumerate(meta["outputs"]):
+                # Outputs still on disk from the previous run are not copied again
+                if self.file_digest(path) != digest:
+                    copy_path(os.path.join(entry, str(i)), path)
+            os.utime(meta_path) # Mark the entry as recently used
+            with self.lock:
+                self.hits += 1
+            print(f"Cache: reusing '{stage}' ({key[:12]})")
+            return result
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError):
+            pass
+
+        result = compute()
+        with self.lock:
+            self.misses += 1
+        if result is None:
+            return None
+        try:
+            self._store(entry, result, [path for path in outputs if os.path.exists(path)])
+        except (OSError, pickle.PicklingError) as e:
+            print(f"Warning: Could not cache stage '{stage}': {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+        return result
+
+    def _store(self, entry, result, outputs):
+        tmp = f"{entry}.tmp{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        with open(os.path.join(tmp, "result.pkl"), "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        for i, path in enumerate(outputs):
+            copy_path(path, os.path.join(tmp, str(i)))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"created": time.time(),
+                       "outputs": [[path, self.file_digest(path)] for path in outputs]}, f)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp, entry)
+        self.evict(keep=entry)
+
+    def entries(self):
+        """
+        Returns (last use, size, path) of every cache entry, least recently used first.
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            meta_path = os.path.join(path, "meta.json")
+            if os.path.isfile(meta_path):
+                entries.append((os.path.getmtime(meta_path), path_size(path), path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        The entry `keep` (the one just written) is never evicted.
+        """
+        with self.lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        """Deletes every entry and the fingerprint memo."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        self.fingerprints = {}
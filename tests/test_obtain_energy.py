@@ -0,0 +1,71 @@
+import csv
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from logger_overhead import marginal_energy
+from obtain_energy import calculate_overhead_energy
+
+SECOND = 1_000_000_000
+START = 1_700_000_000 * SECOND
+
+
+def write_overhead_run(tmp_path, site_logger_cpu_s):
+    """
+    A 60 s Idle window at 10 W (the logger takes 1.2 s CPU of 4 s busy time) and a
+    60 s visit at 25 W keeping one CPU busy, during which the logger takes `site_logger_cpu_s`.
+    Returns the paths of the fused log and the hwmon stats.
+    """
+    log_path = tmp_path / "power_log_fusion.csv"
+    stats_path = tmp_path / "power_log_hwmon_stats.csv"
+    rows, stats = [], []
+    t = START
+    for session, power, cpu_s, busy_s in [("Idle", 10.0, 1.2, 4.0), ("site", 25.0, site_logger_cpu_s, 60.0)]:
+        first = t
+        for _ in range(60):
+            rows.append([t, power, power, session, 0])
+            t += SECOND
+        stats.append({"session": session, "trial": 0, "energy_j": power * 60, "first_ns": first, "last_ns": t,
+                      "duration_s": 60.0, "cpu_s": cpu_s, "busy_cpu_s": busy_s})
+    with open(log_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "power_shelly", "power_hwmon", "session", "trial"])
+        writer.writerows(rows)
+    with open(stats_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(stats[0]))
+        writer.writeheader()
+        writer.writerows(stats)
+    return str(log_path), str(stats_path)
+
+
+def test_marginal_energy_excludes_the_idle_power():
+    # 900 J above the 10 W idle power over 56 busy CPU seconds above the idle rate
+    assert marginal_energy(1500.0, 60.0, 60.0, 10.0, 4.0 / 60) == pytest.approx(900.0 / 56)
+    assert marginal_energy(500.0, 60.0, 60.0, 10.0, 4.0 / 60) == 0.0
+
+
+def test_logger_at_idle_rate_subtracts_nothing(tmp_path):
+    log_path, stats_path = write_overhead_run(tmp_path, site_logger_cpu_s=1.2)
+
+    result = calculate_overhead_energy(log_path, stats_file=stats_path,
+                                       shelly_overhead_file=str(tmp_path / "missing.csv")).set_index("Session")
+
+    # The idle 10 W is never charged to the logger: its 1.2 s cost 1.2 s x 900 J / 56 s,
+    # all of which the baseline correction already removed with the Idle window
+    assert result.loc["site", "Overhead (Joules)"] == pytest.approx(1.2 * 900.0 / 56)
+    assert result.loc["site", "Subtracted (Joules)"] == pytest.approx(0.0)
+    assert result.loc["site", "Adjusted Hwmon Energy (Wh)"] == pytest.approx(1500.0 / 3600)
+    assert result.loc["site", "Adjusted Shelly Energy (Wh)"] == pytest.approx(1500.0 / 3600)
+
+
+def test_logger_above_idle_rate_is_subtracted(tmp_path):
+    log_path, stats_path = write_overhead_run(tmp_path, site_logger_cpu_s=3.2)
+
+    result = calculate_overhead_energy(log_path, stats_file=stats_path,
+                                       shelly_overhead_file=str(tmp_path / "missing.csv")).set_index("Session")
+
+    # Only the 2 s beyond the Idle window's logger rate are subtracted
+    subtracted = 2.0 * 900.0 / 56
+    assert result.loc["site", "Subtracted (Joules)"] == pytest.approx(subtracted)
+    assert result.loc["site", "Adjusted Hwmon Energy (Wh)"] == pytest.approx((1500.0 - subtracted) / 3600)
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+
+import pytest
+
+from fake_shelly import FakeShelly, serve
+from power_clock import MonotonicClock
+from power_logger_shelly import ShellyConnection, ShellyPoller, ShellyPushListener
+
+
+class RowWriter:
+    """Collects the rows a poller writes, in place of a csv.writer."""
+
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+@pytest.fixture
+def fake_device():
+    """Starts fake_shelly on a free port; returns a function taking the FakeShelly and giving its address."""
+    servers = []
+
+    def start(device=None):
+        server = serve(port=0, device=device or FakeShelly())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def poll(address, samples, interval, timeout):
+    """Runs a poller for `samples` deadlines and returns it with its rows."""
+    writer = RowWriter()
+
+    async def run():
+        poller = ShellyPoller(ShellyConnection(address), writer, MonotonicClock(), "plug",
+                              interval=interval, timeout=timeout, quiet=True)
+        try:
+            await poller.run(samples)
+        finally:
+            await poller.connection.close()
+        return poller
+
+    return asyncio.run(run()), writer.rows
+
+
+def test_readings_follow_the_deadline_schedule(fake_device):
+    address = fake_device()
+    poller, rows = poll(address, samples=8, interval=0.05, timeout=0.5)
+
+    assert [row[4] for row in rows] == ["ok"] * 8
+    assert all(row[1] == "plug" and isinstance(row[2], float) for row in rows)
+    # Deadlines are start + k * interval, so the span does not grow with per-request delays
+    span_s = (rows[-1][0] - rows[0][0]) / 1e9
+    assert span_s == pytest.approx(7 * 0.05, abs=0.03)
+    assert poller.health()["ok"] == 8
+
+
+def test_rtt_column_measures_the_round_trip(fake_device):
+    address = fake_device(FakeShelly(latency=0.05))
+    poller, rows = poll(address, samples=3, interval=0.1, timeout=0.5)
+
+    assert all(row[4] == "ok" and row[3] >= 50 for row in rows)
+    health = poller.health()
+    assert health["rtt_mean_ms"] >= 50
+    assert health["rtt_max_ms"] == max(row[3] for row in rows)
+
+
+def test_unanswered_requests_become_timeout_rows(fake_device):
+    address = fake_device(FakeShelly(timeout_rate=1.0))
+    poller, rows = poll(address, samples=3, interval=0.2, timeout=0.1)
+
+    assert [row[4] for row in rows] == ["timeout"] * 3
+    assert all(row[2] == "" and row[3] >= 100 for row in rows)
+    assert poller.health()["timeout"] == 3
+    assert poller.health()["rtt_mean_ms"] == ""
+
+
+def test_missed_deadlines_are_logged_as_skipped(fake_device):
+    # Every answer takes longer than two intervals, so the deadlines in between are skipped, not fired late
+    address = fake_device(FakeShelly(latency=0.25))
+    _, rows = poll(address, samples=6, interval=0.1, timeout=1.0)
+
+    statuses = [row[4] for row in rows]
+    assert len(rows) == 6
+    assert statuses[0] == "ok"
+    assert "skipped" in statuses
+    assert all(row[2] == "" and row[3] == "" for row in rows if row[4] == "skipped")
+    # Skipped rows are stamped with their deadline, before the late answer that pushed them out
+    for previous, row in zip(rows, rows[1:]):
+        if row[4] == "skipped" and previous[4] == "ok":
+            assert row[0] < previous[0]
+
+
+def test_http_errors_become_error_rows(fake_device):
+    address = fake_device(FakeShelly(error_rate=1.0))
+    poller, rows = poll(address, samples=3, interval=0.05, timeout=0.5)
+
+    assert [row[4] for row in rows] == ["error"] * 3
+    assert all(row[2] == "" for row in rows)
+    assert poller.health()["error"] == 3
+
+
+def test_truncated_answers_become_error_rows(fake_device):
+    # The device hangs up halfway through the first bodies; the poller keeps going and reconnects
+    device = FakeShelly(truncate_rate=1.0)
+    address = fake_device(device)
+    writer = RowWriter()
+
+    async def run():
+        poller = ShellyPoller(ShellyConnection(address), writer, MonotonicClock(), "plug",
+                              interval=0.05, timeout=0.5, quiet=True)
+        try:
+            await poller.run(2)
+            device.truncate_rate = 0.0
+            await poller.run(2)
+        finally:
+            await poller.connection.close()
+        return poller
+
+    poller = asyncio.run(run())
+    assert [row[4] for row in writer.rows] == ["error", "error", "ok", "ok"]
+    assert poller.health()["error"] == 2
+
+
+def test_connection_recovers_after_errors(fake_device):
+    device = FakeShelly(error_rate=1.0)
+    address = fake_device(device)
+
+    async def run():
+        connection = ShellyConnection(address)
+        try:
+            with pytest.raises(ConnectionError):
+                await connection.get_json("/rpc/Switch.GetStatus?id=0")
+            device.error_rate = 0.0
+            return await connection.get_json("/rpc/Switch.GetStatus?id=0")
+        finally:
+            await connection.close()
+
+    status = asyncio.run(run())
+    assert status["id"] == 0 and "apower" in status
+
+
+def listen(address, seconds, interval=0.05, idle_timeout=30, reconnect_delay=5):
+    """Runs a push listener (with its polling fallback) for `seconds` and returns the rows."""
+    writer = RowWriter()
+
+    async def run():
+        poller = ShellyPoller(ShellyConnection(address), writer, MonotonicClock(), "plug",
+                              interval=interval, timeout=0.5, quiet=True)
+        listener = ShellyPushListener(poller, address, idle_timeout=idle_timeout, reconnect_delay=reconnect_delay)
+        task = asyncio.create_task(listener.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        listener.drop()
+        await poller.connection.close()
+
+    asyncio.run(run())
+    return writer.rows
+
+
+def test_push_notifications_are_logged(fake_device):
+    address = fake_device(FakeShelly(push_interval=0.05))
+    rows = listen(address, 0.5)
+
+    assert rows and all(row[4] == "push" for row in rows)
+    # The subscribing Switch.GetStatus answer has a round trip, the notifications have none
+    assert rows[0][3] != ""
+    notifications = [row for row in rows[1:] if row[3] == ""]
+    assert len(notifications) >= 4
+    assert all(isinstance(row[2], float) for row in rows)
+
+
+def test_idle_socket_is_probed_with_a_status_request(fake_device):
+    # No notifications arrive, so every idle timeout sends a Switch.GetStatus whose answer is logged
+    address = fake_device(FakeShelly(push_interval=60))
+    rows = listen(address, 0.55, idle_timeout=0.1)
+
+    assert all(row[4] == "push" and row[3] != "" for row in rows)
+    assert len(rows) >= 4
+
+
+def test_dropped_socket_falls_back_to_polling_and_reconnects(fake_device):
+    address = fake_device(FakeShelly(push_interval=0.05, ws_drop_after=0.3))
+    rows = listen(address, 1.2, interval=0.05, reconnect_delay=0.3)
+
+    statuses = [row[4] for row in rows]
+    assert "disconnected" in statuses
+    dropped = statuses.index("disconnected")
+    assert statuses[0] == "push"
+    # Polled readings fill the time until the socket is reopened, then notifications resume
+    after = statuses[dropped + 1:]
+    assert "ok" in after
+    assert "push" in after[after.index("ok"):]
@@ -0,0 +1,43 @@
+import csv
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from obtain_energy import calculate_session_energy
+from power_resample import build_levels, quick_energy
+
+SECOND = 1_000_000_000
+START = 1_700_000_000 * SECOND
+
+
+def write_trial_log(path):
+    """Two 10 s visits of one site at 10 W with a 100 s Idle pause between them."""
+    rows = []
+    t = START
+    for session, trial, seconds, power in [("Background", 0, 10, 5.0), ("site", 1, 10, 10.0),
+                                           ("Idle", 0, 100, 5.0), ("site", 2, 10, 10.0)]:
+        for _ in range(seconds + 1):
+            rows.append([t, power, power, session, trial])
+            t += SECOND
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "power_shelly", "power_hwmon", "session", "trial"])
+        writer.writerows(rows)
+
+
+def test_quick_energy_matches_session_energy_with_trials(tmp_path):
+    path = str(tmp_path / "power_log_fusion.csv")
+    write_trial_log(path)
+    build_levels(path)
+
+    quick = quick_energy(path).set_index("Session")
+    exact = calculate_session_energy(path).set_index("Session")
+
+    # Rectangle rule: the first sample of each visit is held over the interval after it,
+    # so 11 samples a second apart count as 11 s; the 100 s Idle pause is never integrated
+    assert exact.loc["site", "Hwmon Energy (Joules)"] == pytest.approx(220.0)
+    assert exact.loc["site", "Duration (s)"] == pytest.approx(22.0)
+    assert quick.loc["site", "power_hwmon Energy (Wh)"] == pytest.approx(exact.loc["site", "Hwmon Energy (Wh)"])
+    assert quick.loc["site", "power_shelly Energy (Wh)"] == pytest.approx(exact.loc["site", "Shelly Energy (Wh)"])
+    assert quick.loc["site", "Duration (s)"] == pytest.approx(exact.loc["site", "Duration (s)"])
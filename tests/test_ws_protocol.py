@@ -0,0 +1,78 @@
+import asyncio
+import io
+
+import pytest
+
+from ws_protocol import OP_PING, OP_TEXT, accept_key, apply_mask, encode_frame, read_frame, read_frame_sync
+
+LENGTHS = [0, 1, 125, 126, 127, 65535, 65536, 70000]
+
+
+def reader_of(data):
+    """Returns a blocking recv_exactly(n) over `data`."""
+    stream = io.BytesIO(data)
+
+    def recv_exactly(n):
+        chunk = stream.read(n)
+        if len(chunk) < n:
+            raise ConnectionError("Short read")
+        return chunk
+
+    return recv_exactly
+
+
+@pytest.mark.parametrize("mask", [False, True])
+@pytest.mark.parametrize("length", LENGTHS)
+def test_frames_round_trip(length, mask):
+    payload = bytes(i % 251 for i in range(length))
+    frame = encode_frame(OP_TEXT, payload, mask=mask)
+    assert read_frame_sync(reader_of(frame)) == (0x80, OP_TEXT, payload)
+
+
+@pytest.mark.parametrize("mask", [False, True])
+@pytest.mark.parametrize("length", LENGTHS)
+def test_frames_round_trip_async(length, mask):
+    payload = bytes(i % 251 for i in range(length))
+
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_frame(OP_PING, payload, mask=mask))
+        reader.feed_eof()
+        return await read_frame(reader)
+
+    assert asyncio.run(read()) == (0x80, OP_PING, payload)
+
+
+@pytest.mark.parametrize("length, code, extra", [(125, 125, 0), (126, 126, 2), (65535, 126, 2),
+                                                 (65536, 127, 8)])
+def test_length_encoding(length, code, extra):
+    frame = encode_frame(OP_TEXT, b"x" * length, mask=False)
+    assert frame[1] == code
+    assert len(frame) == 2 + extra + length
+    if code == 126:
+        assert int.from_bytes(frame[2:4], "big") == length
+    elif code == 127:
+        assert int.from_bytes(frame[2:10], "big") == length
+
+
+def test_client_frames_are_masked():
+    payload = b'{"method": "Switch.GetStatus"}' * 3
+    frame = encode_frame(OP_TEXT, payload, mask=True)
+    assert frame[1] & 0x80
+    key = frame[2:6]
+    assert frame[6:] == apply_mask(payload, key)
+    assert apply_mask(frame[6:], key) == payload
+    unmasked = encode_frame(OP_TEXT, payload, mask=False)
+    assert not unmasked[1] & 0x80 and unmasked[2:] == payload
+
+
+def test_apply_mask_handles_every_length():
+    key = b"\x01\x02\x03\x04"
+    for length in range(9):
+        payload = bytes(range(length))
+        masked = apply_mask(payload, key)
+        assert masked == bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+
+def test_accept_key_matches_rfc_6455_example():
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
@@ -0,0 +1,128 @@
+import math
+import random
+
+# Repeated-trial scheduling for the hwmon logger. Every site is visited TRIALS times;
+# the order of the visits decides how slow drifts (thermal build-up, background
+# activity) spread over the sites:
+#   'fixed'   - round after round in webs.json order (the original single pass when TRIALS is 1)
+#   'blocked' - round after round, each round in its own random order (randomized complete blocks)
+#   'random'  - all visits of all sites in one random order
+# A site is dropped from the rest of the schedule once the confidence interval of its
+# energy per visit is narrow enough (adaptive early stopping).
+
+TRIALS = 1
+ORDER = "fixed"
+ORDERS = ("fixed", "blocked", "random")
+MIN_TRIALS = 3 # Visits of a site before early stopping may end its trials
+CONFIDENCE = 0.95
+
+# Two-sided 95 % quantiles of Student's t distribution by degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+T_95_LARGE = [(40, 2.021), (60, 2.000), (120, 1.980)]
+
+
+def t_critical(dof):
+    """
+    Returns the two-sided 95 % critical value of Student's t distribution for
+    `dof` degrees of freedom (table values, the next smaller tabulated dof beyond 30).
+    """
+    if dof < 1:
+        return math.nan
+    if dof <= len(T_95):
+        return T_95[dof - 1]
+    value = T_95[-1]
+    for limit, critical in T_95_LARGE:
+        if dof >= limit:
+            value = critical
+    return value if dof < 1000 else 1.960
+
+
+def mean_ci(values):
+    """
+    Returns the mean, sample standard deviation and half-width of the 95 %
+    confidence interval of the mean of `values` (NaN where undefined).
+    """
+    n = len(values)
+    if n == 0:
+        return math.nan, math.nan, math.nan
+    mean = sum(values) / n
+    if n < 2:
+        return mean, math.nan, math.nan
+    std = math.sqrt(sum((value - mean) ** 2 for value in values) / (n - 1))
+    return mean, std, t_critical(n - 1) * std / math.sqrt(n)
+
+
+def schedule_trials(sites, trials=TRIALS, order=ORDER, seed=None):
+    """
+    Returns the visit order of a repeated-trial run.
+
+    Args:
+        sites (list): Site (session) names.
+        trials (int): Visits per site.
+        order (str): One of ORDERS.
+        seed (int): Seed of the shuffles, for a reproducible order.
+
+    Returns:
+        list: (site, trial number starting at 1) tuples in visiting order.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown trial order '{order}'. Expected one of {ORDERS}.")
+    rng = random.Random(seed)
+    if order == "random":
+        visits = [(site, trial) for trial in range(1, trials + 1) for site in sites]
+        rng.shuffle(visits)
+        return visits
+    visits = []
+    for trial in range(1, trials + 1):
+        block = list(sites)
+        if order == "blocked":
+            rng.shuffle(block)
+        visits.extend((site, trial) for site in block)
+    return visits
+
+
+class EarlyStopping:
+    """
+    Tracks the energy per visit of every site and tells when a site has been
+    measured precisely enough: at least `min_trials` visits and a 95 % confidence
+    interval half-width of at most `target` times the mean.
+
+    Args:
+        target (float): Relative CI half-width that ends a site's trials, None to never stop early.
+        min_trials (int): Visits required before a site may stop.
+    """
+
+    def __init__(self, target=None, min_trials=MIN_TRIALS):
+        self.target = target
+        self.min_trials = max(min_trials, 2)
+        self.energies = {}
+        self.stopped = set()
+
+    def add(self, site, energy):
+        """
+        Records the energy of one visit.
+
+        Returns:
+            bool: Whether this visit made the site's interval tight enough.
+        """
+        values = self.energies.setdefault(site, [])
+        values.append(energy)
+        if self.target is None or site in self.stopped or len(values) < self.min_trials:
+            return False
+        mean, _, half_width = mean_ci(values)
+        if mean and abs(half_width / mean) <= self.target:
+            self.stopped.add(site)
+            return True
+        return False
+
+    def done(self, site):
+        """Tells whether the remaining visits of a site can be skipped."""
+        return site in self.stopped
+
+    def summary(self, site):
+        """Returns (visits, mean, relative CI half-width) of a site's energies."""
+        values = self.energies.get(site, [])
+        mean, _, half_width = mean_ci(values)
+        return len(values), mean, half_width / mean if mean else math.nan
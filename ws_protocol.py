@@ -0,0 +1,97 @@
+import base64
+import hashlib
+import os
+import struct
+
+# Minimal RFC 6455 framing shared by the Shelly push client and the fake Shelly server.
+# Only what the Shelly RPC channel needs: text frames, ping/pong and close, no extensions.
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def new_key():
+    """Returns a random Sec-WebSocket-Key for the opening handshake."""
+    return base64.b64encode(os.urandom(16)).decode("ascii")
+
+
+def accept_key(key):
+    """Returns the Sec-WebSocket-Accept value the server must answer to `key`."""
+    return base64.b64encode(hashlib.sha1((key + GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def encode_frame(opcode, payload, mask):
+    """
+    Encodes a single final frame. Clients must mask their frames, servers must not.
+    """
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if not mask:
+        return bytes(header) + payload
+    masking_key = os.urandom(4)
+    return bytes(header) + masking_key + apply_mask(payload, masking_key)
+
+
+def apply_mask(payload, masking_key):
+    """XORs the payload with the 4-byte masking key (masking and unmasking are the same operation)."""
+    if not payload:
+        return b""
+    key = (masking_key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(len(payload), "big")
+
+
+def _parse_header(first_two):
+    fin = first_two[0] & 0x80
+    opcode = first_two[0] & 0x0F
+    masked = first_two[1] & 0x80
+    length = first_two[1] & 0x7F
+    return fin, opcode, masked, length
+
+
+async def read_frame(reader):
+    """
+    Reads one frame from an asyncio StreamReader.
+
+    Returns:
+        tuple: (fin, opcode, payload) with the payload already unmasked.
+    """
+    fin, opcode, masked, length = _parse_header(await reader.readexactly(2))
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    masking_key = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    return fin, opcode, apply_mask(payload, masking_key) if masked else payload
+
+
+def read_frame_sync(recv_exactly):
+    """
+    Reads one frame through a blocking `recv_exactly(n)` callable.
+
+    Returns:
+        tuple: (fin, opcode, payload) with the payload already unmasked.
+    """
+    fin, opcode, masked, length = _parse_header(recv_exactly(2))
+    if length == 126:
+        length = struct.unpack("!H", recv_exactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", recv_exactly(8))[0]
+    masking_key = recv_exactly(4) if masked else None
+    payload = recv_exactly(length)
+    return fin, opcode, apply_mask(payload, masking_key) if masked else payload